@@ -5,12 +5,20 @@
 
 import re
 
+import sys
+
 from dataclasses import dataclass, asdict
 
 from typing import Optional
 
 
 
+sys.path.append('..')
+
+from merchant_gazetteer import get_gazetteer
+
+
+
 
 
 @dataclass
@@ -85,51 +93,19 @@ def clean_ocr_text(text: str) -> str:
 
 
 
-MERCHANT_KEYWORDS = {
-
-    "bag of beans cafe & restaurant inc": "Bag of Beans Cafe & Restaurant Inc",
-
-    "bag of beans cafe & restaurant": "Bag of Beans Cafe & Restaurant",
-
-    "bag of beans": "Bag of Beans Cafe & Restaurant",
-
-    "walmart": "Walmart",
-
-    "wal mart": "Walmart",
-
-    "walgreens": "Walgreens",
-
-    "target": "Target",
-
-    "starbucks": "Starbucks",
-
-    "7-eleven": "7-Eleven",
-
-    "kroger": "Kroger",
-
-    "costco": "Costco",
-
-    "shell": "Shell",
-
-}
-
-
-
-
-
 def extract_merchant(text: str) -> Optional[str]:
 
     lower = text
 
 
 
-    # 1) Dictionary match
+    # 1) Gazetteer match (longest known merchant name or alias)
 
-    for key, clean in MERCHANT_KEYWORDS.items():
+    match = get_gazetteer().find_longest(lower)
 
-        if key in lower:
+    if match:
 
-            return clean
+        return match.name
 
 
 
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+Content-Addressed Upload Storage with Reference Counting
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import os
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+from pymongo import ReturnDocument, UpdateOne
+
+try:
+    import boto3  # S3-compatible object storage (AWS, MinIO, ...)
+    BOTO3_AVAILABLE = True
+except ImportError:
+    BOTO3_AVAILABLE = False
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 1024 * 1024
+
+def hash_file(path: str) -> str:
+    """SHA-256 of a file's bytes, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def shard_path(root: Path, key: str) -> Path:
+    """ab/cd/abcd... layout: two levels of 256 directories keep every directory small"""
+    return root / key[:2] / key[2:4] / key
+
+class BlobBackend:
+    """Where blob bytes live; blobs are immutable and addressed by their SHA-256"""
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def put_file(self, key: str, temp_path: str):
+        """Take ownership of a fully written temporary file as the blob's content"""
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> str:
+        """A local filesystem path with the blob's content, for OCR and file responses"""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+class LocalBlobBackend(BlobBackend):
+    """Blobs on the local disk in a sharded directory tree"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def exists(self, key: str) -> bool:
+        return shard_path(self.root, key).exists()
+
+    def put_file(self, key: str, temp_path: str):
+        target = shard_path(self.root, key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Atomic on the same filesystem: readers see the whole blob or nothing
+        os.replace(temp_path, target)
+
+    def local_path(self, key: str) -> str:
+        return str(shard_path(self.root, key))
+
+    def delete(self, key: str):
+        try:
+            os.remove(shard_path(self.root, key))
+        except FileNotFoundError:
+            pass
+
+class S3BlobBackend(BlobBackend):
+    """
+    Blobs in an S3-compatible bucket (AWS S3, or MinIO/LocalStack via endpoint_url).
+
+    Readers that need a file get a copy downloaded into a local sharded
+    cache, which never goes stale because blob content never changes.
+    """
+
+    def __init__(self, bucket: str, cache_root: str, endpoint_url: str = None, prefix: str = 'blobs/'):
+        if not BOTO3_AVAILABLE:
+            raise RuntimeError("boto3 is required for the S3 blob backend")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client('s3', endpoint_url=endpoint_url)
+        self.cache_root = Path(cache_root)
+        self.cache_root.mkdir(parents=True, exist_ok=True)
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}{key[:2]}/{key[2:4]}/{key}"
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except self.client.exceptions.ClientError:
+            return False
+
+    def put_file(self, key: str, temp_path: str):
+        self.client.upload_file(temp_path, self.bucket, self._object_key(key))
+        cached = shard_path(self.cache_root, key)
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_path, cached)
+
+    def local_path(self, key: str) -> str:
+        cached = shard_path(self.cache_root, key)
+        if not cached.exists():
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=cached.parent, suffix='.tmp')
+            os.close(fd)
+            self.client.download_file(self.bucket, self._object_key(key), temp_path)
+            os.replace(temp_path, cached)
+        return str(cached)
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        try:
+            os.remove(shard_path(self.cache_root, key))
+        except FileNotFoundError:
+            pass
+
+def backend_from_env(root: str) -> BlobBackend:
+    """BLOB_BACKEND=local (default) or s3 with BLOB_S3_BUCKET and optional BLOB_S3_ENDPOINT_URL"""
+    if os.getenv('BLOB_BACKEND', 'local').lower() == 's3':
+        return S3BlobBackend(
+            os.getenv('BLOB_S3_BUCKET', 'lumina-receipts'),
+            cache_root=os.path.join(root, 'cache'),
+            endpoint_url=os.getenv('BLOB_S3_ENDPOINT_URL')
+        )
+    return LocalBlobBackend(root)
+
+class BlobStore:
+    """
+    Deduplicating upload storage.
+
+    Uploads are streamed to a temporary file while their SHA-256 is
+    computed, then moved into the backend under that hash; if the blob
+    already exists the copy is simply dropped. A refs collection counts the
+    receipts pointing at each blob, and the blob is deleted when the count
+    returns to zero. Reference changes and the matching file operations for
+    one key are serialized within this process.
+    """
+
+    def __init__(self, backend: BlobBackend, refs_collection, staging_dir: str):
+        self.backend = backend
+        self.refs = refs_collection
+        self.staging_dir = Path(staging_dir)
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _lock(self, key: str) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    def _drop_lock(self, key: str):
+        lock = self._locks.get(key)
+        if lock is not None and not lock.locked():
+            del self._locks[key]
+
+    def stage(self, source) -> Tuple[str, int, str]:
+        """Stream a file object to a staging file while hashing it (blocking; run in an executor); returns (key, size, staged path)"""
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.staging_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for block in iter(lambda: source.read(BLOCK_SIZE), b''):
+                    digest.update(block)
+                    out.write(block)
+                    size += len(block)
+        except Exception:
+            os.remove(temp_path)
+            raise
+        return digest.hexdigest(), size, temp_path
+
+    def discard(self, staged: Iterable[Tuple[str, int, str]]):
+        """Remove staging files that will not be committed"""
+        for _, _, temp_path in staged:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _place(self, staged: List[Tuple[str, int, str]]):
+        """Move staging files into the backend, dropping those whose blob already exists (blocking)"""
+        try:
+            for key, _, temp_path in staged:
+                if self.backend.exists(key):
+                    os.remove(temp_path)
+                else:
+                    self.backend.put_file(key, temp_path)
+        finally:
+            self.discard(staged)
+
+    def write_bytes(self, data: bytes) -> Tuple[str, int]:
+        key = hashlib.sha256(data).hexdigest()
+        if not self.backend.exists(key):
+            fd, temp_path = tempfile.mkstemp(dir=self.staging_dir, suffix='.part')
+            with os.fdopen(fd, 'wb') as out:
+                out.write(data)
+            self.backend.put_file(key, temp_path)
+        return key, len(data)
+
+    def path(self, key: str) -> str:
+        return self.backend.local_path(key)
+
+    async def add_refs(self, blobs: Iterable[Tuple[str, int]]):
+        """Count one more reference for each (key, size); one bulk write for the lot"""
+        counts: Dict[str, Tuple[int, int]] = {}
+        for key, size in blobs:
+            refs, _ = counts.get(key, (0, size))
+            counts[key] = (refs + 1, size)
+        if not counts:
+            return
+        now = datetime.now(timezone.utc)
+        await self.refs.bulk_write([
+            UpdateOne({'_id': key},
+                      {'$inc': {'refs': refs}, '$setOnInsert': {'size': size, 'created_at': now}},
+                      upsert=True)
+            for key, (refs, size) in counts.items()
+        ], ordered=False)
+
+    async def store(self, data: bytes) -> Tuple[str, int]:
+        """Store upload bytes and count a reference to them; returns (key, size)"""
+        key = hashlib.sha256(data).hexdigest()
+        async with self._lock(key):
+            await self.add_refs([(key, len(data))])
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self.write_bytes, data)
+        self._drop_lock(key)
+        return key, len(data)
+
+    async def commit(self, staged: List[Tuple[str, int, str]]):
+        """
+        Count a reference for each staged file and move it into the store.
+
+        Like store(), the references are taken under each key's lock before
+        an existing blob is relied on, so a concurrent release() of the last
+        other reference cannot delete a blob the staged files share.
+        """
+        keys = sorted({key for key, _, _ in staged})
+        try:
+            async with contextlib.AsyncExitStack() as locks:
+                for key in keys:
+                    await locks.enter_async_context(self._lock(key))
+                await self.add_refs((key, size) for key, size, _ in staged)
+                loop = asyncio.get_event_loop()
+                await loop.run_in_executor(None, self._place, staged)
+        except Exception:
+            self.discard(staged)
+            raise
+        finally:
+            for key in keys:
+                self._drop_lock(key)
+
+    async def release(self, key: str) -> bool:
+        """Drop one reference; deletes the blob at zero. Returns whether the blob was deleted."""
+        async with self._lock(key):
+            document = await self.refs.find_one_and_update(
+                {'_id': key}, {'$inc': {'refs': -1}}, return_document=ReturnDocument.AFTER
+            )
+            deleted = False
+            if document is not None and document['refs'] <= 0:
+                result = await self.refs.delete_one({'_id': key, 'refs': {'$lte': 0}})
+                if result.deleted_count:
+                    loop = asyncio.get_event_loop()
+                    await loop.run_in_executor(None, self.backend.delete, key)
+                    deleted = True
+        self._drop_lock(key)
+        if not deleted:
+            return False
+        logger.info(f"🗑️ Deleted unreferenced blob {key[:12]}")
+        return True
+
+    async def get_status(self) -> Dict[str, Any]:
+        """Stored vs. referenced bytes, i.e. how much deduplication saves"""
+        totals = await self.refs.aggregate([
+            {'$group': {'_id': None, 'blobs': {'$sum': 1}, 'references': {'$sum': '$refs'},
+                        'stored_bytes': {'$sum': '$size'},
+                        'referenced_bytes': {'$sum': {'$multiply': ['$size', '$refs']}}}}
+        ]).to_list(length=1)
+        if not totals:
+            return {'blobs': 0, 'references': 0, 'stored_bytes': 0, 'referenced_bytes': 0}
+        totals[0].pop('_id')
+        return totals[0]
+
+# Export the blob store
+__all__ = ['BlobStore', 'BlobBackend', 'LocalBlobBackend', 'S3BlobBackend',
+           'backend_from_env', 'hash_file', 'BOTO3_AVAILABLE']
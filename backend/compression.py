@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+Response Compression Middleware (zstd / brotli / gzip)
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+"""
+
+import os
+import zlib
+from typing import Dict, List, Optional, Tuple
+import logging
+
+import anyio
+
+try:
+    import brotli  # Brotli content encoding
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+try:
+    import zstandard  # Zstandard content encoding
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Text formats worth compressing; images, PDFs and archives are already compressed
+COMPRESSIBLE_TYPES = ('application/json', 'text/csv', 'text/plain', 'text/html', 'text/css',
+                      'application/javascript', 'text/javascript', 'application/xml', 'image/svg+xml')
+
+# Server preference when the client accepts several encodings equally
+ENCODING_PREFERENCE = ('zstd', 'br', 'gzip')
+
+def available_encodings() -> List[str]:
+    available = {'gzip': True, 'br': BROTLI_AVAILABLE, 'zstd': ZSTD_AVAILABLE}
+    return [encoding for encoding in ENCODING_PREFERENCE if available[encoding]]
+
+def choose_encoding(accept_encoding: str, supported: List[str]) -> Optional[str]:
+    """Best supported coding from an Accept-Encoding header, honouring q-values"""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in supported:
+        quality = weights.get(encoding, weights.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+class StreamCompressor:
+    """Incremental compressor with a uniform compress()/finish() interface"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int, zstd_level: int):
+        self.encoding = encoding
+        if encoding == 'gzip':
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+        elif encoding == 'br':
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._compressor = zstandard.ZstdCompressor(level=zstd_level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == 'br':
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.finish() if self.encoding == 'br' else self._compressor.flush()
+
+class CompressionMiddleware:
+    """
+    Negotiated response compression for JSON, CSV and other text payloads.
+
+    Whole responses smaller than minimum_size go out untouched. Streaming
+    responses (such as the CSV export) are compressed chunk by chunk as
+    they are produced. Image/PDF downloads, Server-Sent Events and
+    responses that already carry a Content-Encoding bypass compression.
+    Any chunk of at least thread_threshold bytes is compressed in a worker
+    thread so large exports do not stall the event loop.
+    """
+
+    def __init__(self, app, minimum_size: int = None, thread_threshold: int = None,
+                 gzip_level: int = None, brotli_quality: int = None, zstd_level: int = None):
+        self.app = app
+        self.minimum_size = minimum_size if minimum_size is not None else int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+        self.thread_threshold = (thread_threshold if thread_threshold is not None
+                                 else int(os.getenv('COMPRESSION_THREAD_THRESHOLD', str(256 * 1024))))
+        self.gzip_level = gzip_level if gzip_level is not None else int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+        self.brotli_quality = brotli_quality if brotli_quality is not None else int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5'))
+        self.zstd_level = zstd_level if zstd_level is not None else int(os.getenv('COMPRESSION_ZSTD_LEVEL', '3'))
+        self.encodings = available_encodings()
+        logger.info(f"✅ Response compression: {', '.join(self.encodings)} (min {self.minimum_size} bytes)")
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope.get('method') == 'HEAD':
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ''
+        for name, value in scope['headers']:
+            if name == b'accept-encoding':
+                accept_encoding = value.decode('latin-1')
+                break
+        encoding = choose_encoding(accept_encoding, self.encodings) if accept_encoding else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await self.app(scope, receive, _CompressingSend(self, encoding, send))
+
+    async def run_compression(self, func, data: bytes) -> bytes:
+        if len(data) >= self.thread_threshold:
+            return await anyio.to_thread.run_sync(func, data)
+        return func(data)
+
+class _CompressingSend:
+    """Per-response send wrapper deciding whether and how to compress"""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start_message = None
+        self.compressor: Optional[StreamCompressor] = None
+        self.passthrough = False
+
+    def _should_compress(self, message) -> bool:
+        status = message['status']
+        if status < 200 or status in (204, 206, 304):
+            return False
+        content_type = ''
+        for name, value in message.get('headers', []):
+            if name == b'content-encoding':
+                return False
+            if name == b'content-type':
+                content_type = value.decode('latin-1').split(';')[0].strip().lower()
+        return content_type in COMPRESSIBLE_TYPES
+
+    def _compressed_headers(self, content_length: Optional[int]) -> List[Tuple[bytes, bytes]]:
+        headers = []
+        vary = None
+        for name, value in self.start_message.get('headers', []):
+            if name == b'content-length':
+                continue
+            if name == b'vary':
+                vary = value
+                continue
+            if name == b'etag' and not value.startswith(b'W/'):
+                # The compressed bytes differ from the identity representation
+                value = b'W/' + value
+            headers.append((name, value))
+        headers.append((b'content-encoding', self.encoding.encode('latin-1')))
+        headers.append((b'vary', vary + b', Accept-Encoding' if vary else b'Accept-Encoding'))
+        if content_length is not None:
+            headers.append((b'content-length', str(content_length).encode('latin-1')))
+        return headers
+
+    def _new_compressor(self) -> StreamCompressor:
+        middleware = self.middleware
+        return StreamCompressor(self.encoding, middleware.gzip_level, middleware.brotli_quality, middleware.zstd_level)
+
+    async def __call__(self, message):
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        if message['type'] == 'http.response.start':
+            if self._should_compress(message):
+                self.start_message = message
+            else:
+                self.passthrough = True
+                await self.send(message)
+            return
+
+        if message['type'] != 'http.response.body':
+            await self.send(message)
+            return
+
+        body = message.get('body', b'')
+        more_body = message.get('more_body', False)
+        middleware = self.middleware
+
+        if self.compressor is None:
+            if not more_body:
+                # Whole body in one message: compress it or send it as is
+                if len(body) < middleware.minimum_size:
+                    self.passthrough = True
+                    await self.send(self.start_message)
+                    await self.send(message)
+                    return
+
+                compressor = self._new_compressor()
+                compressed = await middleware.run_compression(
+                    lambda data: compressor.compress(data) + compressor.finish(), body
+                )
+                await self.send({**self.start_message, 'headers': self._compressed_headers(len(compressed))})
+                await self.send({'type': 'http.response.body', 'body': compressed, 'more_body': False})
+                return
+
+            # Streaming response: length unknown, compress as chunks arrive
+            self.compressor = self._new_compressor()
+            await self.send({**self.start_message, 'headers': self._compressed_headers(None)})
+
+        compressed = await middleware.run_compression(self.compressor.compress, body) if body else b''
+        if not more_body:
+            compressed += self.compressor.finish()
+        if compressed or not more_body:
+            await self.send({'type': 'http.response.body', 'body': compressed, 'more_body': more_body})
+
+# Export the middleware
+__all__ = ['CompressionMiddleware', 'choose_encoding', 'available_encodings', 'BROTLI_AVAILABLE', 'ZSTD_AVAILABLE']
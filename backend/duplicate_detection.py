@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+Perceptual-Hash Duplicate Receipt Detection
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+"""
+
+import asyncio
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+from image_preprocessing import _ink_mask
+from renditions import is_pdf_file
+
+try:
+    import fitz  # PyMuPDF for first-page PDF hashing
+    FITZ_AVAILABLE = True
+except ImportError:
+    FITZ_AVAILABLE = False
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+DUPLICATE_TOPIC = 'duplicate_index'
+
+# Longest side of the working copy the hashes are computed from
+HASH_WORKING_SIZE = 1024
+
+# Ink-density grid for the fine layout hash: receipts are long and narrow
+LAYOUT_GRID = (16, 64)
+
+@dataclass(frozen=True)
+class ReceiptHashes:
+    """64-bit pHash for the index lookup plus a 1024-bit layout hash to confirm candidates"""
+    phash: int
+    layout: int
+
+    def to_document(self) -> Dict[str, str]:
+        # Hex strings: BSON integers are signed 64-bit
+        return {'phash': f'{self.phash:016x}', 'layout_hash': f'{self.layout:0256x}'}
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> Optional['ReceiptHashes']:
+        if not document.get('phash') or not document.get('layout_hash'):
+            return None
+        return cls(int(document['phash'], 16), int(document['layout_hash'], 16))
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+def _bits(values: np.ndarray) -> int:
+    flat = values.flatten()
+    return int(''.join('1' if bit else '0' for bit in flat), 2)
+
+def load_grey(path: str, max_side: int = HASH_WORKING_SIZE) -> Optional[np.ndarray]:
+    """Small greyscale working copy of an image or a PDF's first page"""
+    if is_pdf_file(path):
+        if not FITZ_AVAILABLE:
+            return None
+        with fitz.open(path) as document:
+            if document.page_count == 0:
+                return None
+            page = document[0]
+            zoom = max_side / max(page.rect.width, page.rect.height)
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+            return np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.width).copy()
+
+    image = Image.open(path)
+    # Decode JPEGs at reduced scale; the hashes need far less than camera resolution
+    image.draft('L', (max_side, max_side))
+    image = ImageOps.exif_transpose(image).convert('L')
+    image.thumbnail((max_side, max_side), Image.BILINEAR)
+    return np.asarray(image)
+
+def crop_to_paper(grey: np.ndarray) -> np.ndarray:
+    """
+    Straightened crop of the receipt paper: the largest bright region of
+    the photo, rotated upright by its minimum-area rectangle. Scans and
+    PDFs, where the paper is the whole image, come back unchanged.
+    """
+    blurred = cv2.GaussianBlur(grey, (5, 5), 0)
+    _, bright = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # Close the text lines so the paper is one component
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 15))
+    bright = cv2.morphologyEx(bright, cv2.MORPH_CLOSE, kernel)
+    contours, _ = cv2.findContours(bright, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return grey
+    paper = max(contours, key=cv2.contourArea)
+    if cv2.contourArea(paper) < 0.1 * grey.size:
+        return grey
+
+    (cx, cy), (w, h), angle = cv2.minAreaRect(paper)
+    if angle > 45:
+        angle -= 90
+        w, h = h, w
+    elif angle < -45:
+        angle += 90
+        w, h = h, w
+    if w * h > 0.95 * grey.size:
+        return grey
+    matrix = cv2.getRotationMatrix2D((cx, cy), angle, 1.0)
+    rotated = cv2.warpAffine(grey, matrix, (grey.shape[1], grey.shape[0]),
+                             flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    # Stay clear of the paper edge, which would otherwise read as ink
+    inset = max(3, int(0.02 * min(w, h)))
+    return cv2.getRectSubPix(rotated, (int(w) - 2 * inset, int(h) - 2 * inset), (cx, cy))
+
+def crop_to_ink(ink: np.ndarray, trim: float = 0.005) -> np.ndarray:
+    """Bounding box of the printed content, ignoring the outermost specks of noise"""
+    rows = ink.sum(axis=1, dtype=np.float64)
+    cols = ink.sum(axis=0, dtype=np.float64)
+    total = rows.sum()
+    if total == 0:
+        return ink
+
+    def span(profile: np.ndarray) -> Tuple[int, int]:
+        cumulative = np.cumsum(profile) / total
+        return int(np.searchsorted(cumulative, trim)), int(np.searchsorted(cumulative, 1 - trim)) + 1
+
+    top, bottom = span(rows)
+    left, right = span(cols)
+    return ink[top:bottom, left:right]
+
+def normalized_ink(grey: np.ndarray) -> np.ndarray:
+    """Ink density of the receipt content, independent of framing, lighting and resolution"""
+    paper = crop_to_paper(grey)
+    ink = crop_to_ink(_ink_mask(paper))
+    return ink.astype(np.float32) / 255.0
+
+def phash(ink: np.ndarray) -> int:
+    """DCT hash: the signs of the lowest 8x8 frequencies of a 32x32 reduction against their median"""
+    small = cv2.resize(ink, (32, 32), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(small)[:8, :8]
+    median = np.median(low.flatten()[1:])
+    return _bits(low > median)
+
+def layout_hash(ink: np.ndarray) -> int:
+    """Which cells of a fine ink-density grid are above the median: text lines, columns and their lengths"""
+    grid = cv2.resize(ink, LAYOUT_GRID, interpolation=cv2.INTER_AREA)
+    return _bits(grid > np.median(grid))
+
+def compute_hashes(path: str) -> Optional[ReceiptHashes]:
+    """Perceptual hashes of a receipt file; CPU-bound, run it in an executor. None if unreadable."""
+    try:
+        grey = load_grey(path)
+    except Exception as e:
+        logger.warning(f"Cannot hash {path}: {str(e)}")
+        return None
+    if grey is None or min(grey.shape) < 16:
+        return None
+    ink = normalized_ink(grey)
+    if ink.size == 0 or min(ink.shape) < 8:
+        return None
+    return ReceiptHashes(phash(ink), layout_hash(ink))
+
+class BKTree:
+    """
+    Burkhard-Keller tree over 64-bit hashes under Hamming distance.
+
+    Each child hangs off its parent at its exact distance from the parent,
+    so by the triangle inequality a search for everything within r of a
+    hash only descends into children at distance d-r..d+r, instead of
+    comparing against every stored hash.
+    """
+
+    def __init__(self):
+        # node: [hash, values, {distance: child}]
+        self._root: Optional[list] = None
+        self.size = 0
+
+    def add(self, value_hash: int, value: Any):
+        self.size += 1
+        if self._root is None:
+            self._root = [value_hash, [value], {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming(value_hash, node[0])
+            if distance == 0:
+                node[1].append(value)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value_hash, [value], {}]
+                return
+            node = child
+
+    def search(self, value_hash: int, max_distance: int) -> List[Tuple[int, Any]]:
+        """(distance, value) for every stored value within max_distance"""
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value_hash, node[0])
+            if distance <= max_distance:
+                found.extend((distance, value) for value in node[1])
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return found
+
+@dataclass(frozen=True)
+class DuplicateMatch:
+    receipt_id: str
+    phash_distance: int
+    layout_distance: int
+
+class DuplicateIndex:
+    """
+    Per-user index of receipt perceptual hashes, for finding near-duplicate
+    uploads (the same paper photographed twice, or a photo and the PDF)
+    before paying for OCR.
+
+    A user's BK-tree is built from the completed receipts in Mongo on first
+    use and then kept current in memory. Candidates within
+    DUPLICATE_MAX_DISTANCE bits of pHash are confirmed against the much
+    finer layout hash. Other workers learn about additions and removals
+    through the progress bus. Removed receipts are dropped from lookups at
+    once and from the tree at the next rebuild.
+    """
+
+    def __init__(self, collection, bus=None, max_distance: int = None, layout_max_distance: int = None):
+        if max_distance is None:
+            max_distance = int(os.getenv('DUPLICATE_MAX_DISTANCE', '10'))
+        if layout_max_distance is None:
+            layout_max_distance = int(os.getenv('DUPLICATE_LAYOUT_MAX_DISTANCE', '32'))
+        self.collection = collection
+        self.bus = bus
+        self.max_distance = max_distance
+        self.layout_max_distance = layout_max_distance
+        self.lookups = 0
+        self.matches = 0
+        # user_id -> tree, and user_id -> {receipt_id: hashes} of live entries
+        self._trees: Dict[str, BKTree] = {}
+        self._entries: Dict[str, Dict[str, ReceiptHashes]] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+        if bus is not None:
+            bus.add_listener(DUPLICATE_TOPIC, self._on_event)
+
+    async def _load(self, user_id: str):
+        if user_id in self._trees:
+            return
+        loading = self._loading.get(user_id)
+        if loading is not None:
+            await loading
+            return
+
+        loading = self._loading[user_id] = asyncio.get_running_loop().create_future()
+        try:
+            entries = {}
+            cursor = self.collection.find(
+                {'user_id': user_id, 'processing_status': 'completed', 'phash': {'$exists': True}},
+                {'_id': 0, 'id': 1, 'phash': 1, 'layout_hash': 1}
+            )
+            async for document in cursor:
+                hashes = ReceiptHashes.from_document(document)
+                if hashes is not None:
+                    entries[document['id']] = hashes
+            # Additions announced while the query ran are kept
+            entries.update(self._entries.get(user_id, {}))
+            self._entries[user_id] = entries
+            self._rebuild(user_id)
+            logger.info(f"🔍 Duplicate index loaded for {user_id}: {len(entries)} receipts")
+        finally:
+            del self._loading[user_id]
+            loading.set_result(None)
+
+    def _rebuild(self, user_id: str):
+        tree = BKTree()
+        for receipt_id, hashes in self._entries[user_id].items():
+            tree.add(hashes.phash, receipt_id)
+        self._trees[user_id] = tree
+
+    async def find(self, user_id: str, hashes: ReceiptHashes) -> Optional[DuplicateMatch]:
+        """The closest confirmed near-duplicate among the user's receipts, if any"""
+        await self._load(user_id)
+        self.lookups += 1
+        entries = self._entries[user_id]
+        best = None
+        for distance, receipt_id in self._trees[user_id].search(hashes.phash, self.max_distance):
+            known = entries.get(receipt_id)
+            if known is None:
+                continue
+            layout_distance = hamming(hashes.layout, known.layout)
+            if layout_distance > self.layout_max_distance:
+                continue
+            if best is None or (layout_distance, distance) < (best.layout_distance, best.phash_distance):
+                best = DuplicateMatch(receipt_id, distance, layout_distance)
+        if best is not None:
+            self.matches += 1
+        return best
+
+    def add(self, user_id: str, receipt_id: str, hashes: ReceiptHashes):
+        """Make a completed receipt findable"""
+        self._publish({'action': 'add', 'user_id': user_id, 'receipt_id': receipt_id, **hashes.to_document()})
+
+    def remove(self, user_id: str, receipt_id: str):
+        self._publish({'action': 'remove', 'user_id': user_id, 'receipt_id': receipt_id})
+
+    def _publish(self, event: Dict[str, Any]):
+        if self.bus is not None:
+            # The bus calls _on_event for this worker as well
+            self.bus.publish([DUPLICATE_TOPIC], 'duplicate_index', event)
+        else:
+            self._on_event(event)
+
+    def _on_event(self, event: Dict[str, Any]):
+        user_id, receipt_id = event['user_id'], event['receipt_id']
+        loaded = user_id in self._trees
+        if not loaded and user_id not in self._loading:
+            # Not in memory; loaded from Mongo with everything else on first use
+            return
+        entries = self._entries.setdefault(user_id, {})
+
+        if event['action'] == 'add':
+            if receipt_id in entries:
+                return
+            hashes = ReceiptHashes.from_document(event)
+            entries[receipt_id] = hashes
+            if loaded:
+                self._trees[user_id].add(hashes.phash, receipt_id)
+        elif entries.pop(receipt_id, None) is not None and loaded:
+            if self._trees[user_id].size > 2 * len(entries) + 64:
+                self._rebuild(user_id)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            'users': len(self._trees),
+            'receipts': sum(len(entries) for entries in self._entries.values()),
+            'lookups': self.lookups,
+            'matches': self.matches,
+            'max_distance': self.max_distance,
+            'layout_max_distance': self.layout_max_distance
+        }
+
+async def promote_duplicate(collection, user_id: str, receipt_id: str) -> Optional[str]:
+    """
+    Make the earliest remaining copy of a deleted original the new original.
+
+    Copies always point at the first upload, so the other copies are
+    repointed at the successor with one update_many. Returns the
+    successor's id, or None when the receipt had no confirmed copies.
+    """
+    successors = await collection.find(
+        {'user_id': user_id, 'duplicate_of': receipt_id}, {'_id': 0, 'id': 1}
+    ).sort('upload_date', 1).limit(1).to_list(length=1)
+    successor_id = successors[0]['id'] if successors else None
+    if successor_id is not None:
+        await collection.update_one({'user_id': user_id, 'id': successor_id}, {'$set': {'duplicate_of': None}})
+        await collection.update_many({'user_id': user_id, 'duplicate_of': receipt_id},
+                                     {'$set': {'duplicate_of': successor_id}})
+    # Possible copies follow the successor, or lose the flag once nothing is left to compare with
+    await collection.update_many({'user_id': user_id, 'possible_duplicate_of': receipt_id},
+                                 {'$set': {'possible_duplicate_of': successor_id}})
+    return successor_id
+
+def _amount(value: Any) -> Optional[float]:
+    """A stored amount ("$12.50", "12.50" or a number) as a float"""
+    try:
+        return float(re.sub(r'[^\d.]', '', str(value))) if value not in (None, '') else None
+    except ValueError:
+        return None
+
+def _same_amount(a: Any, b: Any) -> bool:
+    a, b = _amount(a), _amount(b)
+    return a is not None and b is not None and abs(a - b) < 0.005
+
+def same_purchase(original: Dict[str, Any], receipt: Dict[str, Any]) -> bool:
+    """
+    Whether two OCR'd receipts record the same purchase.
+
+    Perceptual hashes only see the page, and one merchant's template hashes
+    alike for every order printed on it, so a look-alike is a duplicate only
+    when merchant, date and total all agree. A missing field never agrees.
+    """
+    if original.get('merchant_id') and receipt.get('merchant_id'):
+        same_merchant = original['merchant_id'] == receipt['merchant_id']
+    else:
+        names = [(doc.get('merchant_name') or '').strip().lower() for doc in (original, receipt)]
+        same_merchant = bool(names[0]) and names[0] == names[1]
+    date = original.get('receipt_date')
+    return (same_merchant and date is not None and str(date) == str(receipt.get('receipt_date'))
+            and _same_amount(original.get('total_amount'), receipt.get('total_amount')))
+
+def counted_receipts(receipts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    The receipts that count toward totals, one per paper receipt.
+
+    A copy stands in for its original when the original is not among
+    the receipts, e.g. when the original falls outside an export filter.
+    """
+    seen = {receipt.get('id') for receipt in receipts if not receipt.get('duplicate_of')}
+    counted = []
+    for receipt in receipts:
+        original = receipt.get('duplicate_of')
+        if original and original in seen:
+            continue
+        if original:
+            seen.add(original)
+        counted.append(receipt)
+    return counted
+
+# Export the duplicate detection helpers
+__all__ = ['DuplicateIndex', 'DuplicateMatch', 'BKTree', 'ReceiptHashes', 'compute_hashes', 'hamming',
+           'promote_duplicate', 'counted_receipts', 'same_purchase', 'DUPLICATE_TOPIC']
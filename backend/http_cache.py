@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+HTTP Caching: Per-User Versions, ETags and Conditional GETs
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+from pymongo import ReturnDocument
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+VERSION_TOPIC = 'cache_versions'
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+def make_etag(version: int, *parts: Any) -> str:
+    """Weak ETag for a representation derived from a user's data at a given version"""
+    digest = hashlib.blake2s(repr(parts).encode('utf-8'), digest_size=8).hexdigest()
+    return f'W/"{version}-{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, so W/ prefixes are ignored)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    target = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == target:
+            return True
+    return False
+
+def is_not_modified(headers, etag: str, last_modified: Optional[datetime]) -> bool:
+    """Whether a conditional GET can be answered with 304; If-None-Match wins over If-Modified-Since"""
+    if_none_match = headers.get('if-none-match')
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+
+    if_modified_since = headers.get('if-modified-since')
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+class UserVersions:
+    """
+    Per-user data version, bumped after every write to a user's receipts.
+
+    The counter lives in Mongo so it survives restarts and is shared by all
+    workers, but reads come from memory: a user's version is loaded once and
+    then kept current by this worker's own bumps plus the bumps other
+    workers announce on the progress bus (relayed by change streams). When
+    several workers run without change streams, set refresh_seconds (env
+    CACHE_VERSION_REFRESH_SECONDS) to re-read the counter periodically.
+    """
+
+    def __init__(self, collection, bus=None, refresh_seconds: float = None):
+        if refresh_seconds is None:
+            refresh_seconds = float(os.getenv('CACHE_VERSION_REFRESH_SECONDS', '0'))
+        self.collection = collection
+        self.bus = bus
+        self.refresh_seconds = refresh_seconds
+        # user_id -> (version, modified_at, loaded_at)
+        self._versions: Dict[str, Tuple[int, datetime, float]] = {}
+        if bus is not None:
+            bus.add_listener(VERSION_TOPIC, self._on_event)
+
+    def _remember(self, user_id: str, version: int, modified_at: datetime):
+        known = self._versions.get(user_id)
+        if known is None or version >= known[0]:
+            self._versions[user_id] = (version, modified_at, time.monotonic())
+
+    def _on_event(self, event: Dict[str, Any]):
+        modified_at = event['modified_at']
+        if isinstance(modified_at, str):
+            modified_at = datetime.fromisoformat(modified_at)
+        self._remember(event['user_id'], event['version'], modified_at)
+
+    async def current(self, user_id: str) -> Tuple[int, datetime]:
+        """Version and last-modified time of a user's data; hits Mongo only on first use"""
+        known = self._versions.get(user_id)
+        if known is not None and (not self.refresh_seconds or time.monotonic() - known[2] < self.refresh_seconds):
+            return known[0], known[1]
+
+        document = await self.collection.find_one({'user_id': user_id}, {'_id': 0, 'version': 1, 'modified_at': 1})
+        if document is None:
+            document = {'version': 0, 'modified_at': datetime.now(timezone.utc)}
+        modified_at = document['modified_at']
+        if modified_at.tzinfo is None:
+            modified_at = modified_at.replace(tzinfo=timezone.utc)
+        self._remember(user_id, document['version'], modified_at)
+        return self._versions[user_id][0], self._versions[user_id][1]
+
+    async def bump(self, user_id: str) -> int:
+        """Invalidate cached representations of a user's data; call after the write has completed"""
+        modified_at = datetime.now(timezone.utc)
+        document = await self.collection.find_one_and_update(
+            {'user_id': user_id},
+            {'$inc': {'version': 1}, '$set': {'modified_at': modified_at}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        version = document['version']
+        self._remember(user_id, version, modified_at)
+        if self.bus is not None:
+            self.bus.publish([VERSION_TOPIC], 'version', {
+                'user_id': user_id, 'version': version, 'modified_at': modified_at.isoformat()
+            })
+        return version
+
+class ResponseCache:
+    """LRU of encoded response bodies keyed by user and ETag; a version bump makes old keys unreachable"""
+
+    def __init__(self, max_bytes: int = None):
+        if max_bytes is None:
+            max_bytes = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Tuple[str, str], bytes]' = OrderedDict()
+
+    def get(self, user_id: str, etag: str) -> Optional[bytes]:
+        body = self._entries.get((user_id, etag))
+        if body is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end((user_id, etag))
+        self.hits += 1
+        return body
+
+    def put(self, user_id: str, etag: str, body: bytes):
+        if len(body) > self.max_bytes // 4 or (user_id, etag) in self._entries:
+            return
+        self._entries[(user_id, etag)] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self._entries),
+            'bytes': self.size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+# Export the cache helpers
+__all__ = ['UserVersions', 'ResponseCache', 'make_etag', 'etag_matches', 'is_not_modified', 'http_date', 'VERSION_TOPIC']
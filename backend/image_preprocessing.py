@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+Adaptive Image Preprocessing Before OCR
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+"""
+
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+import logging
+
+import cv2
+import numpy as np
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Width of the working copy used for text-height and skew estimation
+ANALYSIS_WIDTH = 600
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes', 'on')
+
+@dataclass
+class PreprocessingConfig:
+    enabled: bool = True
+    target_text_height: int = 32
+    max_side: int = 2560
+    deskew: bool = True
+    max_skew_degrees: float = 10.0
+    binarize: bool = False
+
+    @classmethod
+    def from_env(cls) -> 'PreprocessingConfig':
+        return cls(
+            enabled=_env_flag('OCR_PREPROCESS', 'true'),
+            target_text_height=int(os.getenv('OCR_TARGET_TEXT_HEIGHT', '32')),
+            max_side=int(os.getenv('OCR_MAX_SIDE', '2560')),
+            deskew=_env_flag('OCR_DESKEW', 'true'),
+            max_skew_degrees=float(os.getenv('OCR_MAX_SKEW_DEGREES', '10')),
+            binarize=_env_flag('OCR_BINARIZE', 'false')
+        )
+
+@dataclass
+class PreprocessingResult:
+    image: np.ndarray
+    scale: float = 1.0
+    text_height: Optional[float] = None
+    skew_angle: float = 0.0
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'scale': round(self.scale, 3),
+            'text_height': round(self.text_height, 1) if self.text_height else None,
+            'skew_angle': round(self.skew_angle, 2),
+            'timings_ms': self.timings_ms,
+            'total_ms': round(sum(self.timings_ms.values()), 2)
+        }
+
+def _ink_mask(grey: np.ndarray) -> np.ndarray:
+    """Dark text on light paper as 255 on 0; local thresholding ignores backgrounds and shadows"""
+    return cv2.adaptiveThreshold(grey, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 25, 15)
+
+def estimate_text_height(ink: np.ndarray) -> Optional[float]:
+    """Median glyph height among the connected components of an ink mask"""
+    count, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    if count <= 1:
+        return None
+
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    # Speckles, rules and photo edges are not glyphs
+    glyphs = (areas >= 4) & (heights >= 3) & (heights < ink.shape[0] * 0.1) & (widths < ink.shape[1] * 0.2)
+    if glyphs.sum() < 10:
+        return None
+    return float(np.median(heights[glyphs]))
+
+def _row_profile_sharpness(ink: np.ndarray, angle: float) -> float:
+    h, w = ink.shape
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    rotated = cv2.warpAffine(ink, matrix, (w, h), flags=cv2.INTER_NEAREST)
+    profile = rotated.sum(axis=1, dtype=np.float64)
+    return float(np.square(np.diff(profile)).sum())
+
+def estimate_skew(ink: np.ndarray, max_degrees: float) -> float:
+    """Rotation that makes text lines horizontal, by maximizing row-profile sharpness"""
+    coarse = np.arange(-max_degrees, max_degrees + 0.5, 1.0)
+    best = max(coarse, key=lambda angle: _row_profile_sharpness(ink, angle))
+    fine = np.arange(best - 0.75, best + 0.8, 0.25)
+    return float(max(fine, key=lambda angle: _row_profile_sharpness(ink, angle)))
+
+class ImagePreprocessor:
+    """
+    Prepares receipt photos for OCR: grayscale, downscale to a target text
+    height, deskew and optional binarization.
+
+    Text height and skew are estimated on a small working copy, so the cost
+    of the analysis does not grow with the camera resolution. Every step is
+    timed; the timings are returned with the image. CPU-bound, run it in an
+    executor.
+    """
+
+    def __init__(self, config: PreprocessingConfig = None):
+        self.config = config or PreprocessingConfig.from_env()
+
+    def process_array(self, image: np.ndarray) -> PreprocessingResult:
+        """Preprocess a BGR or grayscale image array"""
+        config = self.config
+        result = PreprocessingResult(image=image)
+        timings = result.timings_ms
+
+        def timed(step: str, start: float):
+            timings[step] = round((time.perf_counter() - start) * 1000, 2)
+
+        start = time.perf_counter()
+        grey = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        timed('grayscale', start)
+
+        start = time.perf_counter()
+        h, w = grey.shape
+        analysis_scale = min(1.0, ANALYSIS_WIDTH / w)
+        small = cv2.resize(grey, None, fx=analysis_scale, fy=analysis_scale, interpolation=cv2.INTER_AREA)
+        ink = _ink_mask(small)
+        timed('analyze', start)
+
+        if config.deskew:
+            start = time.perf_counter()
+            angle = estimate_skew(ink, config.max_skew_degrees)
+            if abs(angle) >= 0.5:
+                result.skew_angle = angle
+                matrix = cv2.getRotationMatrix2D((ink.shape[1] / 2, ink.shape[0] / 2), angle, 1.0)
+                ink = cv2.warpAffine(ink, matrix, (ink.shape[1], ink.shape[0]), flags=cv2.INTER_NEAREST)
+            timed('estimate_skew', start)
+
+        start = time.perf_counter()
+        text_height = estimate_text_height(ink)
+        scale = 1.0
+        if text_height:
+            result.text_height = text_height / analysis_scale
+            scale = min(scale, config.target_text_height / result.text_height)
+        scale = min(scale, config.max_side / max(h, w))
+        if scale < 1.0:
+            grey = cv2.resize(grey, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        result.scale = scale
+        timed('downscale', start)
+
+        if result.skew_angle:
+            start = time.perf_counter()
+            h, w = grey.shape
+            matrix = cv2.getRotationMatrix2D((w / 2, h / 2), result.skew_angle, 1.0)
+            grey = cv2.warpAffine(grey, matrix, (w, h), flags=cv2.INTER_LINEAR,
+                                  borderMode=cv2.BORDER_REPLICATE)
+            timed('deskew', start)
+
+        if config.binarize:
+            start = time.perf_counter()
+            grey = cv2.adaptiveThreshold(grey, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                         cv2.THRESH_BINARY, 31, 15)
+            timed('binarize', start)
+
+        result.image = grey
+        return result
+
+    def process(self, image_path: str) -> Optional[PreprocessingResult]:
+        """Load and preprocess an image file; None if it cannot be read"""
+        start = time.perf_counter()
+        image = cv2.imread(image_path)
+        if image is None:
+            return None
+        load_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        if not self.config.enabled:
+            return PreprocessingResult(image=image, timings_ms={'load': load_ms})
+
+        result = self.process_array(image)
+        result.timings_ms = {'load': load_ms, **result.timings_ms}
+        logger.info(f"Preprocessed {image_path}: {result.stats()}")
+        return result
+
+# Export the preprocessor
+__all__ = ['ImagePreprocessor', 'PreprocessingConfig', 'PreprocessingResult',
+           'estimate_text_height', 'estimate_skew']
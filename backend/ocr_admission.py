@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+OCR Admission Control, Backpressure and Priority Lanes
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional, Tuple
+import logging
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+LANE_INTERACTIVE = 'interactive'
+LANE_BULK = 'bulk'
+LANE_MAINTENANCE = 'maintenance'
+LANES = (LANE_INTERACTIVE, LANE_BULK, LANE_MAINTENANCE)
+
+# Lane -> (weight, max_queue, max_wait_seconds); env OCR_<LANE>_WEIGHT / _MAX_QUEUE / _MAX_WAIT_SECONDS
+DEFAULT_LANE_SETTINGS = {
+    LANE_INTERACTIVE: (8, 32, 30.0),
+    LANE_BULK: (2, 100000, 86400.0),
+    LANE_MAINTENANCE: (1, 1000, 3600.0),
+}
+
+class AdmissionRejected(Exception):
+    """OCR capacity and wait queue are full, or the wait timed out"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+def _percentile(values, fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 3)
+
+class Lane:
+    """Wait queue, fair-share position and latency window of one priority lane"""
+
+    def __init__(self, name: str, weight: float, max_queue: int, max_wait_seconds: float, window: int):
+        self.name = name
+        self.weight = weight
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.in_flight = 0
+        self.pass_value = 0.0
+        self.last_served = 0.0
+        self.waiters: Deque[Tuple[asyncio.Future, float]] = deque()
+        self.wait_times: Deque[float] = deque(maxlen=window)
+        self.service_times: Deque[float] = deque(maxlen=window)
+        self.counters = {'admitted': 0, 'queued_total': 0, 'rejected_full': 0, 'rejected_timeout': 0}
+
+    def starved_for(self, now: float) -> float:
+        """How long the lane has had waiters without being served"""
+        return now - max(self.last_served, self.waiters[0][1]) if self.waiters else 0.0
+
+    def get_status(self) -> Dict[str, Any]:
+        wait_times = list(self.wait_times)
+        service_times = list(self.service_times)
+        return {
+            'weight': self.weight,
+            'in_flight': self.in_flight,
+            'queued': len(self.waiters),
+            'max_queue': self.max_queue,
+            'max_wait_seconds': self.max_wait_seconds,
+            'wait_p50_seconds': _percentile(wait_times, 0.5),
+            'wait_p95_seconds': _percentile(wait_times, 0.95),
+            'service_p50_seconds': _percentile(service_times, 0.5),
+            'service_p95_seconds': _percentile(service_times, 0.95),
+            **self.counters
+        }
+
+class OCRAdmissionController:
+    """
+    Bounds the OCR work in flight and shares it between priority lanes.
+
+    At most max_in_flight requests hold an OCR slot. Each lane
+    (interactive uploads, bulk imports, maintenance jobs) has its own
+    bounded FIFO queue and maximum wait; requests beyond that are rejected
+    immediately with a Retry-After estimate, so an upload burst turns into
+    fast 503s instead of every request slowing down together.
+
+    A freed slot goes to a waiting lane by weighted fair sharing (stride
+    scheduling: the lane with the smallest pass value wins and advances it
+    by 1/weight). A lane that has had waiters but no slot for
+    starvation_seconds is served next regardless of weight, and
+    reserved_interactive slots are never given to other lanes, so a single
+    upload does not queue behind a backfill. OCR itself runs on a dedicated
+    thread pool sized to the slot count, separate from the event loop's
+    default executor.
+
+    All bookkeeping happens on the event loop thread, so no locks are needed.
+    """
+
+    def __init__(self, max_in_flight: int = None, max_queue: int = None, max_wait_seconds: float = None,
+                 reserved_interactive: int = None, starvation_seconds: float = None, window: int = 500):
+        """
+        Args:
+            max_in_flight: Concurrent OCR requests (env OCR_MAX_IN_FLIGHT, default half the CPUs)
+            max_queue: Interactive requests allowed to wait for a slot (env OCR_MAX_QUEUE)
+            max_wait_seconds: Longest an interactive request waits (env OCR_MAX_WAIT_SECONDS)
+            reserved_interactive: Slots only interactive requests may use (env OCR_INTERACTIVE_RESERVED)
+            starvation_seconds: Time without a slot after which a waiting lane goes next (env OCR_STARVATION_SECONDS)
+            window: Number of recent requests per lane kept for latency percentiles
+        """
+        if max_in_flight is None:
+            max_in_flight = int(os.getenv('OCR_MAX_IN_FLIGHT', str(max(1, (os.cpu_count() or 2) // 2))))
+        if reserved_interactive is None:
+            reserved_interactive = int(os.getenv('OCR_INTERACTIVE_RESERVED', '1'))
+        if starvation_seconds is None:
+            starvation_seconds = float(os.getenv('OCR_STARVATION_SECONDS', '60'))
+
+        self.max_in_flight = max_in_flight
+        self.reserved_interactive = max(0, min(reserved_interactive, max_in_flight - 1))
+        self.starvation_seconds = starvation_seconds
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='ocr')
+
+        self.lanes: Dict[str, Lane] = {}
+        for name, (weight, lane_queue, lane_wait) in DEFAULT_LANE_SETTINGS.items():
+            prefix = f'OCR_{name.upper()}'
+            self.lanes[name] = Lane(
+                name,
+                float(os.getenv(f'{prefix}_WEIGHT', str(weight))),
+                int(os.getenv(f'{prefix}_MAX_QUEUE', str(lane_queue))),
+                float(os.getenv(f'{prefix}_MAX_WAIT_SECONDS', str(lane_wait))),
+                window
+            )
+
+        # The interactive lane keeps the original OCR_MAX_QUEUE / OCR_MAX_WAIT_SECONDS settings
+        interactive = self.lanes[LANE_INTERACTIVE]
+        if max_queue is None and os.getenv('OCR_MAX_QUEUE'):
+            max_queue = int(os.getenv('OCR_MAX_QUEUE'))
+        if max_wait_seconds is None and os.getenv('OCR_MAX_WAIT_SECONDS'):
+            max_wait_seconds = float(os.getenv('OCR_MAX_WAIT_SECONDS'))
+        if max_queue is not None:
+            interactive.max_queue = max_queue
+        if max_wait_seconds is not None:
+            interactive.max_wait_seconds = max_wait_seconds
+
+        self.in_flight = 0
+        self._virtual_time = 0.0
+
+    @property
+    def max_queue(self) -> int:
+        return self.lanes[LANE_INTERACTIVE].max_queue
+
+    @property
+    def max_wait_seconds(self) -> float:
+        return self.lanes[LANE_INTERACTIVE].max_wait_seconds
+
+    @property
+    def queued(self) -> int:
+        return sum(len(lane.waiters) for lane in self.lanes.values())
+
+    def _lane_capacity(self, lane: Lane) -> int:
+        if lane.name == LANE_INTERACTIVE:
+            return self.max_in_flight
+        return self.max_in_flight - self.reserved_interactive
+
+    def _has_slot(self, lane: Lane) -> bool:
+        if self.in_flight >= self.max_in_flight:
+            return False
+        if lane.name == LANE_INTERACTIVE:
+            return True
+        others = self.in_flight - self.lanes[LANE_INTERACTIVE].in_flight
+        return others < self._lane_capacity(lane)
+
+    def retry_after(self, lane_name: str = LANE_INTERACTIVE) -> int:
+        """Seconds until a slot is likely free, from recent service times and queue depth"""
+        lane = self.lanes[lane_name]
+        service = sum(lane.service_times) / len(lane.service_times) if lane.service_times else 5.0
+        return max(1, math.ceil(service * (len(lane.waiters) + 1) / max(1, self._lane_capacity(lane))))
+
+    def _start(self, lane: Lane):
+        self.in_flight += 1
+        lane.in_flight += 1
+        # A lane that was idle starts at the current virtual time instead of spending banked credit
+        start_pass = max(lane.pass_value, self._virtual_time)
+        self._virtual_time = start_pass
+        lane.pass_value = start_pass + 1.0 / lane.weight
+        lane.last_served = time.perf_counter()
+
+    def _next_lane(self) -> Optional[Lane]:
+        candidates = [lane for lane in self.lanes.values() if lane.waiters and self._has_slot(lane)]
+        if not candidates:
+            return None
+
+        now = time.perf_counter()
+        starving = [lane for lane in candidates if lane.starved_for(now) >= self.starvation_seconds]
+        if starving:
+            return max(starving, key=lambda lane: lane.starved_for(now))
+        return min(candidates, key=lambda lane: (max(lane.pass_value, self._virtual_time), -lane.weight))
+
+    def _dispatch(self):
+        """Hand free slots to waiting lanes"""
+        while self.in_flight < self.max_in_flight:
+            lane = self._next_lane()
+            if lane is None:
+                return
+            waiter, _ = lane.waiters.popleft()
+            self._start(lane)
+            waiter.set_result(None)
+
+    async def _acquire(self, lane: Lane):
+        if not lane.waiters and self._has_slot(lane):
+            self._start(lane)
+            return
+
+        if len(lane.waiters) >= lane.max_queue:
+            lane.counters['rejected_full'] += 1
+            raise AdmissionRejected(f'OCR {lane.name} queue is full', self.retry_after(lane.name))
+
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (waiter, time.perf_counter())
+        lane.waiters.append(entry)
+        lane.counters['queued_total'] += 1
+        try:
+            await asyncio.wait({waiter}, timeout=lane.max_wait_seconds)
+        except asyncio.CancelledError:
+            # Client went away; give back a slot handed over in the meantime
+            if waiter.done():
+                self._release(lane)
+            else:
+                waiter.cancel()
+                lane.waiters.remove(entry)
+            raise
+
+        if not waiter.done():
+            waiter.cancel()
+            lane.waiters.remove(entry)
+            lane.counters['rejected_timeout'] += 1
+            raise AdmissionRejected(f'Timed out waiting for OCR capacity ({lane.name})', self.retry_after(lane.name))
+
+    def check(self, lane_name: str = LANE_INTERACTIVE):
+        """Raise AdmissionRejected at once if admit() would find the lane's queue full"""
+        lane = self.lanes[lane_name]
+        if len(lane.waiters) >= lane.max_queue and not self._has_slot(lane):
+            lane.counters['rejected_full'] += 1
+            raise AdmissionRejected(f'OCR {lane.name} queue is full', self.retry_after(lane.name))
+
+    def _release(self, lane: Lane):
+        self.in_flight -= 1
+        lane.in_flight -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admit(self, lane_name: str = LANE_INTERACTIVE):
+        """Hold an OCR slot in a lane for the duration of the block; raises AdmissionRejected"""
+        lane = self.lanes[lane_name]
+        arrived = time.perf_counter()
+        await self._acquire(lane)
+        started = time.perf_counter()
+        lane.wait_times.append(started - arrived)
+        lane.counters['admitted'] += 1
+        try:
+            yield
+        finally:
+            lane.service_times.append(time.perf_counter() - started)
+            self._release(lane)
+
+    async def run(self, func, *args):
+        """Run CPU-bound OCR work on the dedicated pool"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Live saturation numbers, overall and per lane, for health and status endpoints"""
+        interactive = self.lanes[LANE_INTERACTIVE]
+        totals = {key: sum(lane.counters[key] for lane in self.lanes.values()) for key in interactive.counters}
+        return {
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'reserved_interactive': self.reserved_interactive,
+            'queued': self.queued,
+            'max_queue': self.max_queue,
+            'max_wait_seconds': self.max_wait_seconds,
+            'saturation': round((self.in_flight + len(interactive.waiters)) /
+                                (self.max_in_flight + interactive.max_queue), 3),
+            'retry_after_seconds': self.retry_after(),
+            **totals,
+            'lanes': {name: lane.get_status() for name, lane in self.lanes.items()}
+        }
+
+# Export the controller
+__all__ = ['OCRAdmissionController', 'AdmissionRejected', 'LANES',
+           'LANE_INTERACTIVE', 'LANE_BULK', 'LANE_MAINTENANCE']
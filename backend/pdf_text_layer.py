@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+PDF Text Layer Extraction for Digital Receipts
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional
+import logging
+
+try:
+    import fitz  # PyMuPDF for text layer extraction and page rendering
+    FITZ_AVAILABLE = True
+except ImportError:
+    FITZ_AVAILABLE = False
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Pages with fewer extractable characters are treated as scans
+MIN_TEXT_LAYER_CHARS = 20
+
+# Rendering resolution for pages that still need OCR
+OCR_RENDER_DPI = 200
+
+@dataclass
+class PdfPage:
+    number: int
+    results: Optional[List] = None
+
+    @property
+    def needs_ocr(self) -> bool:
+        return self.results is None
+
+def page_words(page) -> Optional[List]:
+    """Words of a page's text layer as readtext-style (box, text, confidence) results, or None for scans"""
+    words = page.get_text('words', sort=True)
+    if sum(len(word[4]) for word in words) < MIN_TEXT_LAYER_CHARS:
+        return None
+    return [
+        ([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], text, 1.0)
+        for x0, y0, x1, y1, text, *_ in words
+    ]
+
+def extract_pdf_pages(pdf_path: str) -> List[PdfPage]:
+    """
+    Split a PDF into pages that carry a text layer and pages that need OCR.
+
+    Text-layer pages come with their word boxes, in the same shape as
+    EasyOCR results, so they go straight to the layout parser without
+    rasterization or OCR.
+    """
+    pages = []
+    with fitz.open(pdf_path) as document:
+        for page in document:
+            pages.append(PdfPage(page.number, page_words(page)))
+
+    text_pages = sum(not page.needs_ocr for page in pages)
+    logger.info(f"PDF {pdf_path}: {text_pages}/{len(pages)} pages with a text layer")
+    return pages
+
+def rasterize_pdf_page(pdf_path: str, page_number: int, output_path: str, dpi: int = OCR_RENDER_DPI) -> str:
+    """Render a single page to a PNG for OCR"""
+    with fitz.open(pdf_path) as document:
+        document[page_number].get_pixmap(dpi=dpi).save(output_path)
+    return output_path
+
+# Export the extractors
+__all__ = ['FITZ_AVAILABLE', 'PdfPage', 'extract_pdf_pages', 'rasterize_pdf_page']
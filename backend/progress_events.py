@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+Receipt Processing Progress Events (in-process bus + Mongo relay)
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+"""
+
+import asyncio
+import json
+import os
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+import logging
+
+from pymongo.errors import OperationFailure
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Processing stages, in order
+STAGE_QUEUED = 'queued'
+STAGE_OCR = 'ocr'
+STAGE_PARSING = 'parsing'
+STAGE_CATEGORIZED = 'categorized'
+STAGE_COMPLETED = 'completed'
+STAGE_FAILED = 'failed'
+TERMINAL_STAGES = (STAGE_COMPLETED, STAGE_FAILED)
+
+# How long relayed events are kept in Mongo for other workers
+EVENT_TTL_SECONDS = int(os.getenv('PROGRESS_EVENT_TTL_SECONDS', '3600'))
+
+def receipt_topic(receipt_id: str) -> str:
+    return f'receipt:{receipt_id}'
+
+def batch_topic(batch_id: str) -> str:
+    return f'batch:{batch_id}'
+
+def is_final_event(event_type: str, data: Dict[str, Any]) -> bool:
+    """Whether an event ends a receipt's or a batch's processing"""
+    if event_type == 'stage':
+        return data.get('stage') in TERMINAL_STAGES
+    if event_type == 'batch':
+        return data.get('status') != 'processing'
+    return False
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Serialize an event as one Server-Sent Events message"""
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+class ProgressBus:
+    """
+    In-process publish/subscribe for processing progress.
+
+    Subscribers get a bounded queue per connection; a client that stops
+    reading loses its oldest undelivered events rather than holding memory.
+    The latest event of each topic is retained (up to `retain` topics) so a
+    client that connects mid-way immediately learns the current stage
+    without a database read.
+    """
+
+    def __init__(self, buffer_size: int = 100, retain: int = 10000):
+        self.buffer_size = buffer_size
+        self.retain = retain
+        self.worker_id = uuid.uuid4().hex
+        self.relay = None
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._listeners: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+        self._latest: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._seq = 0
+
+    def latest(self, topic: str) -> Optional[Dict[str, Any]]:
+        return self._latest.get(topic)
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def publish(self, topics: Iterable[str], event_type: str, data: Dict[str, Any], relay: bool = True):
+        """Deliver an event to every subscriber of any of the topics (event loop thread only)"""
+        self._seq += 1
+        event = {
+            'seq': self._seq,
+            'type': event_type,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            **data
+        }
+        topics = list(topics)
+
+        delivered = set()
+        for topic in topics:
+            self._latest[topic] = event
+            self._latest.move_to_end(topic)
+            for queue in self._subscribers.get(topic, ()):
+                if id(queue) in delivered:
+                    continue
+                delivered.add(id(queue))
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(event)
+
+            for listener in self._listeners.get(topic, ()):
+                listener(event)
+
+        while len(self._latest) > self.retain:
+            self._latest.popitem(last=False)
+
+        if relay and self.relay:
+            self.relay.forward(topics, event_type, data)
+        return event
+
+    def add_listener(self, topic: str, listener: Callable[[Dict[str, Any]], None]):
+        """Call listener synchronously with every event on the topic, for in-process state that follows events"""
+        self._listeners.setdefault(topic, []).append(listener)
+
+    @asynccontextmanager
+    async def subscribe(self, topics: Iterable[str]):
+        """Queue receiving every event published to the topics while the block runs"""
+        topics = list(topics)
+        queue = asyncio.Queue(maxsize=self.buffer_size)
+        for topic in topics:
+            self._subscribers.setdefault(topic, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            for topic in topics:
+                queues = self._subscribers.get(topic)
+                if queues is not None:
+                    queues.discard(queue)
+                    if not queues:
+                        del self._subscribers[topic]
+
+class MongoProgressRelay:
+    """
+    Fans progress events out to the other server workers.
+
+    Events other workers act on are also inserted into a small TTL
+    collection: every event on `topics` (shared state such as cache versions)
+    and the final event of each receipt and batch. Intermediate stages only
+    drive progress on the worker doing the processing, so they stay local
+    instead of costing a Mongo write each. A change stream on the collection
+    republishes events from other workers into the local bus. Change
+    streams need a replica set or sharded cluster; on a standalone server
+    the relay disables itself and progress stays per-worker.
+    """
+
+    def __init__(self, bus: ProgressBus, collection, topics: Iterable[str] = ()):
+        self.bus = bus
+        self.collection = collection
+        self.topics = frozenset(topics)
+        self.enabled = False
+        self._pending: Set[asyncio.Task] = set()
+
+    async def start(self) -> bool:
+        """Probe change stream support, then watch in the background; returns whether the relay is active"""
+        try:
+            stream = self.collection.watch([{'$match': {'operationType': 'insert'}}])
+            first = await stream.try_next()
+        except OperationFailure as e:
+            logger.info(f"Progress relay disabled, change streams not supported: {str(e)}")
+            return False
+        except Exception as e:
+            logger.warning(f"Progress relay unavailable: {str(e)}")
+            return False
+
+        await self.collection.create_index('created_at', expireAfterSeconds=EVENT_TTL_SECONDS)
+        self.enabled = True
+        self.bus.relay = self
+        if first is not None:
+            self._receive(first)
+        task = asyncio.create_task(self._watch(stream))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        logger.info("✅ Progress events relayed across workers via change streams")
+        return True
+
+    def forward(self, topics, event_type: str, data: Dict[str, Any]):
+        topics = list(topics)
+        if self.topics.isdisjoint(topics) and not is_final_event(event_type, data):
+            return
+        task = asyncio.create_task(self.collection.insert_one({
+            'origin': self.bus.worker_id,
+            'topics': topics,
+            'type': event_type,
+            'data': data,
+            'created_at': datetime.now(timezone.utc)
+        }))
+        self._pending.add(task)
+        task.add_done_callback(self._forwarded)
+
+    def _forwarded(self, task: asyncio.Task):
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.warning(f"Progress relay write failed: {task.exception()}")
+
+    def _receive(self, change: Dict[str, Any]):
+        document = change['fullDocument']
+        if document['origin'] != self.bus.worker_id:
+            self.bus.publish(document['topics'], document['type'], document['data'], relay=False)
+
+    async def _watch(self, stream):
+        try:
+            async with stream:
+                async for change in stream:
+                    self._receive(change)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Progress relay stopped: {str(e)}")
+            self.enabled = False
+            self.bus.relay = None
+
+# Export the bus
+__all__ = ['ProgressBus', 'MongoProgressRelay', 'format_sse', 'is_final_event', 'receipt_topic', 'batch_topic',
+           'STAGE_QUEUED', 'STAGE_OCR', 'STAGE_PARSING', 'STAGE_CATEGORIZED',
+           'STAGE_COMPLETED', 'STAGE_FAILED', 'TERMINAL_STAGES']
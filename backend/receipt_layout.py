@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+Layout-Aware Receipt Parser for EasyOCR Results
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+"""
+
+import re
+from dataclasses import dataclass, field
+from statistics import median
+from typing import Any, Dict, List, Optional, Sequence
+import logging
+
+from robust_date_extractor import extract_date
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Money value at the end of an OCR token ("12.99", "$1,204.50", "TOTAL 45,00")
+MONEY_PATTERN = re.compile(r'(?:^|\s)([\$₹€£]?\s?-?\d{1,3}(?:,\d{3})*[.,]\d{2})\s*$')
+
+# Cheap pre-check before handing a line to the date extractor
+DATE_HINT_PATTERN = re.compile(
+    r'\d{1,4}[-/.]\d{1,2}[-/.]\d{2,4}|\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+\d{1,2}\b',
+    re.IGNORECASE
+)
+
+SUBTOTAL_KEYWORDS = ('subtotal', 'sub total', 'sub-total')
+TAX_KEYWORDS = ('tax', 'vat', 'gst', 'hst', 'cgst', 'sgst', 'igst')
+TOTAL_KEYWORDS = ('total', 'amount due', 'balance due', 'amount payable', 'net amount')
+# Summary lines that mention a total but are not the amount due ("TOTAL SAVINGS", "TOTAL TENDERED")
+NOT_TOTAL_KEYWORDS = ('saving', 'saved', 'tender', 'change', 'item', 'discount')
+PAYMENT_KEYWORDS = ('change', 'cash', 'tender', 'visa', 'mastercard', 'amex', 'card', 'payment', 'paid')
+NON_ITEM_KEYWORDS = ('tip', 'discount', 'savings', 'balance', 'rounding')
+
+# OCR results below this confidence are dropped, as in the flat-text path
+MIN_TOKEN_CONFIDENCE = 0.2
+
+@dataclass
+class LayoutToken:
+    text: str
+    confidence: float
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+
+    @property
+    def center_y(self) -> float:
+        return (self.y0 + self.y1) / 2
+
+    @property
+    def height(self) -> float:
+        return self.y1 - self.y0
+
+@dataclass
+class LayoutLine:
+    tokens: List[LayoutToken]
+    label: str = ''
+    amount: Optional[float] = None
+    amount_right: Optional[float] = None
+    kind: str = 'text'
+
+    @property
+    def text(self) -> str:
+        return ' '.join(token.text for token in self.tokens)
+
+    @property
+    def confidence(self) -> float:
+        return min(token.confidence for token in self.tokens)
+
+@dataclass
+class ReceiptLayout:
+    lines: List[LayoutLine] = field(default_factory=list)
+    items: List[Dict[str, Any]] = field(default_factory=list)
+    total: Optional[float] = None
+    subtotal: Optional[float] = None
+    tax: Optional[float] = None
+    date: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        """Receipt text in reading order, one OCR line per text line"""
+        return '\n'.join(line.text for line in self.lines)
+
+def _parse_money(value: str) -> Optional[float]:
+    cleaned = re.sub(r'[\$₹€£\s]', '', value)
+    # "12,99" is a decimal comma; "1,204.50" uses a thousands separator
+    if re.fullmatch(r'-?\d+,\d{2}', cleaned):
+        cleaned = cleaned.replace(',', '.')
+    try:
+        return float(cleaned.replace(',', ''))
+    except ValueError:
+        return None
+
+def _to_tokens(ocr_results: Sequence, y_offset: float) -> List[LayoutToken]:
+    tokens = []
+    for box, text, confidence in ocr_results:
+        if confidence <= MIN_TOKEN_CONFIDENCE or not str(text).strip():
+            continue
+        xs = [float(point[0]) for point in box]
+        ys = [float(point[1]) for point in box]
+        tokens.append(LayoutToken(str(text).strip(), float(confidence),
+                                  min(xs), min(ys) + y_offset, max(xs), max(ys) + y_offset))
+    return tokens
+
+def _group_lines(tokens: List[LayoutToken]) -> List[LayoutLine]:
+    """Single pass over tokens sorted by vertical center; a token joins the open line when it overlaps it vertically"""
+    if not tokens:
+        return []
+
+    tolerance = 0.5 * median(token.height for token in tokens)
+    lines: List[LayoutLine] = []
+    current: List[LayoutToken] = []
+    current_y = None
+
+    for token in sorted(tokens, key=lambda t: t.center_y):
+        if current and abs(token.center_y - current_y) > tolerance:
+            lines.append(LayoutLine(sorted(current, key=lambda t: t.x0)))
+            current = []
+        current.append(token)
+        current_y = sum(t.center_y for t in current) / len(current)
+
+    lines.append(LayoutLine(sorted(current, key=lambda t: t.x0)))
+    return lines
+
+def _split_amount(line: LayoutLine):
+    """Separate the rightmost money value of a line from its label"""
+    last = line.tokens[-1]
+    match = MONEY_PATTERN.search(last.text)
+    if not match:
+        line.label = line.text
+        return
+
+    line.amount = _parse_money(match.group(1))
+    line.amount_right = last.x1
+    head = last.text[:match.start(1)].strip()
+    line.label = ' '.join([token.text for token in line.tokens[:-1]] + ([head] if head else []))
+
+def _classify(label: str) -> str:
+    label_lower = label.lower()
+    if any(keyword in label_lower for keyword in SUBTOTAL_KEYWORDS):
+        return 'subtotal'
+    if any(re.search(rf'\b{keyword}\b', label_lower) for keyword in TAX_KEYWORDS):
+        return 'tax'
+    mentions_total = any(keyword in label_lower for keyword in TOTAL_KEYWORDS)
+    if mentions_total and not any(keyword in label_lower for keyword in NOT_TOTAL_KEYWORDS):
+        return 'total'
+    if any(keyword in label_lower for keyword in PAYMENT_KEYWORDS):
+        return 'payment'
+    if mentions_total or any(keyword in label_lower for keyword in NON_ITEM_KEYWORDS):
+        return 'other'
+    return 'item'
+
+def parse_receipt_layout(pages: Sequence[Sequence]) -> ReceiptLayout:
+    """
+    Parse EasyOCR readtext(detail=1) results into lines, items and totals.
+
+    Args:
+        pages: One list of (box, text, confidence) results per page
+
+    Tokens are grouped into lines by box geometry, each line's rightmost
+    money value is taken as its amount, and amounts aligned with the
+    receipt's right-hand price column are classified by their label:
+    subtotal, tax, total, payment, or a line item when above the first
+    summary line. The total is the last total line above the payments;
+    totals printed after them ("BALANCE DUE 0.00") are what is left to pay.
+    """
+    tokens: List[LayoutToken] = []
+    y_offset = 0.0
+    for page in pages:
+        page_tokens = _to_tokens(page, y_offset)
+        tokens.extend(page_tokens)
+        if page_tokens:
+            y_offset = max(token.y1 for token in page_tokens) + 1
+
+    layout = ReceiptLayout(lines=_group_lines(tokens))
+    if not layout.lines:
+        return layout
+
+    for line in layout.lines:
+        _split_amount(line)
+
+    # The price column: right edges of amounts, with a tolerance of a few character heights
+    rights = [line.amount_right for line in layout.lines if line.amount is not None]
+    column_right = median(rights) if rights else None
+    column_tolerance = 3 * median(token.height for token in tokens)
+
+    # Total lines above the first payment line, and those after it
+    totals, later_totals = [], []
+    summary_started = payment_seen = False
+    for line in layout.lines:
+        if layout.date is None and DATE_HINT_PATTERN.search(line.text):
+            layout.date = extract_date(line.text)
+
+        if line.amount is None or abs(line.amount_right - column_right) > column_tolerance:
+            continue
+
+        line.kind = _classify(line.label)
+        if line.kind == 'subtotal':
+            layout.subtotal = line.amount
+            summary_started = True
+        elif line.kind == 'tax':
+            layout.tax = (layout.tax or 0.0) + line.amount
+            summary_started = True
+        elif line.kind == 'total':
+            (later_totals if payment_seen else totals).append(line.amount)
+            summary_started = True
+        elif line.kind == 'payment' and summary_started:
+            # A card or cash mention above the summary does not end the items
+            payment_seen = True
+        elif line.kind == 'item' and not summary_started and line.label and line.amount > 0:
+            layout.items.append({
+                'description': line.label,
+                'amount': line.amount,
+                'confidence': round(line.confidence, 3)
+            })
+
+    if totals or later_totals:
+        # The last total before payment includes any discounts printed above it
+        layout.total = (totals or later_totals)[-1]
+
+    logger.info(f"Layout parsed: {len(layout.lines)} lines, {len(layout.items)} items, "
+                f"total={layout.total}, subtotal={layout.subtotal}, tax={layout.tax}, date={layout.date}")
+    return layout
+
+# Export the parser
+__all__ = ['parse_receipt_layout', 'ReceiptLayout', 'LayoutLine', 'LayoutToken']
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+Direct JSON Serialization of Receipt Documents
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+"""
+
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Type
+import logging
+
+try:
+    import orjson  # Fast JSON encoder with native datetime support
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+from pydantic import BaseModel
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+if ORJSON_AVAILABLE:
+    # Mongo hands back naive UTC datetimes; render them like Pydantic does ("...Z")
+    ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+
+def _default(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat().replace('+00:00', 'Z')
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def dumps(value: Any) -> bytes:
+    """Encode a JSON response body"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value, option=ORJSON_OPTIONS)
+    return json.dumps(value, default=_default, separators=(',', ':')).encode('utf-8')
+
+class DocumentSerializer:
+    """
+    Builds response bytes straight from Mongo documents shaped like a model.
+
+    The projection fetches only the model's fields (no _id), and missing
+    fields are filled from the model defaults, so the output matches what
+    the model would serialize to without constructing or validating it.
+    With validate=True every document is also checked against the model,
+    which is meant for development and tests.
+    """
+
+    def __init__(self, model: Type[BaseModel], validate: bool = False):
+        self.model = model
+        self.validate = validate
+        self.projection = {'_id': 0, **{name: 1 for name in model.model_fields}}
+        self.defaults = {}
+        self.default_factories = {}
+        for name, field in model.model_fields.items():
+            if field.default_factory is not None:
+                self.default_factories[name] = field.default_factory
+            elif not field.is_required():
+                self.defaults[name] = field.default
+
+    def normalize(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        if len(document) < len(self.projection) - 1:
+            for name, value in self.defaults.items():
+                document.setdefault(name, value)
+            for name, factory in self.default_factories.items():
+                if name not in document:
+                    document[name] = factory()
+        if self.validate:
+            self.model.model_validate(document)
+        return document
+
+    def dumps_one(self, document: Dict[str, Any]) -> bytes:
+        return dumps(self.normalize(document))
+
+    def dumps_many(self, documents: Iterable[Dict[str, Any]]) -> bytes:
+        return dumps([self.normalize(document) for document in documents])
+
+async def migrate_string_dates(collection, field: str) -> int:
+    """Convert ISO-string dates left by older versions to native BSON dates, server-side"""
+    result = await collection.update_many(
+        {field: {'$type': 'string'}},
+        [{'$set': {field: {'$dateFromString': {'dateString': f'${field}', 'onError': '$$NOW'}}}}]
+    )
+    if result.modified_count:
+        logger.info(f"Converted {result.modified_count} string {field} values to dates")
+    return result.modified_count
+
+# Export the serializer
+__all__ = ['ORJSON_AVAILABLE', 'DocumentSerializer', 'dumps', 'migrate_string_dates']
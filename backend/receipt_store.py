@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+Receipt Persistence with Coalesced Bulk Writes
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+"""
+
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+import logging
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, WriteError
+from pymongo.write_concern import WriteConcern
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+def write_concern_from_env() -> Optional[WriteConcern]:
+    """RECEIPT_WRITE_CONCERN ("0", "1", "majority", ...) and RECEIPT_WRITE_JOURNAL; None keeps the client default"""
+    w = os.getenv('RECEIPT_WRITE_CONCERN')
+    journal = os.getenv('RECEIPT_WRITE_JOURNAL')
+    if w is None and journal is None:
+        return None
+    if w is not None and w.isdigit():
+        w = int(w)
+    return WriteConcern(w=w, j=journal.lower() == 'true' if journal is not None else None)
+
+class BulkWriter:
+    """
+    Coalesces single-document updates from many workers into bulk_write calls.
+
+    Updates queue up per document key: $set fields merge (last write wins)
+    and $inc fields add up, so ten progress bumps to one batch document
+    become one update. Pending updates are flushed every interval_ms, or
+    immediately once max_batch documents are waiting. Each caller gets a
+    future that resolves when its update has been written, or fails with
+    the error of its own document only.
+    """
+
+    def __init__(self, collection, key: str = 'id', interval_ms: float = None, max_batch: int = None):
+        if interval_ms is None:
+            interval_ms = float(os.getenv('RECEIPT_BULK_INTERVAL_MS', '50'))
+        if max_batch is None:
+            max_batch = int(os.getenv('RECEIPT_BULK_MAX_OPS', '500'))
+
+        self.collection = collection
+        self.key = key
+        self.interval = interval_ms / 1000.0
+        self.max_batch = max_batch
+        self._pending: Dict[Any, Dict[str, Any]] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {'updates': 0, 'documents': 0, 'flushes': 0, 'errors': 0}
+
+    def set(self, key, fields: Dict[str, Any]) -> asyncio.Future:
+        return self._enqueue(key, fields, {})
+
+    def inc(self, key, fields: Dict[str, Any]) -> asyncio.Future:
+        return self._enqueue(key, {}, fields)
+
+    def _enqueue(self, key, set_fields: Dict[str, Any], inc_fields: Dict[str, Any]) -> asyncio.Future:
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = self._pending[key] = {'$set': {}, '$inc': {}, 'futures': []}
+        entry['$set'].update(set_fields)
+        for field, amount in inc_fields.items():
+            entry['$inc'][field] = entry['$inc'].get(field, 0) + amount
+
+        future = asyncio.get_running_loop().create_future()
+        entry['futures'].append(future)
+        self.stats['updates'] += 1
+
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        if len(self._pending) >= self.max_batch:
+            self._wake.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return future
+
+    async def _run(self):
+        # Runs only while there is something to write, so it needs no startup hook
+        try:
+            while self._pending:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                await self.flush()
+        finally:
+            self._task = None
+
+    async def flush(self):
+        """Write everything pending in one unordered bulk_write"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+
+        entries = list(pending.values())
+        operations = []
+        for key, entry in pending.items():
+            update = {op: entry[op] for op in ('$set', '$inc') if entry[op]}
+            operations.append(UpdateOne({self.key: key}, update))
+
+        # Operation index -> the error its callers get
+        failures: Dict[int, Exception] = {}
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            write_errors = e.details.get('writeErrors', [])
+            if write_errors and not e.details.get('writeConcernErrors'):
+                # An unordered bulk write applies every other operation; only these documents failed
+                failures = {error['index']: WriteError(error.get('errmsg'), error.get('code'), error)
+                            for error in write_errors}
+            else:
+                failures = dict.fromkeys(range(len(operations)), e)
+        except Exception as e:
+            failures = dict.fromkeys(range(len(operations)), e)
+        if failures:
+            logger.error(f"Bulk write of {len(operations)} updates failed for {len(failures)}: "
+                         f"{str(next(iter(failures.values())))}")
+            self.stats['errors'] += 1
+
+        self.stats['flushes'] += 1
+        self.stats['documents'] += len(operations)
+        for index, entry in enumerate(entries):
+            error = failures.get(index)
+            for future in entry['futures']:
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+    async def close(self):
+        """Write out anything still pending"""
+        if self._task is not None:
+            self._wake.set()
+            await self._task
+        await self.flush()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            'pending': len(self._pending),
+            'interval_ms': self.interval * 1000,
+            'max_batch': self.max_batch,
+            **self.stats
+        }
+
+class ReceiptStore:
+    """
+    Receipt and batch writes with a configurable write concern.
+
+    Synchronous uploads are written once, after OCR, as a complete document.
+    Queued receipts (batches, and uploads with wait=false) are inserted up
+    front and their results, along with batch progress counters, go
+    through BulkWriters.
+    """
+
+    def __init__(self, db, write_concern: Optional[WriteConcern] = None):
+        if write_concern is None:
+            write_concern = write_concern_from_env()
+        options = {'write_concern': write_concern} if write_concern is not None else {}
+
+        self.receipts = db.receipts.with_options(**options)
+        self.batches = db.receipt_batches.with_options(**options)
+        self.write_concern = write_concern
+        self.receipt_updates = BulkWriter(self.receipts)
+        self.batch_updates = BulkWriter(self.batches)
+
+    async def insert(self, receipt: Dict[str, Any]):
+        await self.receipts.insert_one(receipt)
+
+    async def insert_many(self, receipts: List[Dict[str, Any]]):
+        await self.receipts.insert_many(receipts, ordered=False)
+
+    async def insert_batch(self, batch: Dict[str, Any]):
+        await self.batches.insert_one(batch)
+
+    async def close(self):
+        await self.receipt_updates.close()
+        await self.batch_updates.close()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            'write_concern': self.write_concern.document if self.write_concern is not None else 'default',
+            'receipt_updates': self.receipt_updates.get_status(),
+            'batch_updates': self.batch_updates.get_status()
+        }
+
+# Export the store
+__all__ = ['ReceiptStore', 'BulkWriter', 'write_concern_from_env']
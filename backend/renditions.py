@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+Receipt Thumbnails and Preview Renditions
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+"""
+
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+import logging
+
+from PIL import Image, ImageOps, features
+
+try:
+    import fitz  # PyMuPDF for first-page PDF previews
+    FITZ_AVAILABLE = True
+except ImportError:
+    FITZ_AVAILABLE = False
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Rendition name -> longest side in pixels
+RENDITION_SIZES: Dict[str, int] = {
+    'thumb': int(os.getenv('RENDITION_THUMB_SIZE', '320')),
+    'preview': int(os.getenv('RENDITION_PREVIEW_SIZE', '1280')),
+}
+
+# Bump when rendering changes so cached renditions and client caches are replaced
+RENDITION_VERSION = 1
+
+MEDIA_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+def default_format() -> str:
+    requested = os.getenv('RENDITION_FORMAT', 'webp').lower()
+    if requested == 'webp' and not features.check('webp'):
+        return 'jpeg'
+    return requested if requested in MEDIA_TYPES else 'jpeg'
+
+def is_pdf_file(path: str) -> bool:
+    """Sniff the PDF signature; stored blobs have no file extension"""
+    with open(path, 'rb') as f:
+        return f.read(5) == b'%PDF-'
+
+class RenditionService:
+    """
+    Renders small list thumbnails and larger previews of receipt originals.
+
+    A rendition is named after the original's content hash, its size and
+    format (plus RENDITION_VERSION), so identical uploads share renditions
+    and a name never refers to different bytes: the files can be cached
+    forever on disk and by clients. Rendering is CPU-bound and meant to run
+    in an executor; concurrent renders of the same rendition are harmless
+    because files are written to a temporary name and atomically renamed.
+    """
+
+    def __init__(self, cache_dir: str = None, image_format: str = None, quality: int = None):
+        self.cache_dir = Path(cache_dir or os.getenv('RENDITION_CACHE_DIR', 'uploads/renditions'))
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.format = image_format or default_format()
+        self.quality = quality or int(os.getenv('RENDITION_QUALITY', '75'))
+        self.media_type = MEDIA_TYPES[self.format]
+        self.extension = 'jpg' if self.format == 'jpeg' else self.format
+
+    def rendition_path(self, content_hash: str, size: str) -> Path:
+        return self.cache_dir / f"{content_hash}_{size}_v{RENDITION_VERSION}.{self.extension}"
+
+    def _open_source(self, source_path: str, max_side: int) -> Optional[Image.Image]:
+        if is_pdf_file(source_path):
+            if not FITZ_AVAILABLE:
+                return None
+            with fitz.open(source_path) as document:
+                if document.page_count == 0:
+                    return None
+                page = document[0]
+                # Render the first page just large enough for the requested size
+                zoom = max_side / max(page.rect.width, page.rect.height)
+                pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+                return Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+
+        image = Image.open(source_path)
+        # JPEG can decode at 1/2, 1/4 or 1/8 scale directly, which is much cheaper than a full decode
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        return image
+
+    def render(self, source_path: str, content_hash: str, size: str) -> Optional[Path]:
+        """Path of the rendition, rendering it first if it is not cached; None if the source can't be read"""
+        target = self.rendition_path(content_hash, size)
+        if target.exists():
+            return target
+
+        max_side = RENDITION_SIZES[size]
+        try:
+            image = self._open_source(source_path, max_side)
+        except Exception as e:
+            logger.warning(f"Cannot render {size} for {source_path}: {str(e)}")
+            return None
+        if image is None:
+            return None
+
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                image.save(out, format=self.format.upper(), quality=self.quality, optimize=True)
+            os.replace(temp_path, target)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+        return target
+
+# Export the rendition service
+__all__ = ['RenditionService', 'RENDITION_SIZES', 'RENDITION_VERSION']
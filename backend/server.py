@@ -17,21 +17,46 @@ import logging
 import time
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable
 import uuid
 from datetime import datetime, timezone
 import asyncio
-import aiofiles
 import io
 import csv
 import re
 import traceback
+import zipfile
+import mimetypes
 from pdf2image import convert_from_path
 
 # Import the transaction processor
 import sys
 sys.path.append('..')
 from transaction_processor import TransactionProcessor
+from receipt_layout import ReceiptLayout, parse_receipt_layout
+from roi_ocr import RegionOfInterestOCR
+from image_preprocessing import ImagePreprocessor
+from pdf_text_layer import FITZ_AVAILABLE, extract_pdf_pages, rasterize_pdf_page
+from ocr_admission import OCRAdmissionController, AdmissionRejected, LANE_INTERACTIVE, LANE_BULK, LANE_MAINTENANCE
+from progress_events import (ProgressBus, MongoProgressRelay, format_sse, receipt_topic, batch_topic,
+                             STAGE_QUEUED, STAGE_OCR, STAGE_PARSING, STAGE_CATEGORIZED, STAGE_COMPLETED, STAGE_FAILED,
+                             TERMINAL_STAGES)
+from receipt_store import ReceiptStore
+from receipt_serialization import DocumentSerializer, migrate_string_dates, dumps
+from http_cache import UserVersions, ResponseCache, make_etag, is_not_modified, http_date, VERSION_TOPIC
+from compression import CompressionMiddleware
+from renditions import RenditionService, RENDITION_SIZES, RENDITION_VERSION
+from blob_store import BlobStore, backend_from_env, hash_file
+from duplicate_detection import (DuplicateIndex, ReceiptHashes, compute_hashes, counted_receipts, promote_duplicate,
+                                 same_purchase, DUPLICATE_TOPIC)
+
+# Import the feedback learner and model training API
+try:
+    from ml_feedback_learner import CategoryFeedbackLearner
+    from ml_trainer_api import ml_router
+    FEEDBACK_LEARNING_AVAILABLE = True
+except ImportError:
+    FEEDBACK_LEARNING_AVAILABLE = False
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -44,8 +69,14 @@ logger = logging.getLogger(__name__)
 MONGO_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "lumina_development")
 
+# OCR mode: "full" reads every box; "roi" stops once merchant, total and date are found,
+# which is faster but stores partial raw_text and items (search, category training and
+# near-duplicates all see only the recognized lines), so it is opt-in
+OCR_MODE = os.getenv("OCR_MODE", "full").lower()
+
 client = AsyncIOMotorClient(MONGO_URI, serverSelectionTimeoutMS=5000)
 db = client[DB_NAME]
+receipt_store = ReceiptStore(db)
 
 # Middleware for logging
 class LoggingMiddleware(BaseHTTPMiddleware):
@@ -79,12 +110,30 @@ api_router = APIRouter(prefix="/api")
 UPLOADS_DIR = Path("uploads")
 UPLOADS_DIR.mkdir(exist_ok=True)
 
+# Uploads are stored once per distinct content, in a sharded tree keyed by SHA-256
+blob_store = BlobStore(backend_from_env(str(UPLOADS_DIR / "blobs")), db.blobs, str(UPLOADS_DIR / "staging"))
+
+# Thumbnails and previews, cached on disk under content-hash names
+rendition_service = RenditionService()
+
 # Mount static files
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
 # CONSTANT: Public demo user ID
 PUBLIC_DEMO_USER_ID = "public-demo-user"
 
+SUPPORTED_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.pdf', '.tiff', '.bmp']
+
+# Batch upload limits
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "1000"))
+BATCH_MAX_MEMBER_BYTES = int(os.getenv("BATCH_MAX_MEMBER_BYTES", str(25 * 1024 * 1024)))
+
+# Validate every receipt response against the model (development aid; off in production)
+VALIDATE_RESPONSES = os.getenv("VALIDATE_RESPONSES", "false").lower() == "true"
+
+# Comment line sent on idle progress streams so proxies keep the connection open
+PROGRESS_HEARTBEAT_SECONDS = float(os.getenv("PROGRESS_HEARTBEAT_SECONDS", "15"))
+
 # Pydantic Models
 class ReceiptItem(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -99,8 +148,11 @@ class Receipt(BaseModel):
     original_file_path: Optional[str] = None
     upload_date: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     merchant_name: Optional[str] = None
+    merchant_id: Optional[str] = None
     receipt_date: Optional[str] = None
     total_amount: Optional[str] = None
+    subtotal_amount: Optional[str] = None
+    tax_amount: Optional[str] = None
     category: str = "Uncategorized"
     items: List[ReceiptItem] = []
     raw_text: str = ""
@@ -108,10 +160,18 @@ class Receipt(BaseModel):
     confidence_score: Optional[float] = None
     category_confidence: Optional[float] = None
     categorization_method: Optional[str] = None
+    batch_id: Optional[str] = None
+    content_hash: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    duplicate_of: Optional[str] = None
+    possible_duplicate_of: Optional[str] = None
 
 class CategoryUpdate(BaseModel):
     category: str
 
+# Receipt responses are encoded straight from projected Mongo documents
+receipt_serializer = DocumentSerializer(Receipt, validate=VALIDATE_RESPONSES)
+
 class ExportFilters(BaseModel):
     start_date: Optional[str] = None
     end_date: Optional[str] = None
@@ -119,11 +179,29 @@ class ExportFilters(BaseModel):
 
 # OCR Processor (simplified version)
 class ReceiptOCRProcessor:
-    def __init__(self):
+    def __init__(self, executor=None):
+        # CPU-bound OCR runs here; None means the event loop's default executor
+        self.executor = executor
         self.reader = None
         self.initialize_reader()
         self.transaction_processor = TransactionProcessor()
         logger.info("✅ Initialized transaction processor")
+        self.preprocessor = ImagePreprocessor()
+        self.roi_reader = None
+        if self.reader and OCR_MODE == "roi":
+            self.roi_reader = RegionOfInterestOCR(self.reader, self.transaction_processor)
+            logger.info("✅ Region-of-interest OCR enabled")
+    
+    def read_page(self, image_path: str) -> Optional[List]:
+        """Preprocess and OCR one page image (runs in an executor); None if unreadable"""
+        preprocessed = self.preprocessor.process(image_path)
+        if preprocessed is None:
+            return None
+        
+        if self.roi_reader:
+            results, _ = self.roi_reader.read(preprocessed.image)
+            return results
+        return self.reader.readtext(preprocessed.image, detail=1, paragraph=False)
     
     def initialize_reader(self):
         try:
@@ -151,46 +229,77 @@ class ReceiptOCRProcessor:
             logger.error(f"PDF conversion error: {str(e)}")
             return []
     
-    async def process_receipt_file(self, file_path: str, is_pdf: bool = False) -> Dict[str, Any]:
-        if not self.reader:
-            return {'success': False, 'error': 'OCR service not available'}
+    async def ocr_image(self, image_path: str, remove_after: bool = False) -> Optional[List]:
+        try:
+            loop = asyncio.get_event_loop()
+            results = await loop.run_in_executor(self.executor, self.read_page, image_path)
+            if results is not None:
+                logger.info(f"✅ OCR found {len(results)} text elements in {image_path}")
+            return results
+        except Exception as e:
+            logger.error(f"Image processing error: {str(e)}")
+            return None
+        finally:
+            if remove_after:
+                try:
+                    os.remove(image_path)
+                except:
+                    pass
+    
+    async def read_pdf_pages(self, pdf_path: str) -> List[List]:
+        """Pages with a text layer are read directly; only scanned pages are rasterized and OCR'd"""
+        loop = asyncio.get_event_loop()
+        pdf_pages = await loop.run_in_executor(self.executor, extract_pdf_pages, pdf_path)
         
+        page_results = []
+        for page in pdf_pages:
+            if not page.needs_ocr:
+                page_results.append(page.results)
+                continue
+            if not self.reader:
+                logger.warning(f"Skipping scanned page {page.number} of {pdf_path}: OCR not available")
+                continue
+            
+            image_path = await loop.run_in_executor(
+                self.executor, rasterize_pdf_page, pdf_path, page.number, f"{pdf_path}_page_{page.number}.png"
+            )
+            results = await self.ocr_image(image_path, remove_after=True)
+            if results is not None:
+                page_results.append(results)
+        return page_results
+    
+    async def process_receipt_file(self, file_path: str, is_pdf: bool = False,
+                                   on_stage: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """OCR and parse a receipt; on_stage is called with each processing stage as it starts"""
+        report = on_stage or (lambda stage: None)
         try:
-            image_paths = []
-            if is_pdf:
-                image_paths = await self.convert_pdf_to_images(file_path)
-                if not image_paths:
-                    return {'success': False, 'error': 'Failed to convert PDF'}
+            report(STAGE_OCR)
+            if is_pdf and FITZ_AVAILABLE:
+                page_results = await self.read_pdf_pages(file_path)
+                if not page_results and not self.reader:
+                    return {'success': False, 'error': 'OCR service not available'}
             else:
+                if not self.reader:
+                    return {'success': False, 'error': 'OCR service not available'}
+                
                 image_paths = [file_path]
+                if is_pdf:
+                    image_paths = await self.convert_pdf_to_images(file_path)
+                    if not image_paths:
+                        return {'success': False, 'error': 'Failed to convert PDF'}
+                
+                page_results = []
+                for image_path in image_paths:
+                    results = await self.ocr_image(image_path, remove_after=is_pdf)
+                    if results is not None:
+                        page_results.append(results)
             
-            all_results = []
-            for image_path in image_paths:
-                try:
-                    import cv2
-                    test_image = cv2.imread(image_path)
-                    if test_image is None:
-                        continue
-                    
-                    loop = asyncio.get_event_loop()
-                    results = await loop.run_in_executor(
-                        None,
-                        lambda: self.reader.readtext(image_path, detail=1, paragraph=False)
-                    )
-                    all_results.extend(results)
-                    logger.info(f"✅ OCR found {len(results)} text elements in {image_path}")
-                except Exception as e:
-                    logger.error(f"Image processing error: {str(e)}")
-                    continue
-                finally:
-                    if is_pdf and image_path != file_path:
-                        try:
-                            os.remove(image_path)
-                        except:
-                            pass
-            
-            full_text = ' '.join([r[1] for r in all_results if r[2] > 0.2])
-            receipt_data = self.parse_receipt_text(full_text, all_results)
+            # Group OCR boxes into lines once; totals, date and items come from the layout
+            report(STAGE_PARSING)
+            layout = parse_receipt_layout(page_results)
+            full_text = layout.text
+            receipt_data = self.parse_receipt_text(full_text, layout)
+            report(STAGE_CATEGORIZED)
             receipt_data['raw_text'] = full_text
             receipt_data['success'] = True
             return receipt_data
@@ -199,34 +308,61 @@ class ReceiptOCRProcessor:
             logger.error(f"OCR processing error: {str(e)}")
             return {'success': False, 'error': str(e)}
     
-    def parse_receipt_text(self, full_text: str, ocr_results: List) -> Dict[str, Any]:
+    @staticmethod
+    def format_amount(amount) -> Optional[str]:
+        if amount is None:
+            return None
+        if isinstance(amount, (int, float)):
+            return f"${amount:.2f}"
+        return str(amount)
+    
+    def parse_receipt_text(self, full_text: str, layout=None) -> Dict[str, Any]:
         try:
-            processed = self.transaction_processor.process_transaction(full_text)
+            # Raw readtext() results of a single page are accepted as well
+            if layout is not None and not isinstance(layout, ReceiptLayout):
+                layout = parse_receipt_layout([layout])
+            
+            # Layout-derived total and date skip the whole-text regex scans
+            processed = self.transaction_processor.process_transaction(
+                full_text,
+                amount=layout.total if layout else None,
+                date=layout.date if layout else None
+            )
             
-            amount = processed.get('amount')
-            formatted_amount = None
-            if amount is not None:
-                if isinstance(amount, (int, float)):
-                    formatted_amount = f"${amount:.2f}"
-                else:
-                    formatted_amount = str(amount)
+            items = []
+            if layout:
+                items = [
+                    {
+                        'id': str(uuid.uuid4()),
+                        'description': item['description'],
+                        'amount': self.format_amount(item['amount']),
+                        'confidence': item['confidence']
+                    }
+                    for item in layout.items
+                ]
             
             return {
                 'merchant_name': processed.get('merchant'),
+                'merchant_id': processed.get('merchant_id'),
                 'receipt_date': processed.get('date'),
-                'total_amount': formatted_amount,
-                'items': [],
+                'total_amount': self.format_amount(processed.get('amount')),
+                'subtotal_amount': self.format_amount(layout.subtotal) if layout else None,
+                'tax_amount': self.format_amount(layout.tax) if layout else None,
+                'items': items,
                 'confidence_score': 0.8,
                 'suggested_category': processed.get('category', 'Uncategorized'),
                 'category_confidence': processed.get('confidence', 0.0),
-                'categorization_method': 'advanced_ml'
+                'categorization_method': processed.get('category_tier', 'advanced_ml')
             }
         except Exception as e:
             logger.error(f"Parse error: {str(e)}")
             return {
                 'merchant_name': None,
+                'merchant_id': None,
                 'receipt_date': None,
                 'total_amount': None,
+                'subtotal_amount': None,
+                'tax_amount': None,
                 'items': [],
                 'confidence_score': 0.0,
                 'suggested_category': 'Uncategorized',
@@ -234,40 +370,274 @@ class ReceiptOCRProcessor:
                 'categorization_method': 'fallback'
             }
 
+# Bound concurrent OCR work; excess uploads get a fast 503 with Retry-After
+ocr_admission = OCRAdmissionController()
+logger.info(f"✅ OCR admission control: {ocr_admission.max_in_flight} in flight "
+            f"({ocr_admission.reserved_interactive} reserved for interactive), "
+            f"{ocr_admission.max_queue} queued, {ocr_admission.max_wait_seconds}s max wait")
+
 # Initialize OCR processor
-ocr_processor = ReceiptOCRProcessor()
+ocr_processor = ReceiptOCRProcessor(executor=ocr_admission.executor)
+
+# Processing progress for SSE clients; shared-state topics and final stages are relayed
+# between workers when change streams are available
+progress_bus = ProgressBus()
+progress_relay = MongoProgressRelay(progress_bus, db.progress_events, topics=[VERSION_TOPIC, DUPLICATE_TOPIC])
+
+# Conditional GETs: ETags follow a per-user version bumped after every receipt write
+user_versions = UserVersions(db.cache_versions, progress_bus)
+response_cache = ResponseCache()
+API_VERSION = "2.1.0"
+
+# Near-duplicate uploads are confirmed on their OCR'd merchant, date and total before they stop counting
+DUPLICATE_DETECTION = os.getenv("DUPLICATE_DETECTION", "true").lower() == "true"
+duplicate_index = DuplicateIndex(db.receipts, progress_bus)
+# Original files never change once stored under a receipt id
+IMMUTABLE_FILE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+# Initialize feedback learner on the shared ML predictor handle
+FEEDBACK_UPDATE_INTERVAL = int(os.getenv("ML_FEEDBACK_INTERVAL_SECONDS", "300"))
+feedback_learner = None
+if FEEDBACK_LEARNING_AVAILABLE and ocr_processor.transaction_processor.use_ml:
+    try:
+        feedback_learner = CategoryFeedbackLearner(ocr_processor.transaction_processor.ml_handle)
+        logger.info("✅ Initialized category feedback learner")
+    except Exception as e:
+        logger.error(f"❌ Feedback learner initialization failed: {str(e)}")
 
 # Helper functions
-async def save_uploaded_file_permanently(upload_file: UploadFile, receipt_id: str) -> str:
+async def save_uploaded_file_permanently(upload_file: UploadFile) -> tuple:
+    """Store an upload in the blob store and count a reference to it; returns (file path, content hash)"""
     try:
         file_extension = Path(upload_file.filename).suffix.lower()
-        if file_extension not in ['.jpg', '.jpeg', '.png', '.pdf', '.tiff', '.bmp']:
+        if file_extension not in SUPPORTED_EXTENSIONS:
             raise HTTPException(status_code=400, detail="Unsupported file format")
         
-        safe_filename = f"{receipt_id}_{upload_file.filename}"
-        file_path = UPLOADS_DIR / safe_filename
-        
-        async with aiofiles.open(file_path, 'wb') as buffer:
-            content = await upload_file.read()
-            await buffer.write(content)
-        
-        return str(file_path)
+        content = await upload_file.read()
+        blob_key, _ = await blob_store.store(content)
+        return blob_store.path(blob_key), blob_key
     except Exception as e:
         logger.error(f"File save error: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to save file")
 
-def prepare_for_mongo(data: dict) -> dict:
-    if isinstance(data.get('upload_date'), datetime):
-        data['upload_date'] = data['upload_date'].isoformat()
-    return data
+def thumbnail_url(receipt_id: str) -> str:
+    return f"/api/receipts/{receipt_id}/renditions/thumb"
 
-def parse_from_mongo(item: dict) -> dict:
-    if isinstance(item.get('upload_date'), str):
+# Background thumbnail renders, kept referenced until they finish
+rendition_tasks = set()
+
+def prerender_thumbnail(file_path: str, file_hash: str):
+    """Render the list thumbnail off the request path so the first list view finds it cached"""
+    loop = asyncio.get_event_loop()
+    task = loop.run_in_executor(None, rendition_service.render, file_path, file_hash, "thumb")
+    rendition_tasks.add(task)
+    task.add_done_callback(rendition_tasks.discard)
+
+def build_receipt_update(ocr_result: Dict[str, Any], category: str) -> Dict[str, Any]:
+    """Receipt fields to $set from an OCR result"""
+    if not ocr_result.get('success'):
+        return {
+            "processing_status": "failed",
+            "raw_text": f"Error: {ocr_result.get('error', 'Unknown error')}"
+        }
+    
+    final_category = category
+    if category == "Auto-Detect":
+        final_category = ocr_result.get('suggested_category', 'Uncategorized')
+    
+    return {
+        "processing_status": "completed",
+        "category": final_category,
+        "raw_text": ocr_result.get('raw_text', ''),
+        "merchant_name": ocr_result.get('merchant_name'),
+        "merchant_id": ocr_result.get('merchant_id'),
+        "receipt_date": ocr_result.get('receipt_date'),
+        "total_amount": ocr_result.get('total_amount'),
+        "subtotal_amount": ocr_result.get('subtotal_amount'),
+        "tax_amount": ocr_result.get('tax_amount'),
+        "confidence_score": ocr_result.get('confidence_score', 0.0),
+        "items": ocr_result.get('items', []),
+        "category_confidence": ocr_result.get('category_confidence', 0.0),
+        "categorization_method": ocr_result.get('categorization_method', 'unknown')
+    }
+
+async def find_duplicate(file_path: str) -> tuple:
+    """
+    Perceptual hashes of an upload and the stored receipt it may duplicate, if any.
+    
+    Runs on the OCR pool; the caller holds an admission slot. Returns
+    (hashes or None, matched receipt document or None).
+    """
+    if not DUPLICATE_DETECTION:
+        return None, None
+    try:
+        hashes = await ocr_admission.run(compute_hashes, file_path)
+        if hashes is None:
+            return None, None
+        match = await duplicate_index.find(PUBLIC_DEMO_USER_ID, hashes)
+        if match is None:
+            return hashes, None
+        original = await db.receipts.find_one(
+            {"id": match.receipt_id, "user_id": PUBLIC_DEMO_USER_ID, "processing_status": "completed"}, {"_id": 0}
+        )
+        if original is None:
+            duplicate_index.remove(PUBLIC_DEMO_USER_ID, match.receipt_id)
+            return hashes, None
+        logger.info(f"♻️ Looks like receipt {match.receipt_id} "
+                    f"(pHash distance {match.phash_distance}, layout distance {match.layout_distance})")
+        return hashes, original
+    except Exception as e:
+        logger.warning(f"Duplicate check failed: {str(e)}")
+        return None, None
+
+def mark_duplicate(update_data: Dict[str, Any], original: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Flag an OCR'd upload that looks like a stored receipt.
+    
+    A look-alike is only a candidate: the same merchant's template hashes
+    alike for different purchases. It becomes a duplicate (left out of
+    totals) when merchant, date and total agree; otherwise it is flagged as
+    a possible duplicate for the user and keeps counting.
+    """
+    if original is None or update_data["processing_status"] != "completed":
+        return update_data
+    # Point at the first copy, so every duplicate of a receipt shares one reference
+    original_id = original.get("duplicate_of") or original["id"]
+    if same_purchase(original, update_data):
+        return {**update_data, "duplicate_of": original_id}
+    return {**update_data, "possible_duplicate_of": original_id}
+
+def publish_receipt_stage(receipt_id: str, stage: str, batch_id: Optional[str] = None, **data):
+    """Announce a receipt's processing stage to its subscribers and its batch's subscribers"""
+    topics = [receipt_topic(receipt_id)]
+    if batch_id:
+        topics.append(batch_topic(batch_id))
+    progress_bus.publish(topics, "stage", {"receipt_id": receipt_id, "batch_id": batch_id, "stage": stage, **data})
+
+def publish_receipt_result(receipt_id: str, update_data: Dict[str, Any], batch_id: Optional[str] = None):
+    """Final stage event, carrying the fields a client would otherwise fetch the receipt for"""
+    if update_data["processing_status"] == "completed":
+        publish_receipt_stage(
+            receipt_id, STAGE_COMPLETED, batch_id,
+            merchant_name=update_data.get("merchant_name"),
+            total_amount=update_data.get("total_amount"),
+            receipt_date=update_data.get("receipt_date"),
+            category=update_data.get("category"),
+            duplicate_of=update_data.get("duplicate_of"),
+            possible_duplicate_of=update_data.get("possible_duplicate_of")
+        )
+    else:
+        publish_receipt_stage(receipt_id, STAGE_FAILED, batch_id, error=update_data.get("raw_text"))
+
+def stage_batch_files(uploads: List[tuple]) -> tuple:
+    """
+    Stream uploaded files and ZIP archive members into the blob store (runs in the threadpool).
+    
+    Archive members are streamed one at a time from the archive into
+    hashed staging files; nothing is extracted to a temporary directory.
+    The caller commits them to the store, counting their references.
+    
+    Returns:
+        (staged entries with id/filename/path/staging_path/is_pdf/content_hash/size,
+         skipped entries with filename/reason)
+    """
+    staged, skipped = [], []
+    
+    def stage(name: str, source):
+        filename = Path(name).name
+        extension = Path(filename).suffix.lower()
+        if extension not in SUPPORTED_EXTENSIONS:
+            skipped.append({"filename": name, "reason": "Unsupported file format"})
+            return
+        if len(staged) >= BATCH_MAX_FILES:
+            skipped.append({"filename": name, "reason": f"Batch limit of {BATCH_MAX_FILES} files reached"})
+            return
+        
+        blob_key, size, staging_path = blob_store.stage(source)
+        staged.append({"id": str(uuid.uuid4()), "filename": filename, "path": blob_store.path(blob_key),
+                       "staging_path": staging_path, "is_pdf": extension == '.pdf',
+                       "content_hash": blob_key, "size": size})
+    
+    for name, fileobj in uploads:
+        if Path(name).suffix.lower() != '.zip':
+            stage(name, fileobj)
+            continue
+        
         try:
-            item['upload_date'] = datetime.fromisoformat(item['upload_date'])
-        except:
-            item['upload_date'] = datetime.now(timezone.utc)
-    return item
+            with zipfile.ZipFile(fileobj) as archive:
+                for member in archive.infolist():
+                    member_name = Path(member.filename).name
+                    if member.is_dir() or member_name.startswith('.') or '__MACOSX' in member.filename:
+                        continue
+                    if member.file_size > BATCH_MAX_MEMBER_BYTES:
+                        skipped.append({"filename": member.filename, "reason": "File too large"})
+                        continue
+                    with archive.open(member) as source:
+                        stage(member.filename, source)
+        except zipfile.BadZipFile:
+            skipped.append({"filename": name, "reason": "Invalid ZIP archive"})
+    
+    return staged, skipped
+
+async def cached_json_response(request: Request, user_id: str, key: tuple, build) -> Response:
+    """
+    Serve a user's data with ETag/Last-Modified validation.
+    
+    A matching If-None-Match (or If-Modified-Since) gets a 304 from the
+    in-memory version alone; otherwise the body comes from the response
+    cache, and only on a miss does build() query Mongo.
+    """
+    version, modified_at = await user_versions.current(user_id)
+    etag = make_etag(version, API_VERSION, *key)
+    headers = {"ETag": etag, "Last-Modified": http_date(modified_at), "Cache-Control": "private, no-cache"}
+    if is_not_modified(request.headers, etag, modified_at):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    body = response_cache.get(user_id, etag)
+    if body is None:
+        body = await build()
+        response_cache.put(user_id, etag, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def parse_amount(amount_str: Optional[str]) -> Optional[float]:
+    try:
+        return float(re.sub(r'[^\d.]', '', amount_str)) if amount_str else None
+    except:
+        return None
+
+def record_category_correction(receipt: dict, corrected_category: str):
+    """Feed a user category correction to the feedback learner and tier tuning (runs in the threadpool)"""
+    try:
+        if feedback_learner:
+            feedback_learner.record_correction(
+                raw_text=receipt.get('raw_text', ''),
+                corrected_category=corrected_category,
+                amount=parse_amount(receipt.get('total_amount')),
+                merchant=receipt.get('merchant_name'),
+                date_str=receipt.get('receipt_date'),
+                predicted_category=receipt.get('category'),
+                receipt_id=receipt.get('id')
+            )
+        ocr_processor.transaction_processor.record_category_outcome(
+            receipt.get('raw_text', ''), corrected_category, receipt.get('merchant_name')
+        )
+    except Exception as e:
+        logger.error(f"Feedback recording error: {str(e)}")
+
+async def feedback_update_loop():
+    """Periodically fold recorded corrections into a new online model version and re-tune tier gates"""
+    category_classifier = ocr_processor.transaction_processor.category_classifier
+    while True:
+        await asyncio.sleep(FEEDBACK_UPDATE_INTERVAL)
+        try:
+            # Model upkeep shares the worker pool through the lowest-priority lane
+            async with ocr_admission.admit(LANE_MAINTENANCE):
+                if feedback_learner:
+                    await ocr_admission.run(feedback_learner.update_model)
+                if category_classifier:
+                    await ocr_admission.run(category_classifier.tune_thresholds)
+        except Exception as e:
+            logger.error(f"Feedback model update error: {str(e)}")
 
 # API Routes - ALL WITHOUT AUTH
 @api_router.get("/")
@@ -281,89 +651,361 @@ async def root():
 
 @api_router.post("/receipts/upload", response_model=Receipt)
 async def upload_receipt(
+    response: Response,
     file: UploadFile = File(...),
-    category: str = "Auto-Detect"
+    category: str = "Auto-Detect",
+    wait: bool = True
 ):
-    """Upload and process a receipt - NO AUTH REQUIRED"""
+    """
+    Upload and process a receipt - NO AUTH REQUIRED
+    
+    With wait=false the queued receipt is returned at once with 202 and OCR
+    continues in the background; follow it on /receipts/{id}/events.
+    """
+    try:
+        if wait:
+            async with ocr_admission.admit(LANE_INTERACTIVE):
+                return await process_upload(file, category)
+        ocr_admission.check(LANE_INTERACTIVE)
+    except AdmissionRejected as e:
+        logger.warning(f"⏳ Upload rejected ({e.reason}), retry after {e.retry_after}s: {file.filename}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"{e.reason}, please retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    receipt = await queue_upload(file, category)
+    response.status_code = status.HTTP_202_ACCEPTED
+    return receipt
+
+async def save_upload(file: UploadFile, category: str) -> Receipt:
+    """Store an upload's file; returns the receipt it will become, not yet written"""
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No file provided")
+    
+    receipt_id = str(uuid.uuid4())
+    permanent_file_path, file_hash = await save_uploaded_file_permanently(file)
+    return Receipt(
+        id=receipt_id,
+        user_id=PUBLIC_DEMO_USER_ID,  # ✅ Hardcoded public user
+        filename=file.filename,
+        original_file_path=permanent_file_path,
+        upload_date=datetime.now(timezone.utc),
+        category=category,
+        processing_status=STAGE_QUEUED,
+        content_hash=file_hash,
+        thumbnail_url=thumbnail_url(receipt_id)
+    )
+
+async def read_upload(receipt: Receipt, category: str) -> tuple:
+    """Duplicate check and OCR of a saved upload; the caller holds an OCR admission slot. Returns (update_data, hashes)"""
+    hashes, original = await find_duplicate(receipt.original_file_path)
+    ocr_result = await ocr_processor.process_receipt_file(
+        receipt.original_file_path, Path(receipt.filename).suffix.lower() == '.pdf',
+        on_stage=lambda stage: publish_receipt_stage(receipt.id, stage)
+    )
+    return mark_duplicate(build_receipt_update(ocr_result, category), original), hashes
+
+async def announce_upload(receipt: Receipt, update_data: Dict[str, Any], hashes: Optional[ReceiptHashes]):
+    """Index, pre-render and announce a stored upload's result"""
+    if hashes is not None and update_data["processing_status"] == "completed":
+        duplicate_index.add(PUBLIC_DEMO_USER_ID, receipt.id, hashes)
+    prerender_thumbnail(receipt.original_file_path, receipt.content_hash)
+    await user_versions.bump(PUBLIC_DEMO_USER_ID)
+    publish_receipt_result(receipt.id, update_data)
+
+async def process_upload(file: UploadFile, category: str) -> Receipt:
+    """Save, OCR and store one receipt; the caller holds an OCR admission slot"""
     logger.info(f"📤 Upload started: {file.filename}")
     
     try:
-        if not file.filename:
-            raise HTTPException(status_code=400, detail="No file provided")
-        
-        file_extension = Path(file.filename).suffix.lower()
-        is_pdf = file_extension == '.pdf'
+        receipt = await save_upload(file, category)
+        update_data, hashes = await read_upload(receipt, category)
         
-        receipt_id = str(uuid.uuid4())
+        # Write the finished receipt once, with PUBLIC_DEMO_USER_ID
+        receipt = Receipt(**{**receipt.model_dump(), **update_data})
+        try:
+            await receipt_store.insert({**receipt.model_dump(), "blob_key": receipt.content_hash,
+                                        **(hashes.to_document() if hashes else {})})
+        except Exception:
+            await blob_store.release(receipt.content_hash)
+            raise
+        await announce_upload(receipt, update_data, hashes)
         
-        # Save file
-        permanent_file_path = await save_uploaded_file_permanently(file, receipt_id)
+        logger.info(f"✅ Upload completed: {file.filename}")
+        return receipt
         
-        # Create receipt record with PUBLIC_DEMO_USER_ID
-        receipt_data = {
-            "id": receipt_id,
-            "user_id": PUBLIC_DEMO_USER_ID,  # ✅ Hardcoded public user
-            "filename": file.filename,
-            "original_file_path": permanent_file_path,
-            "upload_date": datetime.now(timezone.utc),
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Upload error: {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"Failed to process receipt: {str(e)}")
+
+# Uploads being processed after their 202, kept referenced until they finish
+upload_tasks = set()
+
+async def queue_upload(file: UploadFile, category: str) -> Receipt:
+    """Save an upload and store it as queued, so its id and event stream exist before OCR starts"""
+    logger.info(f"📤 Upload queued: {file.filename}")
+    receipt = await save_upload(file, category)
+    try:
+        await receipt_store.insert({**receipt.model_dump(), "blob_key": receipt.content_hash})
+    except Exception as e:
+        await blob_store.release(receipt.content_hash)
+        logger.error(f"❌ Upload error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to store receipt: {str(e)}")
+    await user_versions.bump(PUBLIC_DEMO_USER_ID)
+    publish_receipt_stage(receipt.id, STAGE_QUEUED)
+    
+    task = asyncio.create_task(process_queued_upload(receipt, category))
+    upload_tasks.add(task)
+    task.add_done_callback(upload_tasks.discard)
+    return receipt
+
+async def process_queued_upload(receipt: Receipt, category: str):
+    """OCR a queued upload in the background and update its stored receipt"""
+    hashes = None
+    try:
+        async with ocr_admission.admit(LANE_INTERACTIVE):
+            update_data, hashes = await read_upload(receipt, category)
+    except AdmissionRejected as e:
+        update_data = build_receipt_update({"success": False, "error": f"{e.reason}, please reprocess"}, category)
+    except Exception as e:
+        logger.error(f"❌ Upload error: {str(e)}\n{traceback.format_exc()}")
+        update_data = build_receipt_update({"success": False, "error": str(e)}, category)
+    
+    try:
+        await receipt_store.receipt_updates.set(receipt.id, {**update_data, **(hashes.to_document() if hashes else {})})
+        await announce_upload(receipt, update_data, hashes)
+        logger.info(f"✅ Upload completed: {receipt.filename}")
+    except Exception as e:
+        logger.error(f"❌ Could not store receipt {receipt.id}: {str(e)}")
+        publish_receipt_stage(receipt.id, STAGE_FAILED, error=str(e))
+
+# Running batch jobs, kept referenced until they finish
+batch_tasks = set()
+
+async def process_batch(batch_id: str, staged: List[Dict[str, Any]], category: str):
+    """OCR every receipt of a batch through the bulk lane; results are coalesced into bulk writes"""
+    queue = asyncio.Queue()
+    for entry in staged:
+        queue.put_nowait(entry)
+    
+    done = {"completed": 0, "failed": 0}
+    
+    def publish_batch(status_value: str):
+        progress_bus.publish([batch_topic(batch_id)], "batch", {
+            "batch_id": batch_id, "status": status_value, "total": len(staged), **done
+        })
+    
+    async def worker():
+        while not queue.empty():
+            entry = queue.get_nowait()
+            hashes, original = None, None
+            try:
+                async with ocr_admission.admit(LANE_BULK):
+                    hashes, original = await find_duplicate(entry["path"])
+                    ocr_result = await ocr_processor.process_receipt_file(
+                        entry["path"], entry["is_pdf"],
+                        on_stage=lambda stage: publish_receipt_stage(entry["id"], stage, batch_id)
+                    )
+            except AdmissionRejected as e:
+                # The bulk lane is saturated; that says nothing about the receipt, so it waits its turn again
+                queue.put_nowait(entry)
+                await asyncio.sleep(e.retry_after)
+                continue
+            except Exception as e:
+                ocr_result = {"success": False, "error": str(e)}
+            
+            try:
+                update_data = mark_duplicate(build_receipt_update(ocr_result, category), original)
+                outcome = update_data["processing_status"]
+                if hashes is not None:
+                    update_data.update(hashes.to_document())
+                await receipt_store.receipt_updates.set(entry["id"], update_data)
+                if hashes is not None and outcome == "completed":
+                    duplicate_index.add(PUBLIC_DEMO_USER_ID, entry["id"], hashes)
+            except Exception as e:
+                # One receipt's failed write must not stop the worker or fail the rest of the batch
+                logger.error(f"❌ Batch {batch_id} could not store receipt {entry['id']}: {str(e)}")
+                outcome, update_data = "failed", {"processing_status": "failed", "raw_text": str(e)}
+            
+            try:
+                # Counted only once the receipt's own write has resolved, so the stored counts match the events
+                await receipt_store.batch_updates.inc(batch_id, {outcome: 1})
+                await user_versions.bump(PUBLIC_DEMO_USER_ID)
+            except Exception as e:
+                logger.error(f"❌ Batch {batch_id} could not count receipt {entry['id']}: {str(e)}")
+            done[outcome] += 1
+            publish_receipt_result(entry["id"], update_data, batch_id)
+            publish_batch("processing")
+    
+    try:
+        await asyncio.gather(*(worker() for _ in range(min(len(staged), ocr_admission.max_in_flight))))
+        status_value = "completed"
+    except Exception as e:
+        logger.error(f"❌ Batch {batch_id} error: {str(e)}\n{traceback.format_exc()}")
+        status_value = "failed"
+    
+    await receipt_store.batch_updates.set(
+        batch_id, {"status": status_value, "finished_at": datetime.now(timezone.utc).isoformat()}
+    )
+    publish_batch(status_value)
+    logger.info(f"✅ Batch {batch_id} {status_value}: {len(staged)} receipts")
+
+@api_router.post("/receipts/batch")
+async def upload_receipt_batch(
+    files: List[UploadFile] = File(...),
+    category: str = "Auto-Detect"
+):
+    """Upload several receipts or ZIP archives of receipts; OCR runs in the background - NO AUTH REQUIRED"""
+    logger.info(f"📦 Batch upload started: {len(files)} files")
+    
+    loop = asyncio.get_event_loop()
+    staged, skipped = await loop.run_in_executor(
+        None, stage_batch_files, [(file.filename or "", file.file) for file in files]
+    )
+    if not staged:
+        raise HTTPException(status_code=400, detail="No supported receipt files in upload")
+    
+    batch_id = str(uuid.uuid4())
+    upload_date = datetime.now(timezone.utc)
+    receipts = [
+        {
+            "id": entry["id"],
+            "user_id": PUBLIC_DEMO_USER_ID,
+            "filename": entry["filename"],
+            "original_file_path": entry["path"],
+            "upload_date": upload_date,
             "category": category,
-            "processing_status": "processing",
+            "processing_status": "queued",
             "raw_text": "",
             "merchant_name": None,
             "receipt_date": None,
             "total_amount": None,
             "items": [],
-            "confidence_score": 0.0
+            "confidence_score": 0.0,
+            "batch_id": batch_id,
+            "content_hash": entry["content_hash"],
+            "blob_key": entry["content_hash"],
+            "thumbnail_url": thumbnail_url(entry["id"])
         }
-        
-        # Insert into DB
-        receipt_dict = prepare_for_mongo(receipt_data.copy())
-        await db.receipts.insert_one(receipt_dict)
-        
-        # Process OCR
-        ocr_result = await ocr_processor.process_receipt_file(permanent_file_path, is_pdf)
-        
-        # Update with OCR results
-        if ocr_result.get('success'):
-            final_category = category
-            if category == "Auto-Detect":
-                final_category = ocr_result.get('suggested_category', 'Uncategorized')
-            
-            update_data = {
-                "processing_status": "completed",
-                "category": final_category,
-                "raw_text": ocr_result.get('raw_text', ''),
-                "merchant_name": ocr_result.get('merchant_name'),
-                "receipt_date": ocr_result.get('receipt_date'),
-                "total_amount": ocr_result.get('total_amount'),
-                "confidence_score": ocr_result.get('confidence_score', 0.0),
-                "items": [],
-                "category_confidence": ocr_result.get('category_confidence', 0.0),
-                "categorization_method": ocr_result.get('categorization_method', 'unknown')
-            }
-        else:
-            update_data = {
-                "processing_status": "failed",
-                "raw_text": f"Error: {ocr_result.get('error', 'Unknown error')}"
-            }
-        
-        await db.receipts.update_one(
-            {"id": receipt_data["id"]},
-            {"$set": update_data}
-        )
-        
-        receipt_data.update(update_data)
-        logger.info(f"✅ Upload completed: {file.filename}")
-        return Receipt(**receipt_data)
-        
-    except HTTPException:
+        for entry in staged
+    ]
+    await blob_store.commit([(entry["content_hash"], entry["size"], entry["staging_path"]) for entry in staged])
+    try:
+        await receipt_store.insert_many(receipts)
+    except Exception:
+        # The batch fails as a whole: drop any receipts an unordered insert got in and hand back the blob references
+        await db.receipts.delete_many({"id": {"$in": [entry["id"] for entry in staged]}, "user_id": PUBLIC_DEMO_USER_ID})
+        for entry in staged:
+            await blob_store.release(entry["content_hash"])
         raise
-    except Exception as e:
-        logger.error(f"❌ Upload error: {str(e)}\n{traceback.format_exc()}")
-        raise HTTPException(status_code=500, detail=f"Failed to process receipt: {str(e)}")
+    await user_versions.bump(PUBLIC_DEMO_USER_ID)
+    await receipt_store.insert_batch({
+        "id": batch_id,
+        "user_id": PUBLIC_DEMO_USER_ID,
+        "created_at": upload_date.isoformat(),
+        "status": "processing",
+        "total": len(staged),
+        "completed": 0,
+        "failed": 0,
+        "skipped": skipped
+    })
+    
+    task = asyncio.create_task(process_batch(batch_id, staged, category))
+    batch_tasks.add(task)
+    task.add_done_callback(batch_tasks.discard)
+    
+    logger.info(f"✅ Batch {batch_id} queued: {len(staged)} receipts, {len(skipped)} skipped")
+    return {
+        "batch_id": batch_id,
+        "status": "processing",
+        "total": len(staged),
+        "receipt_ids": [entry["id"] for entry in staged],
+        "skipped": skipped
+    }
+
+@api_router.get("/receipts/batch/{batch_id}")
+async def get_receipt_batch(batch_id: str):
+    """Aggregate progress of a batch upload - NO AUTH REQUIRED"""
+    batch = await db.receipt_batches.find_one({"id": batch_id, "user_id": PUBLIC_DEMO_USER_ID}, {"_id": 0})
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    done = batch["completed"] + batch["failed"]
+    batch["pending"] = batch["total"] - done
+    batch["progress"] = round(done / batch["total"], 3) if batch["total"] else 1.0
+    return batch
+
+async def stream_progress(request: Request, topic: str, snapshot: Dict[str, Any], finished: Callable[[Dict[str, Any]], bool]):
+    """SSE body: the current state, then every event on the topic until a final one or the client leaves"""
+    async with progress_bus.subscribe([topic]) as queue:
+        event = progress_bus.latest(topic) or snapshot
+        yield format_sse(event)
+        if finished(event):
+            return
+        
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), PROGRESS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(event)
+            if finished(event):
+                return
+
+def event_stream_response(body) -> StreamingResponse:
+    return StreamingResponse(
+        body,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/receipts/batch/{batch_id}/events")
+async def stream_batch_events(batch_id: str, request: Request):
+    """Server-Sent Events for a batch: per-receipt stages and aggregate progress - NO AUTH REQUIRED"""
+    batch = await db.receipt_batches.find_one(
+        {"id": batch_id, "user_id": PUBLIC_DEMO_USER_ID},
+        {"_id": 0, "id": 1, "status": 1, "total": 1, "completed": 1, "failed": 1}
+    )
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    snapshot = {
+        "seq": 0, "type": "batch", "batch_id": batch_id, "status": batch["status"],
+        "total": batch["total"], "completed": batch["completed"], "failed": batch["failed"]
+    }
+    finished = lambda event: event["type"] == "batch" and event["status"] != "processing"
+    return event_stream_response(stream_progress(request, batch_topic(batch_id), snapshot, finished))
+
+@api_router.get("/receipts/{receipt_id}/events")
+async def stream_receipt_events(receipt_id: str, request: Request):
+    """Server-Sent Events for one receipt's processing stages - NO AUTH REQUIRED"""
+    receipt = await db.receipts.find_one(
+        {"id": receipt_id, "user_id": PUBLIC_DEMO_USER_ID},
+        {"_id": 0, "processing_status": 1, "batch_id": 1, "merchant_name": 1,
+         "total_amount": 1, "receipt_date": 1, "category": 1}
+    )
+    if not receipt:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    
+    snapshot = {
+        "seq": 0, "type": "stage", "receipt_id": receipt_id, "batch_id": receipt.get("batch_id"),
+        "stage": receipt.get("processing_status", "pending")
+    }
+    if snapshot["stage"] == STAGE_COMPLETED:
+        snapshot.update({key: receipt.get(key) for key in ("merchant_name", "total_amount", "receipt_date", "category")})
+    finished = lambda event: event["type"] == "stage" and event["stage"] in TERMINAL_STAGES
+    return event_stream_response(stream_progress(request, receipt_topic(receipt_id), snapshot, finished))
 
 @api_router.get("/receipts", response_model=List[Receipt])
 async def get_receipts(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = Query(None),
@@ -384,33 +1026,56 @@ async def get_receipts(
         if category and category != "All":
             query["category"] = category
         
-        receipts = await db.receipts.find(query).skip(skip).limit(limit).sort("upload_date", -1).to_list(length=None)
-        logger.info(f"📋 Retrieved {len(receipts)} receipts")
-        return [Receipt(**parse_from_mongo(r)) for r in receipts]
+        async def build():
+            receipts = await db.receipts.find(query, receipt_serializer.projection).skip(skip).limit(limit).sort("upload_date", -1).to_list(length=None)
+            logger.info(f"📋 Retrieved {len(receipts)} receipts")
+            return receipt_serializer.dumps_many(receipts)
+        
+        return await cached_json_response(request, PUBLIC_DEMO_USER_ID, ("receipts", skip, limit, search, category), build)
     except Exception as e:
         logger.error(f"❌ Get receipts error: {str(e)}")
         # Return empty list instead of 500 error
         return []
 
 @api_router.get("/receipts/{receipt_id}", response_model=Receipt)
-async def get_receipt(receipt_id: str):
+async def get_receipt(receipt_id: str, request: Request):
     """Get a specific receipt - NO AUTH REQUIRED"""
     try:
-        receipt = await db.receipts.find_one({"id": receipt_id, "user_id": PUBLIC_DEMO_USER_ID})
-        if not receipt:
-            raise HTTPException(status_code=404, detail="Receipt not found")
-        return Receipt(**parse_from_mongo(receipt))
+        async def build():
+            receipt = await db.receipts.find_one({"id": receipt_id, "user_id": PUBLIC_DEMO_USER_ID}, receipt_serializer.projection)
+            if not receipt:
+                raise HTTPException(status_code=404, detail="Receipt not found")
+            return receipt_serializer.dumps_one(receipt)
+        
+        return await cached_json_response(request, PUBLIC_DEMO_USER_ID, ("receipt", receipt_id), build)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"❌ Get receipt error: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve receipt")
 
+async def receipt_content_hash(receipt_id: str, receipt: Dict[str, Any]) -> str:
+    """Content hash of a receipt's original file; receipts stored before hashing get theirs on first use"""
+    file_hash = receipt.get("content_hash")
+    if not file_hash:
+        loop = asyncio.get_event_loop()
+        file_hash = await loop.run_in_executor(None, hash_file, receipt["original_file_path"])
+        await db.receipts.update_one(
+            {"id": receipt_id, "user_id": PUBLIC_DEMO_USER_ID},
+            {"$set": {"content_hash": file_hash, "thumbnail_url": thumbnail_url(receipt_id)}}
+        )
+        # Cached list and detail bodies still carry the old thumbnail_url and content_hash
+        await user_versions.bump(PUBLIC_DEMO_USER_ID)
+    return file_hash
+
 @api_router.get("/receipts/{receipt_id}/file")
-async def get_receipt_file(receipt_id: str):
+async def get_receipt_file(receipt_id: str, request: Request):
     """Get the original receipt file - NO AUTH REQUIRED"""
     try:
-        receipt = await db.receipts.find_one({"id": receipt_id, "user_id": PUBLIC_DEMO_USER_ID})
+        receipt = await db.receipts.find_one(
+            {"id": receipt_id, "user_id": PUBLIC_DEMO_USER_ID},
+            {"_id": 0, "original_file_path": 1, "content_hash": 1, "filename": 1}
+        )
         if not receipt:
             raise HTTPException(status_code=404, detail="Receipt not found")
         
@@ -418,10 +1083,17 @@ async def get_receipt_file(receipt_id: str):
         if not file_path or not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail="Original file not found")
         
+        # Strong validator: the bytes served, not the id they are served under
+        etag = f'"{await receipt_content_hash(receipt_id, receipt)}"'
+        headers = {"ETag": etag, "Cache-Control": IMMUTABLE_FILE_CACHE_CONTROL}
+        if is_not_modified(request.headers, etag, None):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
         return FileResponse(
             file_path,
             filename=receipt.get('filename', 'receipt'),
-            media_type='application/octet-stream'
+            media_type=mimetypes.guess_type(receipt.get('filename', ''))[0] or 'application/octet-stream',
+            headers=headers
         )
     except HTTPException:
         raise
@@ -429,10 +1101,45 @@ async def get_receipt_file(receipt_id: str):
         logger.error(f"❌ Get file error: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve file")
 
+@api_router.get("/receipts/{receipt_id}/renditions/{size}")
+async def get_receipt_rendition(receipt_id: str, size: str, request: Request):
+    """Thumbnail ("thumb") or preview image of a receipt, PDFs as their first page - NO AUTH REQUIRED"""
+    if size not in RENDITION_SIZES:
+        raise HTTPException(status_code=404, detail="Unknown rendition")
+    
+    # Renditions of a receipt never change for a given format and rendering version,
+    # so unlike the original file a revalidation is answered without a lookup
+    etag = f'"{receipt_id}-{size}-{rendition_service.format}-v{RENDITION_VERSION}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_FILE_CACHE_CONTROL}
+    if is_not_modified(request.headers, etag, None):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    receipt = await db.receipts.find_one(
+        {"id": receipt_id, "user_id": PUBLIC_DEMO_USER_ID},
+        {"_id": 0, "original_file_path": 1, "content_hash": 1}
+    )
+    if not receipt:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    
+    file_path = receipt.get("original_file_path")
+    if not file_path or not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="Original file not found")
+    
+    file_hash = await receipt_content_hash(receipt_id, receipt)
+    loop = asyncio.get_event_loop()
+    rendition_path = await loop.run_in_executor(None, rendition_service.render, file_path, file_hash, size)
+    if rendition_path is None:
+        raise HTTPException(status_code=404, detail="Preview not available for this file")
+    return FileResponse(rendition_path, media_type=rendition_service.media_type, headers=headers)
+
 @api_router.put("/receipts/{receipt_id}/category")
-async def update_receipt_category(receipt_id: str, category_update: CategoryUpdate):
+async def update_receipt_category(receipt_id: str, category_update: CategoryUpdate, background_tasks: BackgroundTasks):
     """Update receipt category - NO AUTH REQUIRED"""
     try:
+        receipt = await db.receipts.find_one({"id": receipt_id, "user_id": PUBLIC_DEMO_USER_ID})
+        if not receipt:
+            raise HTTPException(status_code=404, detail="Receipt not found")
+        
         result = await db.receipts.update_one(
             {"id": receipt_id, "user_id": PUBLIC_DEMO_USER_ID},
             {"$set": {"category": category_update.category}}
@@ -440,6 +1147,12 @@ async def update_receipt_category(receipt_id: str, category_update: CategoryUpda
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Receipt not found")
+        await user_versions.bump(PUBLIC_DEMO_USER_ID)
+        
+        # Record the correction for online learning
+        if (ocr_processor.transaction_processor.use_ml and receipt.get('processing_status') == 'completed' and
+                receipt.get('raw_text') and receipt.get('category') != category_update.category):
+            background_tasks.add_task(record_category_correction, receipt, category_update.category)
         
         logger.info(f"✅ Category updated for receipt {receipt_id}")
         return {"message": "Category updated successfully"}
@@ -449,6 +1162,40 @@ async def update_receipt_category(receipt_id: str, category_update: CategoryUpda
         logger.error(f"❌ Update category error: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to update category")
 
+@api_router.post("/receipts/{receipt_id}/reprocess")
+async def reprocess_receipt(receipt_id: str, category: str = "Auto-Detect"):
+    """OCR a receipt again, e.g. one wrongly flagged as a near-duplicate - NO AUTH REQUIRED"""
+    receipt = await db.receipts.find_one({"id": receipt_id, "user_id": PUBLIC_DEMO_USER_ID}, {"_id": 0})
+    if not receipt:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    
+    try:
+        async with ocr_admission.admit(LANE_INTERACTIVE):
+            ocr_result = await ocr_processor.process_receipt_file(
+                receipt["original_file_path"], Path(receipt["filename"]).suffix.lower() == '.pdf',
+                on_stage=lambda stage: publish_receipt_stage(receipt_id, stage)
+            )
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"{e.reason}, please retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    update_data = {**build_receipt_update(ocr_result, category), "duplicate_of": None, "possible_duplicate_of": None}
+    await db.receipts.update_one({"id": receipt_id, "user_id": PUBLIC_DEMO_USER_ID}, {"$set": update_data})
+    hashes = ReceiptHashes.from_document(receipt)
+    if hashes is not None and update_data["processing_status"] == "completed":
+        duplicate_index.add(PUBLIC_DEMO_USER_ID, receipt_id, hashes)
+    await user_versions.bump(PUBLIC_DEMO_USER_ID)
+    publish_receipt_result(receipt_id, update_data)
+    
+    updated = await db.receipts.find_one({"id": receipt_id, "user_id": PUBLIC_DEMO_USER_ID}, receipt_serializer.projection)
+    if not updated:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    logger.info(f"✅ Reprocessed receipt {receipt_id}")
+    return Response(content=receipt_serializer.dumps_one(updated), media_type="application/json")
+
 @api_router.delete("/receipts/{receipt_id}")
 async def delete_receipt(receipt_id: str):
     """Delete a receipt - NO AUTH REQUIRED"""
@@ -460,9 +1207,19 @@ async def delete_receipt(receipt_id: str):
         result = await db.receipts.delete_one({"id": receipt_id, "user_id": PUBLIC_DEMO_USER_ID})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Receipt not found")
+        if not receipt.get('duplicate_of'):
+            # Copies of a deleted original would otherwise point at nothing and drop out of totals
+            successor_id = await promote_duplicate(db.receipts, PUBLIC_DEMO_USER_ID, receipt_id)
+            if successor_id:
+                logger.info(f"♻️ Receipt {successor_id} replaces deleted original {receipt_id}")
+        await user_versions.bump(PUBLIC_DEMO_USER_ID)
+        duplicate_index.remove(PUBLIC_DEMO_USER_ID, receipt_id)
         
         file_path = receipt.get('original_file_path')
-        if file_path and os.path.exists(file_path):
+        if receipt.get('blob_key'):
+            # Other receipts may share the same upload; the blob goes with its last reference
+            await blob_store.release(receipt['blob_key'])
+        elif file_path and os.path.exists(file_path):
             try:
                 os.remove(file_path)
             except Exception as e:
@@ -486,9 +1243,9 @@ async def export_receipts_csv(filters: Optional[ExportFilters] = None):
             if filters.start_date or filters.end_date:
                 date_query = {}
                 if filters.start_date:
-                    date_query["$gte"] = filters.start_date
+                    date_query["$gte"] = datetime.fromisoformat(filters.start_date)
                 if filters.end_date:
-                    date_query["$lte"] = filters.end_date
+                    date_query["$lte"] = datetime.fromisoformat(filters.end_date)
                 query["upload_date"] = date_query
             
             if filters.categories:
@@ -507,7 +1264,9 @@ async def export_receipts_csv(filters: Optional[ExportFilters] = None):
         category_totals = {}
         grand_total = 0.0
         
-        for receipt in receipts:
+        # Near-duplicates are the same paper receipt uploaded again; they count once
+        counted = counted_receipts(receipts)
+        for receipt in counted:
             category = receipt.get('category', 'Uncategorized')
             amount_str = receipt.get('total_amount', '0')
             try:
@@ -521,10 +1280,10 @@ async def export_receipts_csv(filters: Optional[ExportFilters] = None):
         writer.writerow(['SUMMARY BY CATEGORY'])
         writer.writerow(['Category', 'Total', 'Count'])
         for category, total in sorted(category_totals.items()):
-            count = len([r for r in receipts if r.get('category') == category])
+            count = len([r for r in counted if r.get('category') == category])
             writer.writerow([category, f'${total:.2f}', count])
         
-        writer.writerow(['TOTAL', f'${grand_total:.2f}', len(receipts)])
+        writer.writerow(['TOTAL', f'${grand_total:.2f}', len(counted)])
         writer.writerow([])
         
         writer.writerow(['DETAILED TRANSACTIONS'])
@@ -537,7 +1296,9 @@ async def export_receipts_csv(filters: Optional[ExportFilters] = None):
                 receipt.get('category', ''),
                 receipt.get('total_amount', ''),
                 receipt.get('filename', ''),
-                receipt.get('processing_status', '')
+                'duplicate' if receipt.get('duplicate_of')
+                else 'possible duplicate' if receipt.get('possible_duplicate_of')
+                else receipt.get('processing_status', '')
             ])
         
         output.seek(0)
@@ -554,30 +1315,33 @@ async def export_receipts_csv(filters: Optional[ExportFilters] = None):
         raise HTTPException(status_code=500, detail="Failed to export receipts")
 
 @api_router.get("/categories")
-async def get_categories():
+async def get_categories(request: Request):
     """Get all categories - NO AUTH REQUIRED"""
     try:
-        pipeline = [
-            {"$match": {"user_id": PUBLIC_DEMO_USER_ID}},
-            {"$group": {"_id": "$category", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}}
-        ]
-        categories = await db.receipts.aggregate(pipeline).to_list(length=None)
-        
-        result = []
-        for cat in categories:
-            result.append({
-                "name": cat["_id"] if cat["_id"] else "Uncategorized",
-                "count": cat["count"],
-                "total_amount": 0.0
-            })
-        
-        logger.info(f"📊 Retrieved {len(result)} categories")
-        return {"categories": result}
+        return await cached_json_response(request, PUBLIC_DEMO_USER_ID, ("categories",), build_categories)
     except Exception as e:
         logger.error(f"❌ Get categories error: {str(e)}")
         return {"categories": []}
 
+async def build_categories() -> bytes:
+    pipeline = [
+        {"$match": {"user_id": PUBLIC_DEMO_USER_ID}},
+        {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}}
+    ]
+    categories = await db.receipts.aggregate(pipeline).to_list(length=None)
+    
+    result = []
+    for cat in categories:
+        result.append({
+            "name": cat["_id"] if cat["_id"] else "Uncategorized",
+            "count": cat["count"],
+            "total_amount": 0.0
+        })
+    
+    logger.info(f"📊 Retrieved {len(result)} categories")
+    return dumps({"categories": result})
+
 @api_router.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -593,11 +1357,37 @@ async def health_check():
         "version": "2.1.0",
         "mode": "public-demo",
         "auth_required": False,
-        "database": db_status
+        "database": db_status,
+        "ml_feedback": feedback_learner.get_status() if feedback_learner else None,
+        "ml_tiers": (ocr_processor.transaction_processor.category_classifier.get_status()
+                     if ocr_processor.transaction_processor.category_classifier else None),
+        "ocr_admission": ocr_admission.get_status(),
+        "receipt_store": receipt_store.get_status(),
+        "response_cache": response_cache.get_status(),
+        "duplicate_index": duplicate_index.get_status(),
+        "progress_events": {
+            "subscribers": progress_bus.subscriber_count,
+            "cross_worker_relay": progress_relay.enabled
+        }
     }
 
+@api_router.get("/ocr/status")
+async def ocr_status():
+    """Live OCR saturation: slots in flight, queue depth, wait and service latencies per priority lane"""
+    return ocr_admission.get_status()
+
+@api_router.get("/storage/status")
+async def storage_status():
+    """Blob store usage: distinct blobs and bytes stored vs. bytes referenced by receipts"""
+    return await blob_store.get_status()
+
 # Include router
 app.include_router(api_router)
+if FEEDBACK_LEARNING_AVAILABLE:
+    app.include_router(ml_router)
+
+# Compress JSON and CSV responses (zstd/brotli when installed, gzip otherwise)
+app.add_middleware(CompressionMiddleware)
 
 # Add logging middleware
 app.add_middleware(LoggingMiddleware)
@@ -633,7 +1423,8 @@ async def http_exception_handler_custom(request: Request, exc: HTTPException):
         content={
             "error": f"HTTP {exc.status_code}",
             "message": exc.detail if isinstance(exc.detail, str) else str(exc.detail)
-        }
+        },
+        headers=exc.headers
     )
 
 @app.exception_handler(500)
@@ -649,8 +1440,34 @@ async def internal_server_error_handler(request: Request, exc: Exception):
         }
     )
 
+@app.on_event("startup")
+async def start_feedback_learning():
+    if feedback_learner or ocr_processor.transaction_processor.category_classifier:
+        asyncio.create_task(feedback_update_loop())
+        logger.info(f"🧠 Feedback learning every {FEEDBACK_UPDATE_INTERVAL}s")
+
+@app.on_event("startup")
+async def start_progress_relay():
+    # Probing change stream support waits on server selection; don't hold up startup for it
+    asyncio.create_task(progress_relay.start())
+
+async def migrate_receipt_dates():
+    # Receipts stored by older versions kept upload_date as an ISO string
+    try:
+        await migrate_string_dates(db.receipts, "upload_date")
+    except Exception as e:
+        logger.warning(f"⚠️ upload_date migration skipped: {str(e)}")
+
+@app.on_event("startup")
+async def start_receipt_date_migration():
+    asyncio.create_task(migrate_receipt_dates())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    if ocr_processor.transaction_processor.category_classifier:
+        # Decisions still awaiting a correction would otherwise never reach the outcome log
+        ocr_processor.transaction_processor.category_classifier.flush_tracked()
+    await receipt_store.close()
     client.close()
     logger.info("🔴 MongoDB connection closed")
 
@@ -25,6 +25,8 @@ import io
 import csv
 import re
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from pdf2image import convert_from_path
 from PIL import Image, ImageOps
 import pillow_heif
@@ -88,6 +90,16 @@ app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 # CONSTANT: Public demo user ID
 PUBLIC_DEMO_USER_ID = "public-demo-user"
 
+SUPPORTED_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.pdf', '.tiff', '.bmp', '.heic', '.heif']
+
+# Uploaded photos are normalized to fit this box before storage and OCR
+MAX_IMAGE_SIZE = (2000, 2000)
+
+# Decoding, rotating, downscaling and re-encoding photos is CPU-bound; it runs
+# on its own pool so a large upload never stalls the event loop
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+image_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image-normalize")
+
 # Pydantic Models
 class ReceiptItem(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -154,13 +166,18 @@ class ReceiptOCRProcessor:
             logger.error(f"PDF conversion error: {str(e)}")
             return []
     
-    async def process_receipt_file(self, file_path: str, is_pdf: bool = False) -> Dict[str, Any]:
+    async def process_receipt_file(self, file_path: str, is_pdf: bool = False,
+                                   image: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """OCR a stored receipt; image is the already normalized BGR pixels of a photo upload, if available"""
         if not self.reader:
             return {'success': False, 'error': 'OCR service not available'}
         
         try:
             image_paths = []
-            if is_pdf:
+            if image is not None:
+                # Decoded in memory by the upload path; no need to read the file back
+                image_paths = [image]
+            elif is_pdf:
                 image_paths = await self.convert_pdf_to_images(file_path)
                 if not image_paths:
                     return {'success': False, 'error': 'Failed to convert PDF'}
@@ -170,10 +187,11 @@ class ReceiptOCRProcessor:
             all_results = []
             for image_path in image_paths:
                 try:
-                    import cv2
-                    test_image = cv2.imread(image_path)
-                    if test_image is None:
-                        continue
+                    if isinstance(image_path, str):
+                        import cv2
+                        test_image = cv2.imread(image_path)
+                        if test_image is None:
+                            continue
                     
                     loop = asyncio.get_event_loop()
                     results = await loop.run_in_executor(
@@ -181,7 +199,7 @@ class ReceiptOCRProcessor:
                         lambda: self.reader.readtext(image_path, detail=1, paragraph=False)
                     )
                     all_results.extend(results)
-                    logger.info(f"✅ OCR found {len(results)} text elements in {image_path}")
+                    logger.info(f"✅ OCR found {len(results)} text elements in {file_path}")
                 except Exception as e:
                     logger.error(f"Image processing error: {str(e)}")
                     continue
@@ -241,42 +259,63 @@ class ReceiptOCRProcessor:
 ocr_processor = ReceiptOCRProcessor()
 
 # Helper functions
-async def save_uploaded_file_permanently(upload_file: UploadFile, receipt_id: str) -> str:
+def normalize_image(raw_bytes: bytes, file_path: Path) -> np.ndarray:
+    """
+    Decode an uploaded photo, rotate it upright, fit it into MAX_IMAGE_SIZE
+    and save it as JPEG. Runs on image_executor.
+    
+    Returns the normalized pixels as a BGR array (what cv2.imread would
+    give), so OCR can start without reading the file back.
+    """
+    # Open the image (now supports HEIC)
+    image = Image.open(io.BytesIO(raw_bytes))
+    
+    # JPEGs decode straight to 1/2, 1/4 or 1/8 scale when that still covers the
+    # final size, much cheaper than decoding every pixel of a 12 MP photo
+    scale = min(MAX_IMAGE_SIZE[0] / image.width, MAX_IMAGE_SIZE[1] / image.height)
+    if scale < 1:
+        image.draft('RGB', (int(image.width * scale), int(image.height * scale)))
+    
+    # 🔥 FIX 1 — auto rotate based on EXIF (phone photos)
+    image = ImageOps.exif_transpose(image)
+    
+    # 🔥 FIX 2 — ensure RGB (HEIC, PNG & grayscale fix)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    
+    # 🔥 FIX 3 — downscale huge mobile photos
+    image.thumbnail(MAX_IMAGE_SIZE, Image.LANCZOS)
+    
+    # Save normalized image
+    image.save(file_path, format="JPEG", quality=90)
+    
+    return np.ascontiguousarray(np.asarray(image)[:, :, ::-1])
+
+async def save_uploaded_file_permanently(upload_file: UploadFile, receipt_id: str) -> tuple:
+    """Store an upload; returns (file path, normalized BGR pixels or None for PDFs)"""
     try:
         file_extension = Path(upload_file.filename).suffix.lower()
-        if file_extension not in ['.jpg', '.jpeg', '.png', '.pdf', '.tiff', '.bmp']:
+        if file_extension not in SUPPORTED_EXTENSIONS:
             raise HTTPException(status_code=400, detail="Unsupported file format")
         
-        safe_filename = f"{receipt_id}_{upload_file.filename}"
-        file_path = UPLOADS_DIR / safe_filename
-        
- # Read raw file bytes
+        # Read raw file bytes
         raw_bytes = await upload_file.read()
 
         # If PDF — save directly (no image processing needed)
         if file_extension == '.pdf':
+            file_path = UPLOADS_DIR / f"{receipt_id}_{upload_file.filename}"
             async with aiofiles.open(file_path, 'wb') as buffer:
                 await buffer.write(raw_bytes)
-            return str(file_path)
-
-        # Open the image (now supports HEIC)
-        image = Image.open(BytesIO(raw_bytes))
-
-        # 🔥 FIX 1 — auto rotate based on EXIF (phone photos)
-        image = ImageOps.exif_transpose(image)
+            return str(file_path), None
 
-        # 🔥 FIX 2 — ensure RGB (HEIC & PNG fix)
-        if image.mode in ("RGBA", "P"):
-            image = image.convert("RGB")
-
-        # 🔥 FIX 3 — downscale huge mobile photos
-        MAX_SIZE = (2000, 2000)
-        image.thumbnail(MAX_SIZE, Image.LANCZOS)
-
-        # Save normalized image
-        image.save(file_path, format="JPEG", quality=90)
+        # Photos are re-encoded as JPEG whatever they arrived as
+        file_path = UPLOADS_DIR / f"{receipt_id}_{Path(upload_file.filename).stem}.jpg"
+        loop = asyncio.get_event_loop()
+        pixels = await loop.run_in_executor(image_executor, normalize_image, raw_bytes, file_path)
         
-        return str(file_path)
+        return str(file_path), pixels
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"File save error: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to save file")
@@ -322,7 +361,7 @@ async def upload_receipt(
         receipt_id = str(uuid.uuid4())
         
         # Save file
-        permanent_file_path = await save_uploaded_file_permanently(file, receipt_id)
+        permanent_file_path, pixels = await save_uploaded_file_permanently(file, receipt_id)
         
         # Create receipt record with PUBLIC_DEMO_USER_ID
         receipt_data = {
@@ -346,7 +385,7 @@ async def upload_receipt(
         await db.receipts.insert_one(receipt_dict)
         
         # Process OCR
-        ocr_result = await ocr_processor.process_receipt_file(permanent_file_path, is_pdf)
+        ocr_result = await ocr_processor.process_receipt_file(permanent_file_path, is_pdf, image=pixels)
         
         # Update with OCR results
         if ocr_result.get('success'):
@@ -677,6 +716,7 @@ async def internal_server_error_handler(request: Request, exc: Exception):
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
+    image_executor.shutdown(wait=False)
     logger.info("🔴 MongoDB connection closed")
 
 if __name__ == "__main__":
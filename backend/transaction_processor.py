@@ -11,16 +11,19 @@ import re
 import json
 # import numpy as np  # Disabled for deployment - not needed without ML
 from datetime import datetime, date
-from typing import Dict, Optional, Any
+from typing import Dict, Optional, Tuple, Any
 import logging
 
 # Import our robust extractors
 from robust_amount_extractor import extract_amount
 from robust_date_extractor import extract_date
+from merchant_gazetteer import get_gazetteer
+from merchant_resolver import get_merchant_resolver
 
 # Import ML category predictor
 try:
-    from ml_category_predictor import MLCategoryPredictor
+    from ml_model_registry import get_predictor_handle
+    from ml_tiered_classifier import get_tiered_classifier
     ML_AVAILABLE = True
 except ImportError:
     ML_AVAILABLE = False
@@ -30,32 +33,58 @@ except ImportError:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Merchant capture patterns for merchants not in the gazetteer
+MERCHANT_CAPTURE_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in [
+    # "at Starbucks", "from Amazon"
+    r'\b(?:at|from)\s+([A-Za-z][A-Za-z\s&]+?)(?:\s+(?:on|charged|billed|purchase))',
+    # "Merchant Name charged", "Merchant Name purchase"  
+    r'^([A-Za-z][A-Za-z\s&]+?)\s+(?:charged|purchase|billed)',
+    # "Payment to Merchant Name"
+    r'payment\s+to\s+([A-Za-z][A-Za-z\s&]+?)(?:\s+(?:on|of))',
+    # "Merchant Name Store #123"
+    r'^([A-Za-z][A-Za-z\s&]+?)\s+(?:store|location)\s*#',
+    # General merchant at start of text
+    r'^([A-Z][A-Za-z\s&]{2,30}?)(?:\s+(?:purchase|charged|order|subscription))',
+]]
+CAPITALIZED_PHRASE_PATTERN = re.compile(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*')
+
 class TransactionProcessor:
     """Master transaction processor integrating amount, date, category, and merchant extraction"""
     
     def __init__(self):
         """Initialize the transaction processor with ML and rule-based category prediction"""
         
-        # Initialize ML predictor if available
+        # Attach to the shared ML predictor handle if available
         if ML_AVAILABLE:
             try:
-                self.ml_predictor = MLCategoryPredictor()
-                self.use_ml = self.ml_predictor.is_trained
+                self.ml_handle = get_predictor_handle()
+                self.category_classifier = get_tiered_classifier()
                 logger.info(f"ML Category Predictor initialized (trained: {self.use_ml})")
             except Exception as e:
                 logger.error(f"Error initializing ML predictor: {str(e)}")
-                self.ml_predictor = None
-                self.use_ml = False
+                self.ml_handle = None
+                self.category_classifier = None
         else:
-            self.ml_predictor = None
-            self.use_ml = False
+            self.ml_handle = None
+            self.category_classifier = None
         
         # Fallback rule-based system
         self.category_rules = self._load_category_rules()
-        self.merchant_patterns = self._load_merchant_patterns()
+        self.merchant_gazetteer = get_gazetteer()
+        self.merchant_resolver = get_merchant_resolver()
         
         logger.info(f"Transaction processor initialized with ML: {self.use_ml}")
         
+    @property
+    def ml_predictor(self):
+        """Currently serving ML predictor (swapped by the model registry)"""
+        return self.ml_handle.predictor if self.ml_handle else None
+    
+    @property
+    def use_ml(self) -> bool:
+        ml_predictor = self.ml_predictor
+        return ml_predictor is not None and ml_predictor.is_trained
+    
     def _load_category_rules(self) -> Dict[str, Any]:
         """Load rule-based category prediction system"""
         return {
@@ -118,50 +147,27 @@ class TransactionProcessor:
             }
         }
     
-    def _load_merchant_patterns(self) -> Dict[str, str]:
-        """Common merchant name patterns and their clean versions"""
-        return {
-            # Clean up common merchant name variations
-            'mcdonald.*': 'McDonald\'s',
-            'starbucks.*': 'Starbucks',
-            'walmart.*': 'Walmart',
-            'amazon.*': 'Amazon',
-            'netflix.*': 'Netflix',
-            'spotify.*': 'Spotify',
-            'uber.*': 'Uber',
-            'lyft.*': 'Lyft',
-            'shell.*': 'Shell',
-            'target.*': 'Target',
-            'costco.*': 'Costco',
-            'home depot.*': 'Home Depot',
-            'best buy.*': 'Best Buy'
-        }
-    
     def extract_merchant(self, text: str) -> Optional[str]:
         """Extract and clean merchant name from transaction text"""
-        text_lower = text.lower()
+        merchant, _ = self.extract_merchant_with_id(text)
+        return merchant
+    
+    def extract_merchant_with_id(self, text: str) -> Tuple[Optional[str], Optional[str]]:
+        """Extract merchant name and gazetteer merchant ID (None for merchants not in the gazetteer)"""
         
-        # Method 1: Look for known merchant patterns
-        for pattern, clean_name in self.merchant_patterns.items():
-            if re.search(pattern, text_lower):
-                return clean_name
+        # Method 1: First known merchant name or alias in the gazetteer
+        match = self.merchant_gazetteer.find_first(text)
+        if match:
+            return match.name, match.merchant_id
         
-        # Method 2: Extract from common transaction patterns
-        merchant_patterns = [
-            # "at Starbucks", "from Amazon"
-            r'\b(?:at|from)\s+([A-Za-z][A-Za-z\s&]+?)(?:\s+(?:on|charged|billed|purchase))',
-            # "Merchant Name charged", "Merchant Name purchase"  
-            r'^([A-Za-z][A-Za-z\s&]+?)\s+(?:charged|purchase|billed)',
-            # "Payment to Merchant Name"
-            r'payment\s+to\s+([A-Za-z][A-Za-z\s&]+?)(?:\s+(?:on|of))',
-            # "Merchant Name Store #123"
-            r'^([A-Za-z][A-Za-z\s&]+?)\s+(?:store|location)\s*#',
-            # General merchant at start of text
-            r'^([A-Z][A-Za-z\s&]{2,30}?)(?:\s+(?:purchase|charged|order|subscription))',
-        ]
+        # Method 1b: Approximate gazetteer match in the header (OCR-garbled names)
+        match = self.merchant_resolver.resolve(text)
+        if match:
+            return match.name, match.merchant_id
         
-        for pattern in merchant_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        # Method 2: Extract from common transaction patterns
+        for pattern in MERCHANT_CAPTURE_PATTERNS:
+            match = pattern.search(text)
             if match:
                 merchant = match.group(1).strip()
                 # Clean up the merchant name
@@ -170,46 +176,62 @@ class TransactionProcessor:
                 
                 # Filter out common false positives
                 if len(merchant) > 2 and merchant.lower() not in ['you', 'your', 'card', 'account', 'bank']:
-                    return merchant
+                    resolved = self.merchant_resolver.resolve_name(merchant)
+                    if resolved:
+                        return resolved.name, resolved.merchant_id
+                    return merchant, None
         
         # Method 3: Look for capitalized words that might be merchants
-        words = re.findall(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*', text)
+        words = CAPITALIZED_PHRASE_PATTERN.findall(text)
         for word in words[:3]:  # Check first few capitalized phrases
             if (len(word) > 2 and 
                 word.lower() not in ['purchase', 'payment', 'charged', 'billed', 'transaction', 'order']):
-                return word
+                return word, None
         
-        return None
+        return None, None
     
     def predict_category(self, text: str, amount: Optional[float], merchant: Optional[str], 
                         date_str: Optional[str]) -> tuple[str, float]:
         """Predict transaction category using ML model or rule-based system"""
+        category, confidence, _ = self.predict_category_with_tier(text, amount, merchant, date_str)
+        return category, confidence
+    
+    def predict_category_with_tier(self, text: str, amount: Optional[float], merchant: Optional[str],
+                                   date_str: Optional[str]) -> tuple[str, float, str]:
+        """Predict transaction category and report which tier produced it"""
         
-        # Try ML prediction first if available
-        if self.use_ml and self.ml_predictor:
+        # Try the tiered ML classifier first if available
+        if self.use_ml:
             try:
-                ml_result = self.ml_predictor.predict_category(
+                ml_result = self.category_classifier.predict_category(
                     raw_text=text,
                     amount=amount,
                     merchant=merchant,
                     date_str=date_str
                 )
                 
-                # If ML prediction successful and confident
-                if (ml_result.get('method') == 'ml_random_forest' and 
-                    ml_result.get('confidence', 0) >= 0.3):
+                # Fast tiers answer only above their own gate; forest answers need minimum confidence
+                tier = ml_result.get('tier')
+                if (tier != 'forest' or
+                        (ml_result.get('method') == 'ml_random_forest' and ml_result.get('confidence', 0) >= 0.3)):
                     
                     category = ml_result.get('category', 'Uncategorized')
                     confidence = ml_result.get('confidence', 0.0)
                     
-                    logger.info(f"ML prediction: {category} (confidence: {confidence:.3f})")
-                    return category, confidence
+                    logger.info(f"ML prediction ({tier}): {category} (confidence: {confidence:.3f})")
+                    return category, confidence, tier
                     
             except Exception as e:
                 logger.error(f"Error in ML prediction: {str(e)}")
         
         # Fallback to rule-based prediction
-        return self._rule_based_prediction(text, amount, merchant, date_str)
+        category, confidence = self._rule_based_prediction(text, amount, merchant, date_str)
+        return category, confidence, 'rules'
+    
+    def record_category_outcome(self, text: str, corrected_category: str, merchant: Optional[str] = None):
+        """Feed a user correction to the tier gate tuning and shadow evaluation"""
+        if self.category_classifier:
+            self.category_classifier.record_outcome(text, corrected_category, merchant)
     
     def _rule_based_prediction(self, text: str, amount: Optional[float], 
                              merchant: Optional[str], date_str: Optional[str]) -> tuple[str, float]:
@@ -317,15 +339,18 @@ class TransactionProcessor:
         
         return "Uncategorized", 0.1
     
-    def process_transaction(self, raw_text: str) -> Dict[str, Any]:
+    def process_transaction(self, raw_text: str, amount: Optional[float] = None,
+                            date: Optional[str] = None) -> Dict[str, Any]:
         """
         Master function to process transaction text and extract all key information
         
         Args:
             raw_text (str): Raw transaction text from SMS/email
+            amount (float, optional): Amount already known from receipt layout; skips the text scan
+            date (str, optional): Date already known from receipt layout; skips the text scan
             
         Returns:
-            Dict with keys: amount, date, category, merchant, confidence, raw_text
+            Dict with keys: amount, date, category, merchant, merchant_id, confidence, category_tier, raw_text
         """
         
         if not raw_text or not isinstance(raw_text, str):
@@ -344,16 +369,16 @@ class TransactionProcessor:
             logger.info(f"Processing transaction: {raw_text[:100]}...")
             
             # Step 1: Extract amount using robust extractor
-            extracted_amount = extract_amount(raw_text)
+            extracted_amount = amount if amount is not None else extract_amount(raw_text)
             
             # Step 2: Extract date using robust extractor  
-            extracted_date = extract_date(raw_text)
+            extracted_date = date if date is not None else extract_date(raw_text)
             
             # Step 3: Extract merchant name
-            extracted_merchant = self.extract_merchant(raw_text)
+            extracted_merchant, merchant_id = self.extract_merchant_with_id(raw_text)
             
             # Step 4: Predict category using all available information
-            predicted_category, confidence = self.predict_category(
+            predicted_category, confidence, category_tier = self.predict_category_with_tier(
                 raw_text, extracted_amount, extracted_merchant, extracted_date
             )
             
@@ -363,7 +388,9 @@ class TransactionProcessor:
                 'date': extracted_date,
                 'category': predicted_category,
                 'merchant': extracted_merchant,
+                'merchant_id': merchant_id,
                 'confidence': round(confidence, 3),
+                'category_tier': category_tier,
                 'raw_text': raw_text,
                 'processing_status': 'completed'
             }
@@ -371,7 +398,7 @@ class TransactionProcessor:
             # Log results for debugging
             logger.info(f"Extracted - Amount: {extracted_amount}, Date: {extracted_date}, "
                        f"Merchant: {extracted_merchant}, Category: {predicted_category} "
-                       f"(confidence: {confidence:.3f})")
+                       f"(confidence: {confidence:.3f}, tier: {category_tier})")
             
             return result
             
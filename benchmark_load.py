@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+End-to-End Load Benchmark
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+
+Boots the FastAPI app (backend/server.py) in-process and drives a mixed
+upload / list / search / export workload through it with concurrent
+virtual users, then reports throughput and p50/p95/p99 latency per
+endpoint.
+
+  - Database: an in-memory Motor stand-in (default, optional simulated
+    round-trip latency) or a real mongod via --mongo. The benchmark
+    database is dropped before the run.
+  - OCR: a deterministic stub reader with configurable latency (default;
+    image preprocessing, duplicate hashing, layout parsing and
+    categorization still run for real) or the real EasyOCR reader.
+  - Baselines: --save-baseline stores the results; --baseline compares a
+    run against them and exits with status 1 on a regression beyond
+    --tolerance.
+
+Everything the server writes (uploads, renditions, model feedback) goes to
+a temporary working directory that is removed afterwards.
+
+Usage:
+    python benchmark_load.py [--duration 30] [--concurrency 16] [--mix upload=1,list=6,search=3,export=1]
+                             [--ocr stub|easyocr] [--ocr-latency-ms 250] [--mongo mongodb://localhost:27017]
+                             [--seed-receipts 2000] [--save-baseline load_baseline.json] [--baseline load_baseline.json]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from collections import Counter
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MERCHANTS = ['STARBUCKS', 'WALMART', 'TARGET', 'COSTCO', 'WHOLE FOODS MARKET', 'CVS PHARMACY', 'HOME DEPOT', 'SAFEWAY']
+ITEMS = ['MILK', 'BREAD', 'EGGS', 'COFFEE', 'BANANAS', 'PAPER TOWELS', 'SHAMPOO', 'BATTERIES', 'RICE', 'APPLES']
+SEARCH_TERMS = ['Starbucks', 'Walmart', 'Target', 'Costco', 'Whole Foods', 'Pharmacy', 'ITEM 1', 'receipt_4']
+
+DEFAULT_MIX = 'upload=1,list=6,search=3,export=1'
+
+class StubOCRReader:
+    """
+    Deterministic EasyOCR stand-in.
+
+    readtext() blocks its OCR worker for the configured latency, like the
+    real model, and returns EasyOCR-shaped boxes for a receipt chosen by a
+    checksum of the image, so the same upload always reads the same.
+    """
+
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+
+    def readtext(self, image, detail: int = 1, paragraph: bool = False) -> List[tuple]:
+        time.sleep(self.latency)
+        rng = random.Random(zlib.crc32(np.ascontiguousarray(image).tobytes()))
+        items = [(rng.choice(ITEMS), rng.uniform(1, 30)) for _ in range(rng.randint(3, 12))]
+        subtotal = sum(amount for _, amount in items)
+        lines = [(rng.choice(MERCHANTS), None), ('123 MAIN STREET', None),
+                 (f"DATE: 2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", None)]
+        lines += [(name, f"{amount:.2f}") for name, amount in items]
+        lines += [('SUBTOTAL', f"{subtotal:.2f}"), ('TAX', f"{subtotal * 0.08:.2f}"), ('TOTAL', f"{subtotal * 1.08:.2f}")]
+
+        results = []
+        for i, (text, amount) in enumerate(lines):
+            top = 40 + i * 32
+            results.append(self._box(20, top, text, rng))
+            if amount is not None:
+                results.append(self._box(560 - 12 * len(amount), top, amount, rng))
+        return results
+
+    @staticmethod
+    def _box(left: int, top: int, text: str, rng: random.Random) -> tuple:
+        right, bottom = left + 12 * len(text), top + 24
+        return ([[left, top], [right, top], [right, bottom], [left, bottom]], text, round(rng.uniform(0.85, 0.99), 3))
+
+def render_upload(seed: int) -> bytes:
+    """A small, unique receipt photo as JPEG bytes"""
+    rng = random.Random(seed)
+    lines = [rng.choice(MERCHANTS), f"ORDER {seed}"]
+    lines += [f"{rng.choice(ITEMS):<16}{rng.uniform(1, 30):>8.2f}" for _ in range(rng.randint(4, 14))]
+    font = ImageFont.load_default(size=22)
+    image = Image.new('L', (600, 60 + 34 * len(lines)), 245)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((30, 30 + 34 * i), line, fill=20, font=font)
+    buffer = io.BytesIO()
+    image.convert('RGB').save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+def boot_server(args, workdir: str):
+    """Import the app against the chosen database, with the chosen OCR engine"""
+    # Paths the server resolves relative to the working directory, pinned to the repository
+    os.environ.setdefault('ML_MODEL_PATH', os.path.join(REPO_DIR, 'models', 'category_predictor.pkl'))
+    os.environ.setdefault('TRAINING_DATASET_PATH', os.path.join(REPO_DIR, 'synthetic_training_dataset.json'))
+    os.environ['DB_NAME'] = args.database
+    sys.path[:0] = [os.path.join(REPO_DIR, 'backend'), REPO_DIR]
+
+    if args.mongo:
+        os.environ['MONGODB_URI'] = args.mongo
+    else:
+        import motor.motor_asyncio
+        from memory_motor import MemoryMotorClient
+        MemoryMotorClient.latency_ms = args.db_latency_ms
+        motor.motor_asyncio.AsyncIOMotorClient = MemoryMotorClient
+
+    # Configured before the server's own basicConfig, which then leaves it alone
+    logging.basicConfig(level=getattr(logging, args.log_level))
+    os.chdir(workdir)
+    import server
+
+    if args.ocr == 'stub':
+        server.ocr_processor.reader = StubOCRReader(args.ocr_latency_ms)
+        server.ocr_processor.roi_reader = None
+    elif server.ocr_processor.reader is None:
+        raise SystemExit("❌ --ocr easyocr needs EasyOCR installed and loadable")
+
+    return server
+
+async def seed_receipts(server, count: int):
+    from benchmark_receipt_serialization import make_documents
+    await server.client.drop_database(server.DB_NAME)
+    if count:
+        await server.db.receipts.insert_many(make_documents(count, random.Random(7)), ordered=False)
+
+def build_operations(uploads: List[bytes]) -> Dict[str, Callable]:
+    counter = {'uploads': 0}
+
+    async def upload(client, rng):
+        index = counter['uploads']
+        counter['uploads'] += 1
+        data = uploads[index % len(uploads)]
+        return await client.post('/api/receipts/upload', files={'file': (f'load_{index}.jpg', data, 'image/jpeg')})
+
+    async def list_receipts(client, rng):
+        return await client.get('/api/receipts', params={'skip': rng.choice([0, 0, 0, 50, 100]), 'limit': 50})
+
+    async def search(client, rng):
+        return await client.get('/api/receipts', params={'search': rng.choice(SEARCH_TERMS), 'limit': 50})
+
+    async def export(client, rng):
+        return await client.post('/api/receipts/export/csv')
+
+    return {'upload': upload, 'list': list_receipts, 'search': search, 'export': export}
+
+async def drive_load(app, operations: Dict[str, Callable], weights: Dict[str, float],
+                     concurrency: int, duration: float, warmup: float, seed: int) -> Dict[str, Any]:
+    """Closed-loop virtual users; requests started during warmup are not recorded"""
+    import httpx
+
+    names = [name for name in weights if weights[name] > 0]
+    samples = {name: [] for name in names}
+    statuses = {name: Counter() for name in names}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://lumina', timeout=300,
+                                 headers={'Accept-Encoding': 'gzip'}) as client:
+        start = time.perf_counter()
+        measure_from = start + warmup
+        end = measure_from + duration
+
+        async def user(index: int):
+            rng = random.Random(seed * 1000 + index)
+            while time.perf_counter() < end:
+                name = rng.choices(names, [weights[n] for n in names])[0]
+                sent = time.perf_counter()
+                try:
+                    response = await operations[name](client, rng)
+                    outcome = response.status_code
+                except Exception as e:
+                    outcome = type(e).__name__
+                if sent >= measure_from:
+                    samples[name].append(time.perf_counter() - sent)
+                    statuses[name][outcome] += 1
+
+        await asyncio.gather(*(user(i) for i in range(concurrency)))
+        measured = time.perf_counter() - measure_from
+
+    return {'samples': samples, 'statuses': statuses, 'measured_seconds': measured}
+
+def percentile(ordered: List[float], p: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))]
+
+def summarize(run: Dict[str, Any]) -> Dict[str, Any]:
+    seconds = run['measured_seconds']
+    endpoints = {}
+    for name, values in run['samples'].items():
+        ordered = sorted(values)
+        statuses = run['statuses'][name]
+        ok = sum(count for code, count in statuses.items() if isinstance(code, int) and code < 400)
+        endpoints[name] = {
+            'count': len(ordered),
+            'errors': len(ordered) - ok,
+            'statuses': {str(code): count for code, count in sorted(statuses.items(), key=str)},
+            'throughput_rps': round(len(ordered) / seconds, 2),
+            'p50_ms': round(percentile(ordered, 50) * 1000, 2) if ordered else None,
+            'p95_ms': round(percentile(ordered, 95) * 1000, 2) if ordered else None,
+            'p99_ms': round(percentile(ordered, 99) * 1000, 2) if ordered else None,
+            'mean_ms': round(sum(ordered) / len(ordered) * 1000, 2) if ordered else None,
+        }
+    total = sum(row['count'] for row in endpoints.values())
+    return {'measured_seconds': round(seconds, 2), 'total_requests': total,
+            'throughput_rps': round(total / seconds, 2), 'endpoints': endpoints}
+
+def print_report(results: Dict[str, Any]):
+    print(f"\n{'Endpoint':<10}{'Requests':>10}{'Errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, row in results['endpoints'].items():
+        if not row['count']:
+            print(f"{name:<10}{0:>10}")
+            continue
+        print(f"{name:<10}{row['count']:>10}{row['errors']:>8}{row['throughput_rps']:>9.1f}"
+              f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}")
+    print(f"{'total':<10}{results['total_requests']:>10}{'':>8}{results['throughput_rps']:>9.1f}")
+    for name, row in results['endpoints'].items():
+        if row['errors']:
+            print(f"  ⚠️ {name} statuses: {row['statuses']}")
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Print changes against a baseline; returns the regressions beyond tolerance"""
+    if baseline.get('config') != results['config']:
+        print("⚠️ Baseline was recorded with a different configuration; comparison is indicative only")
+
+    regressions = []
+    print(f"\n{'Endpoint':<10}{'req/s':>16}{'p50':>16}{'p95':>16}{'p99':>16}   (change vs. baseline)")
+    for name, row in results['endpoints'].items():
+        base = baseline['endpoints'].get(name)
+        if not base or not row['count'] or not base['count']:
+            continue
+        cells = []
+        for metric in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            change = row[metric] / base[metric] - 1 if base[metric] else 0.0
+            # Lower throughput or higher latency is worse
+            worse = -change if metric == 'throughput_rps' else change
+            if worse > tolerance:
+                regressions.append(f"{name} {metric}: {base[metric]} -> {row[metric]} ({change:+.0%})")
+            cells.append(f"{change:+.0%}{' ❌' if worse > tolerance else ''}")
+        print(f"{name:<10}" + ''.join(f"{cell:>16}" for cell in cells))
+    return regressions
+
+async def run_benchmark(args) -> int:
+    print("🧪 End-to-End Load Benchmark")
+    print("=" * 60)
+
+    weights = parse_mix(args.mix)
+    unknown = set(weights) - {'upload', 'list', 'search', 'export'}
+    if unknown:
+        raise SystemExit(f"❌ Unknown workload(s) in --mix: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix='lumina_load_')
+    try:
+        server = boot_server(args, workdir)
+        print(f"Database: {args.mongo or 'in-memory stand-in'} ({args.database}), "
+              f"OCR: {args.ocr}{f' ({args.ocr_latency_ms:g} ms)' if args.ocr == 'stub' else ''}")
+        print(f"Workload: {args.mix}, {args.concurrency} users, {args.warmup:g}s warmup + {args.duration:g}s, "
+              f"{server.ocr_admission.max_in_flight} OCR slot(s)")
+
+        uploads = [render_upload(args.seed * 100000 + i) for i in range(args.upload_pool)]
+        async with server.app.router.lifespan_context(server.app):
+            await seed_receipts(server, args.seed_receipts)
+            run = await drive_load(server.app, build_operations(uploads), weights,
+                                   args.concurrency, args.duration, args.warmup, args.seed)
+            # Background uploads, batch jobs and the thumbnail renders they start write into the working directory
+            await asyncio.gather(*server.upload_tasks, *server.batch_tasks, return_exceptions=True)
+            await asyncio.gather(*server.rendition_tasks, return_exceptions=True)
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = summarize(run)
+    results['config'] = {
+        'mix': args.mix, 'concurrency': args.concurrency, 'duration': args.duration,
+        'ocr': args.ocr, 'ocr_latency_ms': args.ocr_latency_ms if args.ocr == 'stub' else None,
+        'database': 'mongo' if args.mongo else 'memory', 'db_latency_ms': None if args.mongo else args.db_latency_ms,
+        'seed_receipts': args.seed_receipts, 'ocr_slots': server.ocr_admission.max_in_flight
+    }
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print(f"\n✅ No regressions beyond {args.tolerance:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the receipt API in-process")
+    parser.add_argument('--duration', type=float, default=30, help="measured seconds")
+    parser.add_argument('--warmup', type=float, default=3, help="seconds before measuring starts")
+    parser.add_argument('--concurrency', type=int, default=16, help="virtual users")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="relative weights of upload, list, search and export")
+    parser.add_argument('--ocr', choices=['stub', 'easyocr'], default='stub')
+    parser.add_argument('--ocr-latency-ms', type=float, default=250, help="stub OCR time per page")
+    parser.add_argument('--mongo', help="MongoDB URI; default is the in-memory stand-in")
+    parser.add_argument('--database', default='lumina_loadtest', help="database name, dropped before the run")
+    parser.add_argument('--db-latency-ms', type=float, default=0.5, help="simulated round trip of the in-memory database")
+    parser.add_argument('--seed-receipts', type=int, default=2000, help="receipts stored before the run")
+    parser.add_argument('--upload-pool', type=int, default=200, help="distinct receipt images to upload")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--log-level', default='WARNING', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    parser.add_argument('--output')
+    parser.add_argument('--save-baseline')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15, help="allowed relative slowdown vs. the baseline")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run_benchmark(args)))
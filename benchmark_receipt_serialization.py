@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+Receipt List Serialization Benchmark
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+
+Compares the two ways GET /api/receipts turns Mongo documents into a
+response body, for 100- and 1000-receipt pages:
+  - model path: parse the ISO upload_date string, build Receipt models,
+    re-validate against List[Receipt] and encode with the stdlib (what
+    FastAPI does with response_model),
+  - direct path: projected documents with native dates encoded in one
+    call by the DocumentSerializer.
+
+Usage:
+    python benchmark_receipt_serialization.py [--repeat 20] [--output results.json]
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from statistics import median
+from typing import List
+
+from pydantic import TypeAdapter
+
+sys.path.append('backend')
+
+from server import Receipt, receipt_serializer
+from receipt_serialization import ORJSON_AVAILABLE
+
+MERCHANTS = ['Starbucks', 'Walmart', 'Target', 'Costco', 'Whole Foods Market', 'CVS Pharmacy', 'Home Depot']
+CATEGORIES = ['Food & Dining', 'Groceries', 'Shopping', 'Health', 'Home']
+
+def make_documents(count: int, rng: random.Random) -> List[dict]:
+    """Receipts as Mongo returns them now: native (naive UTC) upload_date, projected fields"""
+    start = datetime(2024, 1, 1)
+    documents = []
+    for _ in range(count):
+        items = [
+            {'id': str(uuid.uuid4()), 'description': f'ITEM {rng.randint(1, 999)}',
+             'amount': f'${rng.uniform(1, 40):.2f}', 'confidence': round(rng.random(), 3)}
+            for _ in range(rng.randint(2, 12))
+        ]
+        documents.append({
+            'id': str(uuid.uuid4()),
+            'user_id': 'public-demo-user',
+            'filename': f'receipt_{rng.randint(1, 99999)}.jpg',
+            'original_file_path': f'uploads/{uuid.uuid4()}.jpg',
+            'upload_date': start + timedelta(seconds=rng.randint(0, 30_000_000), microseconds=rng.randint(0, 999999)),
+            'merchant_name': rng.choice(MERCHANTS),
+            'merchant_id': None,
+            'receipt_date': '2024-03-12',
+            'total_amount': f'${rng.uniform(5, 300):.2f}',
+            'subtotal_amount': None,
+            'tax_amount': None,
+            'category': rng.choice(CATEGORIES),
+            'items': items,
+            'raw_text': '\n'.join(item['description'] + ' ' + item['amount'] for item in items),
+            'processing_status': 'completed',
+            'confidence_score': 0.8,
+            'category_confidence': round(rng.random(), 3),
+            'categorization_method': 'advanced_ml',
+            'batch_id': None
+        })
+    return documents
+
+def legacy_documents(documents: List[dict]) -> List[dict]:
+    """The same receipts as previously stored: ISO string dates and an _id"""
+    return [
+        {'_id': uuid.uuid4().hex[:24], **document,
+         'upload_date': document['upload_date'].isoformat() + '+00:00'}
+        for document in documents
+    ]
+
+receipt_list = TypeAdapter(List[Receipt])
+
+def model_path(documents: List[dict]) -> bytes:
+    receipts = []
+    for document in documents:
+        document = dict(document)
+        document['upload_date'] = datetime.fromisoformat(document['upload_date'])
+        receipts.append(Receipt(**document))
+    validated = receipt_list.validate_python(receipts)
+    content = receipt_list.dump_python(validated, mode='json')
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+def direct_path(documents: List[dict]) -> bytes:
+    return receipt_serializer.dumps_many(documents)
+
+def time_path(func, documents: List[dict], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(documents)
+        timings.append(time.perf_counter() - start)
+    return median(timings) * 1000
+
+def run_benchmark(repeat: int, output: str = None):
+    print("🧪 Receipt Serialization Benchmark")
+    print("=" * 60)
+    print(f"Encoder: {'orjson' if ORJSON_AVAILABLE else 'stdlib json (orjson not installed)'}")
+
+    rng = random.Random(7)
+    rows = []
+    for page_size in (100, 1000):
+        documents = make_documents(page_size, rng)
+        legacy = legacy_documents(documents)
+
+        same_output = json.loads(model_path(legacy)) == json.loads(direct_path(documents))
+        model_ms = time_path(model_path, legacy, repeat)
+        direct_ms = time_path(direct_path, documents, repeat)
+        row = {
+            'page_size': page_size,
+            'model_path_ms': round(model_ms, 2),
+            'direct_path_ms': round(direct_ms, 2),
+            'speedup': round(model_ms / direct_ms, 1),
+            'body_kb': round(len(direct_path(documents)) / 1024, 1),
+            'identical_json': same_output
+        }
+        rows.append(row)
+        print(f"  {page_size:>5} receipts: model {row['model_path_ms']:>8.2f} ms, direct {row['direct_path_ms']:>7.2f} ms "
+              f"({row['speedup']}x), {row['body_kb']} KB, identical JSON: {'✅' if same_output else '❌'}")
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(rows, f, indent=2)
+        print(f"\n💾 Results written to {output}")
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark receipt list serialization")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    run_benchmark(args.repeat, args.output)
@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+In-Memory Motor Stand-In for Benchmarks and Tests
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+
+Implements the part of the Motor API the server uses (find/find_one with
+projections, sort, skip and limit; inserts; updates with $set, $inc,
+$setOnInsert, $unset and upserts; find_one_and_update; deletes;
+bulk_write; simple aggregations) over plain dicts in the event loop, so
+the FastAPI app can run in-process without a mongod. Change streams are
+reported as unsupported, exactly like a standalone server, which turns
+the progress relay off.
+
+Documents are copied on write the way BSON would store them (datetimes
+become naive UTC with millisecond precision, as pymongo returns them) and
+shallow-copied on read: callers may change top-level fields of what they
+read, not nested values.
+"""
+
+import asyncio
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+import logging
+
+from bson import ObjectId
+from pymongo import DeleteOne, InsertOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import OperationFailure
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+def to_bson(value: Any) -> Any:
+    """Deep copy of a value as it would come back from Mongo"""
+    if isinstance(value, dict):
+        return {key: to_bson(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_bson(item) for item in value]
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    return value
+
+def _get(document: Dict[str, Any], path: str) -> Any:
+    value = document
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+def _set(document: Dict[str, Any], path: str, value: Any):
+    *parents, last = path.split('.')
+    for part in parents:
+        document = document.setdefault(part, {})
+    document[last] = value
+
+def _unset(document: Dict[str, Any], path: str):
+    *parents, last = path.split('.')
+    for part in parents:
+        document = document.get(part)
+        if not isinstance(document, dict):
+            return
+    document.pop(last, None)
+
+def _compare(value: Any, operator: str, argument: Any) -> bool:
+    if value is _MISSING or value is None:
+        return False
+    try:
+        if operator == '$gt':
+            return value > argument
+        if operator == '$gte':
+            return value >= argument
+        if operator == '$lt':
+            return value < argument
+        return value <= argument
+    except TypeError:
+        return False
+
+_TYPES = {'string': str, 'date': datetime, 'bool': bool, 'object': dict, 'array': list,
+          'int': int, 'long': int, 'double': float, 'number': (int, float)}
+
+def _equals(value: Any, expected: Any) -> bool:
+    if value is _MISSING:
+        return expected is None
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return value == expected
+
+def _match_value(value: Any, condition: Any) -> bool:
+    if isinstance(condition, re.Pattern):
+        return isinstance(value, str) and condition.search(value) is not None
+    if not (isinstance(condition, dict) and condition and all(key.startswith('$') for key in condition)):
+        return _equals(value, condition)
+
+    for operator, argument in condition.items():
+        if operator == '$eq':
+            matched = _equals(value, argument)
+        elif operator == '$ne':
+            matched = not _equals(value, argument)
+        elif operator in ('$gt', '$gte', '$lt', '$lte'):
+            matched = _compare(value, operator, argument)
+        elif operator == '$in':
+            matched = any(_equals(value, candidate) for candidate in argument)
+        elif operator == '$nin':
+            matched = not any(_equals(value, candidate) for candidate in argument)
+        elif operator == '$exists':
+            matched = (value is not _MISSING) == bool(argument)
+        elif operator == '$regex':
+            flags = re.IGNORECASE if 'i' in condition.get('$options', '') else 0
+            matched = isinstance(value, str) and re.search(argument, value, flags) is not None
+        elif operator == '$options':
+            continue
+        elif operator == '$type':
+            matched = isinstance(value, _TYPES[argument]) and not (argument != 'bool' and isinstance(value, bool))
+        elif operator == '$not':
+            matched = not _match_value(value, argument)
+        else:
+            raise NotImplementedError(f"Query operator {operator} is not supported")
+        if not matched:
+            return False
+    return True
+
+def matches(document: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    """Whether a document satisfies a Mongo query filter"""
+    for key, condition in (query or {}).items():
+        if key == '$or':
+            if not any(matches(document, part) for part in condition):
+                return False
+        elif key == '$and':
+            if not all(matches(document, part) for part in condition):
+                return False
+        elif key == '$nor':
+            if any(matches(document, part) for part in condition):
+                return False
+        elif not _match_value(_get(document, key), condition):
+            return False
+    return True
+
+def project(document: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Apply an inclusion or exclusion projection (top-level fields)"""
+    if not projection:
+        return dict(document)
+    included = [key for key, value in projection.items() if value and key != '_id']
+    if included:
+        result = {key: document[key] for key in included if key in document}
+        if projection.get('_id', 1) and '_id' in document:
+            result['_id'] = document['_id']
+        return result
+    excluded = {key for key, value in projection.items() if not value}
+    return {key: value for key, value in document.items() if key not in excluded}
+
+def apply_update(document: Dict[str, Any], update: Any, inserting: bool = False):
+    """Apply update operators to a document in place"""
+    if isinstance(update, list):
+        raise NotImplementedError("Aggregation pipeline updates are not supported")
+    for operator, fields in update.items():
+        for path, value in fields.items():
+            if operator == '$set' or (operator == '$setOnInsert' and inserting):
+                _set(document, path, to_bson(value))
+            elif operator == '$setOnInsert':
+                continue
+            elif operator == '$unset':
+                _unset(document, path)
+            elif operator == '$inc':
+                current = _get(document, path)
+                _set(document, path, (0 if current is _MISSING else current) + value)
+            elif operator == '$push':
+                current = _get(document, path)
+                _set(document, path, ([] if current is _MISSING else current) + [to_bson(value)])
+            elif operator in ('$max', '$min'):
+                current = _get(document, path)
+                value = to_bson(value)
+                if current is _MISSING or (value > current if operator == '$max' else value < current):
+                    _set(document, path, value)
+            else:
+                raise NotImplementedError(f"Update operator {operator} is not supported")
+
+def _evaluate(expression: Any, document: Dict[str, Any]) -> Any:
+    if isinstance(expression, str) and expression.startswith('$'):
+        value = _get(document, expression[1:])
+        return None if value is _MISSING else value
+    if isinstance(expression, dict) and len(expression) == 1:
+        operator, arguments = next(iter(expression.items()))
+        values = [_evaluate(argument, document) for argument in arguments]
+        if operator == '$multiply':
+            result = 1
+            for value in values:
+                result *= value or 0
+            return result
+        if operator == '$add':
+            return sum(value or 0 for value in values)
+        raise NotImplementedError(f"Expression operator {operator} is not supported")
+    return expression
+
+def _sort_key(value: Any):
+    # Mongo orders missing and null before everything else
+    return (0, 0) if value is _MISSING or value is None else (1, value)
+
+def _sort(documents: List[Dict[str, Any]], keys: List[tuple]) -> List[Dict[str, Any]]:
+    for field, direction in reversed(keys):
+        documents.sort(key=lambda document: _sort_key(_get(document, field)), reverse=direction < 0)
+    return documents
+
+class _Result:
+    """Attribute bag standing in for pymongo's result classes"""
+
+    def __init__(self, **fields):
+        self.acknowledged = True
+        self.__dict__.update(fields)
+
+class MemoryCursor:
+    """Lazy find()/aggregate() cursor with Motor's chaining, to_list and async iteration"""
+
+    def __init__(self, produce, latency: float = 0.0, projection: Optional[Dict[str, Any]] = None):
+        self._produce = produce
+        self._latency = latency
+        self._projection = projection
+        self._sort: List[tuple] = []
+        self._skip = 0
+        self._limit = 0
+        self._results: Optional[List[Dict[str, Any]]] = None
+
+    def sort(self, key, direction: int = 1) -> 'MemoryCursor':
+        self._sort = list(key) if isinstance(key, list) else [(key, direction)]
+        return self
+
+    def skip(self, count: int) -> 'MemoryCursor':
+        self._skip = count
+        return self
+
+    def limit(self, count: int) -> 'MemoryCursor':
+        self._limit = count
+        return self
+
+    def _evaluate(self) -> List[Dict[str, Any]]:
+        if self._results is None:
+            results = self._produce()
+            if self._sort:
+                results = _sort(results, self._sort)
+            results = results[self._skip:]
+            if self._limit:
+                results = results[:self._limit]
+            # Projected last, so sorting can use fields the projection leaves out
+            self._results = [project(document, self._projection) for document in results]
+        return self._results
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        if self._latency:
+            await asyncio.sleep(self._latency)
+        results = self._evaluate()
+        return list(results if length is None else results[:length])
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in await self.to_list():
+            yield document
+
+class MemoryCollection:
+    """One collection: a list of documents in insertion order"""
+
+    def __init__(self, name: str, database: 'MemoryDatabase'):
+        self.name = name
+        self.database = database
+        self.documents: List[Dict[str, Any]] = []
+
+    async def _round_trip(self):
+        # Simulated network + server time; without it every call completes without yielding
+        if self.database.latency:
+            await asyncio.sleep(self.database.latency)
+
+    def with_options(self, **options) -> 'MemoryCollection':
+        # Write concerns and read preferences have no meaning in memory
+        return self
+
+    def _matching(self, query: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Query values compare against stored values, so they get the same date conversion
+        query = to_bson(query)
+        return [document for document in self.documents if matches(document, query)]
+
+    def _first(self, query: Optional[Dict[str, Any]], sort=None) -> Optional[Dict[str, Any]]:
+        query = to_bson(query)
+        if sort:
+            found = _sort(self._matching(query), list(sort))
+            return found[0] if found else None
+        for document in self.documents:
+            if matches(document, query):
+                return document
+        return None
+
+    def find(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None) -> MemoryCursor:
+        return MemoryCursor(lambda: self._matching(query), self.database.latency, projection)
+
+    async def find_one(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None,
+                       sort=None) -> Optional[Dict[str, Any]]:
+        await self._round_trip()
+        document = self._first(query, sort)
+        return None if document is None else project(document, projection)
+
+    async def count_documents(self, query: Dict[str, Any]) -> int:
+        await self._round_trip()
+        return len(self._matching(query))
+
+    def _insert(self, document: Dict[str, Any]) -> Any:
+        stored = to_bson(document)
+        stored.setdefault('_id', ObjectId())
+        document.setdefault('_id', stored['_id'])
+        self.documents.append(stored)
+        return stored['_id']
+
+    async def insert_one(self, document: Dict[str, Any]):
+        await self._round_trip()
+        return _Result(inserted_id=self._insert(document))
+
+    async def insert_many(self, documents: Iterable[Dict[str, Any]], ordered: bool = True):
+        await self._round_trip()
+        return _Result(inserted_ids=[self._insert(document) for document in documents])
+
+    def _upsert(self, query: Dict[str, Any], update: Any) -> Dict[str, Any]:
+        document = {key: to_bson(value) for key, value in query.items()
+                    if not key.startswith('$') and not (isinstance(value, dict) and any(k.startswith('$') for k in value))}
+        apply_update(document, update, inserting=True)
+        document.setdefault('_id', ObjectId())
+        self.documents.append(document)
+        return document
+
+    def _update(self, query: Dict[str, Any], update: Any, upsert: bool, many: bool):
+        targets = self._matching(query) if many else [d for d in [self._first(query)] if d is not None]
+        for document in targets:
+            apply_update(document, update)
+        if not targets and upsert:
+            upserted = self._upsert(query, update)
+            return _Result(matched_count=0, modified_count=0, upserted_id=upserted['_id'])
+        return _Result(matched_count=len(targets), modified_count=len(targets), upserted_id=None)
+
+    async def update_one(self, query: Dict[str, Any], update: Any, upsert: bool = False):
+        await self._round_trip()
+        return self._update(query, update, upsert, many=False)
+
+    async def update_many(self, query: Dict[str, Any], update: Any, upsert: bool = False):
+        await self._round_trip()
+        return self._update(query, update, upsert, many=True)
+
+    async def find_one_and_update(self, query: Dict[str, Any], update: Any, projection: Optional[Dict[str, Any]] = None,
+                                  upsert: bool = False, return_document: bool = ReturnDocument.BEFORE, sort=None):
+        await self._round_trip()
+        document = self._first(query, sort)
+        if document is None:
+            if not upsert:
+                return None
+            document = self._upsert(query, update)
+            return project(document, projection) if return_document == ReturnDocument.AFTER else None
+        before = to_bson(document) if return_document == ReturnDocument.BEFORE else None
+        apply_update(document, update)
+        return project(before if before is not None else document, projection)
+
+    def _delete(self, query: Dict[str, Any], many: bool) -> int:
+        query = to_bson(query)
+        kept, deleted = [], 0
+        for document in self.documents:
+            if (many or not deleted) and matches(document, query):
+                deleted += 1
+            else:
+                kept.append(document)
+        self.documents = kept
+        return deleted
+
+    async def delete_one(self, query: Dict[str, Any]):
+        await self._round_trip()
+        return _Result(deleted_count=self._delete(query, many=False))
+
+    async def delete_many(self, query: Dict[str, Any]):
+        await self._round_trip()
+        return _Result(deleted_count=self._delete(query, many=True))
+
+    async def bulk_write(self, operations, ordered: bool = True):
+        await self._round_trip()
+        counts = {'inserted_count': 0, 'matched_count': 0, 'modified_count': 0, 'upserted_count': 0, 'deleted_count': 0}
+        for operation in operations:
+            if isinstance(operation, InsertOne):
+                self._insert(operation._doc)
+                counts['inserted_count'] += 1
+            elif isinstance(operation, (UpdateOne, UpdateMany)):
+                result = self._update(operation._filter, operation._doc, bool(operation._upsert),
+                                      many=isinstance(operation, UpdateMany))
+                counts['matched_count'] += result.matched_count
+                counts['modified_count'] += result.modified_count
+                counts['upserted_count'] += result.upserted_id is not None
+            elif isinstance(operation, DeleteOne):
+                counts['deleted_count'] += self._delete(operation._filter, many=False)
+            else:
+                raise NotImplementedError(f"Bulk operation {type(operation).__name__} is not supported")
+        return _Result(**counts)
+
+    def aggregate(self, pipeline: List[Dict[str, Any]]) -> MemoryCursor:
+        return MemoryCursor(lambda: self._aggregate(pipeline), self.database.latency)
+
+    def _aggregate(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        documents = self.documents
+        for stage in pipeline:
+            (name, spec), = stage.items()
+            if name == '$match':
+                spec = to_bson(spec)
+                documents = [document for document in documents if matches(document, spec)]
+            elif name == '$group':
+                documents = _group(documents, spec)
+            elif name == '$sort':
+                documents = _sort(list(documents), list(spec.items()))
+            elif name == '$skip':
+                documents = documents[spec:]
+            elif name == '$limit':
+                documents = documents[:spec]
+            elif name == '$project':
+                documents = [project(document, spec) for document in documents]
+            else:
+                raise NotImplementedError(f"Aggregation stage {name} is not supported")
+        return list(documents)
+
+    async def create_index(self, keys, **options) -> str:
+        return keys if isinstance(keys, str) else '_'.join(f"{key}_{direction}" for key, direction in keys)
+
+    def watch(self, pipeline=None, **options):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+
+def _group(documents: List[Dict[str, Any]], spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    groups: Dict[Any, Dict[str, Any]] = {}
+    for document in documents:
+        key = _evaluate(spec['_id'], document)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {'_id': key}
+        for field, accumulator in spec.items():
+            if field == '_id':
+                continue
+            (operator, expression), = accumulator.items()
+            value = _evaluate(expression, document)
+            if operator == '$sum':
+                group[field] = group.get(field, 0) + (value if isinstance(value, (int, float)) else 0)
+            elif operator == '$avg':
+                total, count = group.get(f'__{field}', (0, 0))
+                group[f'__{field}'] = (total + (value or 0), count + 1)
+            elif operator == '$min':
+                group[field] = value if field not in group else min(group[field], value)
+            elif operator == '$max':
+                group[field] = value if field not in group else max(group[field], value)
+            elif operator == '$first':
+                group.setdefault(field, value)
+            elif operator == '$push':
+                group.setdefault(field, []).append(value)
+            else:
+                raise NotImplementedError(f"Accumulator {operator} is not supported")
+    for group in groups.values():
+        for field in [key for key in group if key.startswith('__')]:
+            total, count = group.pop(field)
+            group[field[2:]] = total / count
+    return list(groups.values())
+
+class MemoryDatabase:
+    """Collections created on first access, by attribute or by name"""
+
+    def __init__(self, name: str, latency: float = 0.0):
+        self.name = name
+        self.latency = latency
+        self._collections: Dict[str, MemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = MemoryCollection(name, self)
+        return collection
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name: str, **options) -> MemoryCollection:
+        return self[name]
+
+    async def list_collection_names(self) -> List[str]:
+        return list(self._collections)
+
+    async def command(self, command, *args, **kwargs) -> Dict[str, Any]:
+        name = command if isinstance(command, str) else next(iter(command))
+        if name == 'ping':
+            return {'ok': 1.0}
+        raise NotImplementedError(f"Command {name} is not supported")
+
+class MemoryMotorClient:
+    """
+    Drop-in for AsyncIOMotorClient(uri, **options).
+
+    MemoryMotorClient.latency_ms (class attribute, default 0) adds a
+    simulated round trip to every operation of clients created afterwards.
+    """
+
+    latency_ms = 0.0
+
+    def __init__(self, uri: str = None, **options):
+        self.uri = uri
+        self.latency = self.latency_ms / 1000
+        self._databases: Dict[str, MemoryDatabase] = {}
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        database = self._databases.get(name)
+        if database is None:
+            database = self._databases[name] = MemoryDatabase(name, self.latency)
+        return database
+
+    def get_database(self, name: str, **options) -> MemoryDatabase:
+        return self[name]
+
+    async def drop_database(self, name: str):
+        # Emptied rather than forgotten: the app keeps references to its collections
+        database = self._databases.get(name if isinstance(name, str) else name.name)
+        if database is not None:
+            for collection in database._collections.values():
+                collection.documents = []
+
+    def close(self):
+        pass
+
+# Export the stand-in
+__all__ = ['MemoryMotorClient', 'MemoryDatabase', 'MemoryCollection', 'MemoryCursor', 'matches', 'apply_update', 'project']
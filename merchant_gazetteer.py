@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+Merchant Gazetteer - Canonical Merchant Names and Aliases
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+"""
+
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Any
+import logging
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_GAZETTEER_PATH = Path(__file__).parent / 'merchant_gazetteer.json'
+
+# Words are runs of letters/digits; inner apostrophes are dropped ("McDonald's" -> "mcdonalds")
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:['’][a-z0-9]+)*")
+_APOSTROPHES = re.compile(r"['’]")
+
+# Trie key marking the end of an alias; tokens are never empty
+_END = ''
+
+def tokenize(text: str) -> List[Tuple[str, int, int]]:
+    """Normalized tokens of text with their character spans"""
+    return [(_APOSTROPHES.sub('', match.group()), match.start(), match.end())
+            for match in _TOKEN_PATTERN.finditer(text.lower())]
+
+def alone_on_line(text: str, start: int, end: int) -> bool:
+    """Whether text[start:end] is the only word on its line, apart from numbers and punctuation"""
+    line_start = text.rfind('\n', 0, start) + 1
+    line_end = text.find('\n', end)
+    rest = text[line_start:start] + text[end:line_end if line_end >= 0 else len(text)]
+    return not any(char.isalpha() for char in rest)
+
+@dataclass(frozen=True)
+class MerchantMatch:
+    merchant_id: str
+    name: str
+    start: int
+    end: int
+    score: float = 1.0
+
+class MerchantGazetteer:
+    """
+    Token trie over canonical merchant names and their aliases.
+
+    Matching walks the trie from each token of the text, so the cost depends
+    on the text length and the longest alias (a handful of tokens), not on
+    how many merchants are loaded.
+
+    Single-word aliases that are also ordinary words ("Target", "Shell",
+    "UPS") are listed as common words. They count only as the first word
+    of the text or as a header line of their own ("TARGET #1234"), where a
+    receipt prints its merchant.
+    """
+
+    def __init__(self, header_tokens: int = 8):
+        """
+        Args:
+            header_tokens: Number of leading words in which a common-word alias may stand on its own line
+        """
+        self._trie: Dict[str, Any] = {}
+        self.merchants: Dict[str, str] = {}
+        self.alias_count = 0
+        self.common_words: set = set()
+        self.header_tokens = header_tokens
+
+    @classmethod
+    def load(cls, path: str = None) -> 'MerchantGazetteer':
+        """Load a gazetteer from a JSON file of {"common_words": [...], "merchants": [{id, name, aliases}]}"""
+        if path is None:
+            path = os.getenv('MERCHANT_GAZETTEER_PATH', str(DEFAULT_GAZETTEER_PATH))
+
+        gazetteer = cls()
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        gazetteer.common_words = {token for word in data.get('common_words', []) for token, _, _ in tokenize(word)}
+        for merchant in data.get('merchants', []):
+            gazetteer.add_merchant(merchant['id'], merchant['name'], merchant.get('aliases', []))
+
+        logger.info(f"Merchant gazetteer loaded: {len(gazetteer.merchants)} merchants, {gazetteer.alias_count} aliases")
+        return gazetteer
+
+    def add_merchant(self, merchant_id: str, name: str, aliases: List[str] = ()):
+        """Register a merchant under its canonical name and every alias"""
+        self.merchants[merchant_id] = name
+        for alias in [name, *aliases]:
+            tokens = [token for token, _, _ in tokenize(alias)]
+            if not tokens:
+                continue
+
+            node = self._trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+
+            if _END in node:
+                if node[_END] != merchant_id:
+                    logger.debug(f"Alias '{alias}' already maps to {node[_END]}, ignored for {merchant_id}")
+                continue
+            node[_END] = merchant_id
+            self.alias_count += 1
+
+    def iter_aliases(self) -> Iterator[Tuple[Tuple[str, ...], str]]:
+        """Every registered alias as (tokens, merchant_id)"""
+        stack = [((), self._trie)]
+        while stack:
+            tokens, node = stack.pop()
+            for token, child in node.items():
+                if token == _END:
+                    yield tokens, child
+                else:
+                    stack.append((tokens + (token,), child))
+
+    def _match_at(self, tokens: List[Tuple[str, int, int]], i: int) -> Optional[Tuple[int, str]]:
+        """Longest alias starting at token i as (token count, merchant_id)"""
+        node = self._trie
+        best = None
+        for j in range(i, len(tokens)):
+            node = node.get(tokens[j][0])
+            if node is None:
+                break
+            if _END in node:
+                best = (j - i + 1, node[_END])
+        return best
+
+    def find_first(self, text: str) -> Optional[MerchantMatch]:
+        """
+        Earliest merchant mention in text, longest at that position.
+
+        The merchant heads a receipt, so a later mention (an item, a footer)
+        never outranks it. Common-word aliases are skipped unless
+        accepts_common_word() allows them.
+        """
+        if not text:
+            return None
+
+        tokens = tokenize(text)
+        for i in range(len(tokens)):
+            match = self._match_at(tokens, i)
+            if match is None:
+                continue
+            length, merchant_id = match
+            if length == 1 and tokens[i][0] in self.common_words and not self.accepts_common_word(text, tokens, i):
+                continue
+            return MerchantMatch(merchant_id, self.merchants[merchant_id], tokens[i][1], tokens[i + length - 1][2])
+        return None
+
+    def accepts_common_word(self, text: str, tokens: List[Tuple[str, int, int]], i: int) -> bool:
+        """Whether token i stands where a common-word merchant name can be trusted"""
+        if i == 0:
+            return True
+        return i < self.header_tokens and alone_on_line(text, tokens[i][1], tokens[i][2])
+
+    def find_all(self, text: str) -> List[MerchantMatch]:
+        """All non-overlapping merchant mentions, leftmost-longest"""
+        tokens = tokenize(text or '')
+        matches = []
+        i = 0
+        while i < len(tokens):
+            match = self._match_at(tokens, i)
+            if match is None:
+                i += 1
+                continue
+            length, merchant_id = match
+            matches.append(MerchantMatch(merchant_id, self.merchants[merchant_id],
+                                         tokens[i][1], tokens[i + length - 1][2]))
+            i += length
+        return matches
+
+    def lookup(self, name: str) -> Optional[MerchantMatch]:
+        """Exact match of a whole merchant name or alias"""
+        tokens = tokenize(name or '')
+        if not tokens:
+            return None
+        match = self._match_at(tokens, 0)
+        if match is None or match[0] != len(tokens):
+            return None
+        return MerchantMatch(match[1], self.merchants[match[1]], tokens[0][1], tokens[-1][2])
+
+_shared_gazetteer: Optional[MerchantGazetteer] = None
+_shared_gazetteer_lock = threading.Lock()
+
+def get_gazetteer() -> MerchantGazetteer:
+    """Process-wide gazetteer loaded from MERCHANT_GAZETTEER_PATH (empty if the file is unavailable)"""
+    global _shared_gazetteer
+    if _shared_gazetteer is None:
+        with _shared_gazetteer_lock:
+            if _shared_gazetteer is None:
+                try:
+                    _shared_gazetteer = MerchantGazetteer.load()
+                except Exception as e:
+                    logger.error(f"Error loading merchant gazetteer: {str(e)}")
+                    _shared_gazetteer = MerchantGazetteer()
+    return _shared_gazetteer
+
+# Export the gazetteer
+__all__ = ['MerchantGazetteer', 'MerchantMatch', 'get_gazetteer', 'tokenize', 'alone_on_line']
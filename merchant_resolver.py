@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+Fuzzy Merchant Resolver for OCR-Garbled Merchant Names
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+"""
+
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from merchant_gazetteer import MerchantGazetteer, MerchantMatch, get_gazetteer, tokenize
+
+# Optional C implementation of edit distance
+try:
+    from rapidfuzz import process
+    from rapidfuzz.distance import Levenshtein
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Characters OCR confuses with letters; folded in both the index and queries
+OCR_CONFUSIONS = str.maketrans('0158|', 'olsbl')
+
+# Header words that are never part of a merchant name
+NON_MERCHANT_WORDS = {
+    'receipt', 'invoice', 'total', 'subtotal', 'amount', 'cash', 'change', 'card', 'credit', 'debit',
+    'payment', 'purchase', 'order', 'store', 'thank', 'thanks', 'welcome', 'customer', 'copy', 'date', 'time'
+}
+
+# Trie key marking the end of an alias; words are never empty
+_END = ''
+
+def fold(word: str) -> str:
+    """Word with OCR digit/letter confusions folded ("mcd0nalds" -> "mcdonalds")"""
+    return word.translate(OCR_CONFUSIONS)
+
+def trigrams(word: str) -> set:
+    padded = f'${word}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def bounded_levenshtein(a: str, b: str, max_distance: int) -> int:
+    """Edit distance, or max_distance + 1 as soon as it is known to exceed max_distance"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if RAPIDFUZZ_AVAILABLE:
+        return Levenshtein.distance(a, b, score_cutoff=max_distance)
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, char_b in enumerate(b, 1):
+            value = min(previous[j - 1] + (char_a != char_b), current[j - 1] + 1, previous[j] + 1)
+            current.append(value)
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1] if previous[-1] <= max_distance else max_distance + 1
+
+class FuzzyMerchantResolver:
+    """
+    Resolves OCR-garbled merchant names to gazetteer merchants.
+
+    Matching works word by word:
+      1. Each header word is corrected to the closest word of the merchant
+         vocabulary. The vocabulary is indexed by character trigrams, each
+         posting list ordered by word length; a query probes only its rarest
+         trigrams within the allowed lengths and keeps the words sharing two
+         of them (a word within the allowed edit distance must), so edit
+         distance runs against a handful of candidates, not every merchant.
+      2. Corrected words are walked through a trie of folded aliases, so
+         multi-word names match as a whole. Two adjacent words whose
+         concatenation is a vocabulary word ("WAL MART") are merged.
+
+    Word corrections, including misses, are kept in a bounded LRU cache;
+    header words repeat heavily across receipts. At 50k merchants a header
+    of repeat words resolves in well under 100 µs, but every uncached word
+    costs a trigram probe: a header of eight unseen words takes a few
+    hundred µs (see test_merchant_resolver.py for both numbers).
+    """
+
+    def __init__(self, gazetteer: MerchantGazetteer, cache_size: int = 16384,
+                 min_length: int = 4, min_score: float = 0.8, header_tokens: int = 8):
+        """
+        Args:
+            gazetteer: Gazetteer whose aliases are indexed
+            cache_size: Maximum number of cached word corrections
+            min_length: Shortest word that is corrected approximately
+            min_score: Minimum similarity (1 - edits / characters) of a fuzzy match
+            header_tokens: Number of leading words scanned by resolve()
+        """
+        self.gazetteer = gazetteer
+        self.cache_size = cache_size
+        self.min_length = min_length
+        self.min_score = min_score
+        self.header_tokens = header_tokens
+
+        self._trie: Dict[str, Any] = {}
+        self._vocabulary: List[str] = []
+        self._vocabulary_set: set = set()
+        # Trigram -> (vocabulary indices ordered by word length, their word lengths)
+        self._postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._gram_counts: Dict[str, int] = {}
+        self._build_index()
+
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _build_index(self):
+        for tokens, merchant_id in self.gazetteer.iter_aliases():
+            node = self._trie
+            for token in tokens:
+                word = fold(token)
+                node = node.setdefault(word, {})
+                if word not in self._vocabulary_set:
+                    self._vocabulary_set.add(word)
+                    self._vocabulary.append(word)
+            node.setdefault(_END, merchant_id)
+
+        postings = defaultdict(list)
+        for index, word in enumerate(self._vocabulary):
+            for gram in trigrams(word):
+                postings[gram].append((len(word), index))
+        for gram, entries in postings.items():
+            entries.sort()
+            self._postings[gram] = ([index for _, index in entries], [length for length, _ in entries])
+            self._gram_counts[gram] = len(entries)
+        logger.info(f"Fuzzy merchant index built: {len(self._vocabulary)} words, {len(self._gram_counts)} trigrams")
+
+    def _max_distance(self, length: int) -> int:
+        return 1 if length <= 8 else 2
+
+    def _search(self, word: str) -> Optional[Tuple[str, int]]:
+        """Closest vocabulary word as (word, edits), uncached"""
+        if word in self._vocabulary_set:
+            return word, 0
+        if len(word) < self.min_length or word.isdigit():
+            return None
+
+        max_distance = self._max_distance(len(word))
+        grams = trigrams(word)
+        known = [gram for gram in grams if gram in self._gram_counts]
+        # A word within max_distance edits keeps all but 3 * max_distance of the
+        # query's trigrams. Trigrams no vocabulary word has use up that allowance;
+        # of the rarest remaining ones, a match must then share `need` of `probes`
+        absent = len(grams) - len(known)
+        if absent > 3 * max_distance or not known:
+            return None
+        probes = min(3 * max_distance + 2 - absent, len(known))
+        need = probes + absent - 3 * max_distance
+        known.sort(key=self._gram_counts.__getitem__)
+
+        shortest, longest = len(word) - max_distance, len(word) + max_distance
+        seen, shared = set(), set()
+        for gram in known[:probes]:
+            indices, lengths = self._postings[gram]
+            bucket = indices[bisect_left(lengths, shortest):bisect_right(lengths, longest)]
+            shared.update(seen.intersection(bucket))
+            seen.update(bucket)
+        candidates = shared if need >= 2 else seen
+        if not candidates:
+            return None
+
+        vocabulary = self._vocabulary
+        if RAPIDFUZZ_AVAILABLE:
+            match = process.extractOne(word, [vocabulary[index] for index in candidates],
+                                       scorer=Levenshtein.distance, score_cutoff=max_distance)
+            if match is None:
+                return None
+            best, distance = match[0], int(match[1])
+        else:
+            best, distance = None, max_distance + 1
+            for index in candidates:
+                candidate_distance = bounded_levenshtein(word, vocabulary[index], distance - 1)
+                if candidate_distance < distance:
+                    best, distance = vocabulary[index], candidate_distance
+            if best is None:
+                return None
+
+        if 1.0 - distance / max(len(word), len(best)) < self.min_score:
+            return None
+        return best, distance
+
+    def correct_word(self, word: str) -> Optional[Tuple[str, int]]:
+        """Cached closest vocabulary word for a folded word"""
+        with self._cache_lock:
+            if word in self._cache:
+                self._cache.move_to_end(word)
+                return self._cache[word]
+
+        result = self._search(word)
+
+        with self._cache_lock:
+            self._cache[word] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _options(self, words: List[str], i: int) -> List[Tuple[str, int, int]]:
+        """Vocabulary readings of the words at position i as (word, next position, edits)"""
+        options = []
+        if i + 1 < len(words) and words[i] + words[i + 1] in self._vocabulary_set:
+            options.append((words[i] + words[i + 1], i + 2, 0))
+        corrected = self.correct_word(words[i])
+        if corrected is not None:
+            options.append((corrected[0], i + 1, corrected[1]))
+        return options
+
+    def _match_at(self, words: List[str], i: int) -> Optional[Tuple[float, int, str, int]]:
+        """Best alias starting at word i as (score, end position, merchant_id, edits)"""
+        best = None
+        stack = [(i, self._trie, 0)]
+        while stack:
+            position, node, edits = stack.pop()
+            if position >= len(words) or words[position] in NON_MERCHANT_WORDS:
+                continue
+            for word, end, word_edits in self._options(words, position):
+                child = node.get(word)
+                if child is None:
+                    continue
+                total_edits = edits + word_edits
+                if _END in child:
+                    length = sum(len(w) for w in words[i:end])
+                    score = 1.0 - total_edits / max(length, 1)
+                    if score >= self.min_score and (best is None or (score, end) > best[:2]):
+                        best = (score, end, child[_END], total_edits)
+                stack.append((end, child, total_edits))
+        return best
+
+    def _resolve_tokens(self, tokens: List[Tuple[str, int, int]], whole: bool, text: str = '') -> Optional[MerchantMatch]:
+        words = [fold(token) for token, _, _ in tokens]
+        best = None
+        best_start = 0
+        for i in (range(1) if whole else range(len(words))):
+            match = self._match_at(words, i)
+            if match is None or (whole and match[1] != len(words)):
+                continue
+            # Common-word aliases need the same header context as in the gazetteer
+            if (not whole and match[1] == i + 1 and self.correct_word(words[i])[0] in self.gazetteer.common_words
+                    and not self.gazetteer.accepts_common_word(text, tokens, i)):
+                continue
+            # Prefer higher similarity, then the longer span
+            if best is None or (match[0], match[1] - i) > (best[0], best[1] - best_start):
+                best, best_start = match, i
+
+        if best is None:
+            return None
+        score, end, merchant_id, _ = best
+        return MerchantMatch(merchant_id, self.gazetteer.merchants[merchant_id],
+                             tokens[best_start][1], tokens[end - 1][2], score)
+
+    def resolve(self, text: str) -> Optional[MerchantMatch]:
+        """Best merchant mention among the leading words of text"""
+        return self._resolve_tokens(tokenize(text or '')[:self.header_tokens], whole=False, text=text or '')
+
+    def resolve_name(self, name: str) -> Optional[MerchantMatch]:
+        """Resolve a candidate merchant name (e.g. a regex capture) as a whole"""
+        tokens = tokenize(name or '')
+        if not tokens:
+            return None
+        return self._resolve_tokens(tokens, whole=True)
+
+    def cache_info(self) -> Dict[str, int]:
+        return {'size': len(self._cache), 'max_size': self.cache_size}
+
+_shared_resolver: Optional[FuzzyMerchantResolver] = None
+_shared_resolver_lock = threading.Lock()
+
+def get_merchant_resolver() -> FuzzyMerchantResolver:
+    """Process-wide resolver over the shared gazetteer"""
+    global _shared_resolver
+    if _shared_resolver is None:
+        with _shared_resolver_lock:
+            if _shared_resolver is None:
+                _shared_resolver = FuzzyMerchantResolver(get_gazetteer())
+    return _shared_resolver
+
+# Export the resolver
+__all__ = ['FuzzyMerchantResolver', 'get_merchant_resolver', 'bounded_levenshtein']
@@ -8,30 +8,78 @@ PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
 """
 
 import json
+import os
+import hashlib
 import pickle
 import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 from datetime import datetime, date
 from typing import Dict, List, Optional, Tuple, Any
 from pathlib import Path
 import logging
 import re
+import threading
+from collections import Counter, OrderedDict
 
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.model_selection import train_test_split, cross_val_score
+from sklearn.model_selection import train_test_split, cross_val_score, GridSearchCV
 from sklearn.metrics import classification_report, accuracy_score, confusion_matrix
 import joblib
+from joblib import Parallel, delayed
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Bump whenever extract_features output changes so cached feature matrices are rebuilt
+FEATURE_EXTRACTOR_VERSION = 1
+
+# Feature matrix layouts: 'sparse' scales only the structured block and keeps TF-IDF
+# sparse (CSR); 'dense' is the legacy layout with one scaler over a dense hstack
+FEATURE_LAYOUT = 'sparse'
+
+# TF-IDF configuration for transaction text
+TFIDF_PARAMS = {
+    'max_features': 100,
+    'stop_words': 'english',
+    'ngram_range': (1, 2),
+    'min_df': 2
+}
+
+# Random Forest configuration (hyperparameter sweeps override individual values)
+RF_PARAMS = {
+    'n_estimators': 100,
+    'max_depth': 15,
+    'min_samples_split': 5,
+    'min_samples_leaf': 2,
+    'random_state': 42,
+    'class_weight': 'balanced'
+}
+
+# Default grid for hyperparameter sweeps
+RF_PARAM_GRID = {
+    'n_estimators': [100, 200],
+    'max_depth': [10, 15, None],
+    'min_samples_leaf': [1, 2]
+}
+
+# Datasets smaller than this are featurized in-process (worker startup dominates)
+PARALLEL_EXTRACTION_MIN_EXAMPLES = 2000
+
 class TransactionFeatureExtractor:
-    """Advanced feature extraction for transaction categorization"""
+    """
+    Advanced feature extraction for transaction categorization
     
-    def __init__(self):
+    All keyword families (merchant categories, category keywords, payment
+    methods, transaction types and pattern keywords) are matched with one
+    precompiled multi-pattern scan per input string, and results are memoized
+    in a bounded LRU keyed by a hash of the text and the other inputs.
+    """
+    
+    def __init__(self, memo_size: int = 4096):
         """Initialize feature extractor with predefined patterns and mappings"""
         
         # Merchant patterns for feature extraction
@@ -48,6 +96,27 @@ class TransactionFeatureExtractor:
             'telecom': ['verizon', 'at&t', 't-mobile', 'sprint', 'comcast']
         }
         
+        # Category-specific keywords
+        self.category_keywords = {
+            'dining': ['restaurant', 'food', 'cafe', 'delivery', 'takeout', 'menu', 'order', 'eat'],
+            'groceries': ['grocery', 'market', 'store', 'supermarket', 'produce', 'organic'],
+            'transportation': ['ride', 'fuel', 'gas', 'parking', 'toll', 'uber', 'lyft', 'taxi'],
+            'entertainment': ['subscription', 'streaming', 'music', 'video', 'game', 'premium'],
+            'utilities': ['bill', 'monthly', 'electric', 'internet', 'phone', 'utility', 'wireless'],
+            'healthcare': ['pharmacy', 'prescription', 'medical', 'doctor', 'health', 'rx'],
+            'travel': ['hotel', 'flight', 'booking', 'reservation', 'airline', 'airport'],
+            'shopping': ['purchase', 'order', 'shopping', 'item', 'product', 'store', 'buy']
+        }
+        
+        # Payment method and transaction type keywords
+        self.payment_methods = ['card', 'cash', 'upi', 'credit', 'debit', 'auto-pay', 'autopay']
+        self.transaction_types = ['purchase', 'payment', 'subscription', 'renewal', 'charge', 'bill']
+        
+        # Transaction pattern keywords
+        self.recurring_keywords = ['monthly', 'annual', 'subscription', 'renewal', 'auto', 'recurring']
+        self.balance_keywords = ['balance', 'bal', 'available']
+        self.promotion_keywords = ['discount', 'sale', 'promo', 'offer']
+        
         # Time-based patterns
         self.time_patterns = {
             'morning_rush': (6, 10),
@@ -68,13 +137,125 @@ class TransactionFeatureExtractor:
         
         # Subscription pricing patterns
         self.subscription_amounts = [9.99, 14.99, 15.99, 19.99, 29.99, 39.99, 49.99, 99.99]
+        
+        # Currency markers matched case-sensitively on the raw text
+        self.currency_features = {
+            currency: f'currency_{currency.lower().replace("$", "dollar").replace("₹", "rupee")}'
+            for currency in ['USD', 'INR', 'EUR', 'GBP', '$', '₹', '€', '£']
+        }
+        
+        self._compile_patterns()
+        
+        self.memo_size = memo_size
+        self._memo: 'OrderedDict[Tuple, Dict[str, Any]]' = OrderedDict()
+        self._memo_lock = threading.Lock()
+    
+    def _compile_patterns(self):
+        """Precompile the keyword automaton and feature regexes"""
+        keywords = set()
+        for family in (self.merchant_categories, self.category_keywords):
+            for family_keywords in family.values():
+                keywords.update(family_keywords)
+        for family_keywords in (self.payment_methods, self.transaction_types, self.recurring_keywords,
+                                self.balance_keywords, self.promotion_keywords):
+            keywords.update(family_keywords)
+        
+        # Zero-width lookahead at every position yields the longest keyword starting
+        # there; shorter keywords starting at the same position are its prefixes and
+        # are credited through the closure, so the scan finds exactly the keywords
+        # for which `keyword in text` holds
+        self._keyword_pattern = re.compile('(?=(' + self._trie_pattern(keywords) + '))')
+        self._keyword_closure = {
+            keyword: frozenset(other for other in keywords if keyword.startswith(other))
+            for keyword in keywords
+        }
+        
+        self._merchant_category_sets = {category: frozenset(kws) for category, kws in self.merchant_categories.items()}
+        self._category_keyword_sets = {category: frozenset(kws) for category, kws in self.category_keywords.items()}
+        self._recurring_set = frozenset(self.recurring_keywords)
+        self._balance_set = frozenset(self.balance_keywords)
+        self._promotion_set = frozenset(self.promotion_keywords)
+        
+        self._time_regex = re.compile(r'(\d{1,2}):(\d{2})')
+        self._digit_regex = re.compile(r'\d')
+        self._reference_regex = re.compile(r'(?:ref|id|confirmation|order).*\d{4,}')
+        self._location_regex = re.compile(r'store|location|#\d+|downtown|highway')
+        self._numeric_regex = re.compile(r'\b\d+\b')
+    
+    @staticmethod
+    def _trie_pattern(keywords) -> str:
+        """
+        Regex alternation factored as a character trie (greedy, so longest match wins)
+        
+        A flat 'a|b|c' alternation retries every keyword at every position; the
+        factored form only follows branches sharing the current prefix.
+        """
+        trie = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = True
+        
+        def build(node) -> str:
+            branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ''
+            body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+            return f'(?:{body})?' if '' in node else body
+        
+        return build(trie)
+    
+    def __getstate__(self):
+        # Locks cannot be pickled (joblib workers); workers start with an empty memo
+        state = self.__dict__.copy()
+        state['_memo'] = OrderedDict()
+        del state['_memo_lock']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._memo_lock = threading.Lock()
+    
+    def _scan_keywords(self, text_lower: str) -> frozenset:
+        """Single pass over the text returning every keyword it contains"""
+        found = set()
+        closure = self._keyword_closure
+        for match in self._keyword_pattern.finditer(text_lower):
+            found |= closure[match.group(1)]
+        return frozenset(found)
     
     def extract_features(self, raw_text: str, amount: Optional[float] = None, 
                         merchant: Optional[str] = None, date_str: Optional[str] = None) -> Dict[str, Any]:
         """Extract comprehensive features for ML prediction"""
         
+        memo_key = (
+            hashlib.blake2b(raw_text.encode('utf-8', 'surrogatepass'), digest_size=16).digest(),
+            amount, merchant, date_str if date_str is None or isinstance(date_str, str) else str(date_str)
+        )
+        with self._memo_lock:
+            cached = self._memo.get(memo_key)
+            if cached is not None:
+                self._memo.move_to_end(memo_key)
+                return dict(cached)
+        
+        features = self._compute_features(raw_text, amount, merchant, date_str)
+        
+        if self.memo_size > 0:
+            with self._memo_lock:
+                self._memo[memo_key] = features
+                if len(self._memo) > self.memo_size:
+                    self._memo.popitem(last=False)
+        
+        return dict(features)
+    
+    def _compute_features(self, raw_text: str, amount: Optional[float],
+                          merchant: Optional[str], date_str: Optional[str]) -> Dict[str, Any]:
+        """Uncached feature extraction"""
+        
         features = {}
         text_lower = raw_text.lower()
+        text_keywords = self._scan_keywords(text_lower)
         
         # 1. Amount-based features
         if amount is not None:
@@ -92,10 +273,10 @@ class TransactionFeatureExtractor:
         features.update(self._extract_time_features(text_lower, date_str))
         
         # 4. Text-based features
-        features.update(self._extract_text_features(text_lower))
+        features.update(self._extract_text_features(text_keywords))
         
         # 5. Transaction pattern features
-        features.update(self._extract_transaction_patterns(text_lower, amount))
+        features.update(self._extract_transaction_patterns(text_lower, text_keywords))
         
         # 6. Contextual features
         features.update(self._extract_contextual_features(raw_text))
@@ -152,11 +333,12 @@ class TransactionFeatureExtractor:
     def _extract_merchant_features(self, merchant_lower: str) -> Dict[str, Any]:
         """Extract merchant-based features"""
         features = {}
+        merchant_keywords = self._scan_keywords(merchant_lower)
         
         # Merchant category detection
         merchant_category_found = False
-        for category, keywords in self.merchant_categories.items():
-            if any(keyword in merchant_lower for keyword in keywords):
+        for category, keywords in self._merchant_category_sets.items():
+            if not merchant_keywords.isdisjoint(keywords):
                 features[f'merchant_category_{category}'] = 1
                 features['merchant_category'] = category
                 merchant_category_found = True
@@ -168,7 +350,7 @@ class TransactionFeatureExtractor:
         
         # Merchant name length and characteristics
         features['merchant_name_length'] = len(merchant_lower)
-        features['merchant_has_numbers'] = 1 if re.search(r'\d', merchant_lower) else 0
+        features['merchant_has_numbers'] = 1 if self._digit_regex.search(merchant_lower) else 0
         features['merchant_word_count'] = len(merchant_lower.split())
         
         return features
@@ -195,7 +377,7 @@ class TransactionFeatureExtractor:
             features[f'time_pattern_{pattern}'] = 0
         
         # Extract time from text
-        time_match = re.search(r'(\d{1,2}):(\d{2})', text_lower)
+        time_match = self._time_regex.search(text_lower)
         if time_match:
             hour = int(time_match.group(1))
             
@@ -235,59 +417,44 @@ class TransactionFeatureExtractor:
         
         return features
     
-    def _extract_text_features(self, text_lower: str) -> Dict[str, Any]:
-        """Extract text-based features using keywords and patterns"""
+    def _extract_text_features(self, text_keywords: frozenset) -> Dict[str, Any]:
+        """Extract text-based features from the keywords found in the text"""
         features = {}
         
-        # Category-specific keywords
-        category_keywords = {
-            'dining': ['restaurant', 'food', 'cafe', 'delivery', 'takeout', 'menu', 'order', 'eat'],
-            'groceries': ['grocery', 'market', 'store', 'supermarket', 'produce', 'organic'],
-            'transportation': ['ride', 'fuel', 'gas', 'parking', 'toll', 'uber', 'lyft', 'taxi'],
-            'entertainment': ['subscription', 'streaming', 'music', 'video', 'game', 'premium'],
-            'utilities': ['bill', 'monthly', 'electric', 'internet', 'phone', 'utility', 'wireless'],
-            'healthcare': ['pharmacy', 'prescription', 'medical', 'doctor', 'health', 'rx'],
-            'travel': ['hotel', 'flight', 'booking', 'reservation', 'airline', 'airport'],
-            'shopping': ['purchase', 'order', 'shopping', 'item', 'product', 'store', 'buy']
-        }
-        
         # Count keyword matches for each category
-        for category, keywords in category_keywords.items():
-            count = sum(1 for keyword in keywords if keyword in text_lower)
+        for category, keywords in self._category_keyword_sets.items():
+            count = len(keywords & text_keywords)
             features[f'text_keywords_{category}'] = count
             features[f'has_{category}_keywords'] = 1 if count > 0 else 0
         
         # Payment method features
-        payment_methods = ['card', 'cash', 'upi', 'credit', 'debit', 'auto-pay', 'autopay']
-        for method in payment_methods:
-            features[f'payment_method_{method}'] = 1 if method in text_lower else 0
+        for method in self.payment_methods:
+            features[f'payment_method_{method}'] = 1 if method in text_keywords else 0
         
         # Transaction type features
-        transaction_types = ['purchase', 'payment', 'subscription', 'renewal', 'charge', 'bill']
-        for tx_type in transaction_types:
-            features[f'transaction_type_{tx_type}'] = 1 if tx_type in text_lower else 0
+        for tx_type in self.transaction_types:
+            features[f'transaction_type_{tx_type}'] = 1 if tx_type in text_keywords else 0
         
         return features
     
-    def _extract_transaction_patterns(self, text_lower: str, amount: Optional[float]) -> Dict[str, Any]:
+    def _extract_transaction_patterns(self, text_lower: str, text_keywords: frozenset) -> Dict[str, Any]:
         """Extract transaction pattern features"""
         features = {}
         
         # Recurring transaction indicators
-        recurring_keywords = ['monthly', 'annual', 'subscription', 'renewal', 'auto', 'recurring']
-        features['has_recurring_pattern'] = 1 if any(keyword in text_lower for keyword in recurring_keywords) else 0
+        features['has_recurring_pattern'] = 0 if self._recurring_set.isdisjoint(text_keywords) else 1
         
         # Reference number patterns
-        features['has_reference_number'] = 1 if re.search(r'(?:ref|id|confirmation|order).*\d{4,}', text_lower) else 0
+        features['has_reference_number'] = 1 if self._reference_regex.search(text_lower) else 0
         
         # Balance/account information
-        features['has_balance_info'] = 1 if any(keyword in text_lower for keyword in ['balance', 'bal', 'available']) else 0
+        features['has_balance_info'] = 0 if self._balance_set.isdisjoint(text_keywords) else 1
         
         # Location indicators
-        features['has_location_info'] = 1 if re.search(r'store|location|#\d+|downtown|highway', text_lower) else 0
+        features['has_location_info'] = 1 if self._location_regex.search(text_lower) else 0
         
         # Promotional/discount features
-        features['has_promotion'] = 1 if any(keyword in text_lower for keyword in ['discount', 'sale', 'promo', 'offer']) else 0
+        features['has_promotion'] = 0 if self._promotion_set.isdisjoint(text_keywords) else 1
         
         return features
     
@@ -301,16 +468,27 @@ class TransactionFeatureExtractor:
         features['sentence_count'] = len([s for s in raw_text.split('.') if s.strip()])
         
         # Currency features
-        currencies = ['USD', 'INR', 'EUR', 'GBP', '$', '₹', '€', '£']
-        for currency in currencies:
-            features[f'currency_{currency.lower().replace("$", "dollar").replace("₹", "rupee")}'] = 1 if currency in raw_text else 0
+        for currency, feature_name in self.currency_features.items():
+            features[feature_name] = 1 if currency in raw_text else 0
         
         # Number of numeric values (excluding amounts)
-        numeric_matches = re.findall(r'\b\d+\b', raw_text)
-        features['numeric_value_count'] = len(numeric_matches)
+        features['numeric_value_count'] = len(self._numeric_regex.findall(raw_text))
         
         return features
 
+def _extract_feature_chunk(feature_extractor: TransactionFeatureExtractor,
+                           examples: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Extract structured features for a chunk of training examples (runs in joblib workers)"""
+    return [
+        feature_extractor.extract_features(
+            raw_text=example['raw_text'],
+            amount=example.get('true_amount'),
+            merchant=example.get('key_merchant'),
+            date_str=example.get('true_date')
+        )
+        for example in examples
+    ]
+
 class MLCategoryPredictor:
     """Complete ML-based category prediction system"""
     
@@ -318,7 +496,6 @@ class MLCategoryPredictor:
         """Initialize ML category predictor"""
         # Use environment variable or default path relative to app root
         if model_path is None:
-            import os
             model_path = os.getenv('ML_MODEL_PATH', 'models/category_predictor.pkl')
         
         self.model_path = Path(model_path)
@@ -332,41 +509,87 @@ class MLCategoryPredictor:
         self.feature_names = None
         self.is_trained = False
         
+        # Online correction model published by the feedback learner as a single
+        # (model, blend_weight, version) tuple so it can be swapped atomically
+        self.online_state = (None, 0.0, 0)
+        self._layout_cache = None
+        
+        # Version assigned by the model registry (0 for an unregistered model)
+        self.registry_version = 0
+        self.feature_layout = FEATURE_LAYOUT
+        
+        # Training parallelism and feature matrix cache
+        self.n_jobs = int(os.getenv('ML_TRAINING_JOBS', '-1'))
+        self.feature_cache_dir = Path(os.getenv('ML_FEATURE_CACHE_DIR', 'models/feature_cache'))
+        
         # Try to load existing model
         self.load_model()
     
-    def prepare_training_data(self, dataset_path: str = None) -> Tuple[np.ndarray, np.ndarray]:
-        """Prepare training data from synthetic dataset"""
+    def _feature_cache_path(self, dataset_bytes: bytes) -> Path:
+        """Cache location keyed by dataset content, extractor version and TF-IDF configuration"""
+        key = hashlib.sha256()
+        key.update(dataset_bytes)
+        key.update(f"extractor={FEATURE_EXTRACTOR_VERSION};layout={FEATURE_LAYOUT};"
+                   f"tfidf={sorted(TFIDF_PARAMS.items())}".encode())
+        return self.feature_cache_dir / f"features_{key.hexdigest()[:32]}.joblib"
+    
+    def _extract_training_features(self, dataset: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Extract structured features, fanning out across cores for large datasets"""
+        if len(dataset) < PARALLEL_EXTRACTION_MIN_EXAMPLES or self.n_jobs == 1:
+            return _extract_feature_chunk(self.feature_extractor, dataset)
+        
+        n_workers = joblib.effective_n_jobs(self.n_jobs)
+        chunk_size = -(-len(dataset) // (n_workers * 4))
+        chunks = [dataset[i:i + chunk_size] for i in range(0, len(dataset), chunk_size)]
+        
+        logger.info(f"Extracting features for {len(dataset)} examples on {n_workers} workers")
+        results = Parallel(n_jobs=self.n_jobs)(
+            delayed(_extract_feature_chunk)(self.feature_extractor, chunk) for chunk in chunks
+        )
+        return [features for chunk_features in results for features in chunk_features]
+    
+    def prepare_training_data(self, dataset_path: str = None, use_cache: bool = True) -> Tuple[sp.csr_matrix, np.ndarray]:
+        """
+        Prepare training data from synthetic dataset
+        
+        Returns a CSR matrix: the scaled structured block followed by the sparse
+        TF-IDF block, so memory grows with non-zeros rather than vocabulary size.
+        The feature matrix and the fitted TF-IDF vectorizer, scaler and
+        label encoder are cached on disk keyed by dataset hash and extractor
+        version, so retraining and hyperparameter sweeps skip featurization.
+        """
         
         # Use environment variable or default path
         if dataset_path is None:
-            import os
             dataset_path = os.getenv('TRAINING_DATASET_PATH', 'synthetic_training_dataset.json')
         
         logger.info(f"Loading training dataset from {dataset_path}")
         
-        with open(dataset_path, 'r') as f:
-            dataset = json.load(f)
+        with open(dataset_path, 'rb') as f:
+            dataset_bytes = f.read()
+        
+        cache_path = self._feature_cache_path(dataset_bytes)
+        if use_cache and cache_path.exists():
+            try:
+                cached = joblib.load(cache_path)
+                self.tfidf_vectorizer = cached['tfidf_vectorizer']
+                self.scaler = cached['scaler']
+                self.label_encoder = cached['label_encoder']
+                self.feature_names = cached['feature_names']
+                self.feature_layout = FEATURE_LAYOUT
+                logger.info(f"Loaded cached feature matrix {cached['X'].shape} from {cache_path}")
+                return cached['X'], cached['y']
+            except Exception as e:
+                logger.warning(f"Could not load feature cache, rebuilding: {str(e)}")
+        
+        dataset = json.loads(dataset_bytes)
         
         logger.info(f"Loaded {len(dataset)} training examples")
         
         # Extract features and labels
-        X_features = []
-        X_text = []
-        y = []
-        
-        for example in dataset:
-            # Extract structured features
-            features = self.feature_extractor.extract_features(
-                raw_text=example['raw_text'],
-                amount=example.get('true_amount'),
-                merchant=example.get('key_merchant'),
-                date_str=example.get('true_date')
-            )
-            
-            X_features.append(features)
-            X_text.append(example['raw_text'])
-            y.append(example['true_category'])
+        X_features = self._extract_training_features(dataset)
+        X_text = [example['raw_text'] for example in dataset]
+        y = [example['true_category'] for example in dataset]
         
         # Convert structured features to DataFrame
         features_df = pd.DataFrame(X_features)
@@ -377,31 +600,27 @@ class MLCategoryPredictor:
         # Convert categorical columns to strings and then one-hot encode
         for col in categorical_features:
             if col in features_df.columns:
-                features_df[col] = features_df[col].astype(str)
+                features_df[col] = features_df[col].fillna('nan').astype(str)
+            else:
+                features_df[col] = 'nan'
         
-        # One-hot encode categorical features
+        # One-hot encode categorical features (raw flags missing from a row count as 0)
         features_encoded = pd.get_dummies(features_df, columns=categorical_features, prefix=categorical_features)
+        structured = features_encoded.astype(float).fillna(0).values
         
         # Initialize TF-IDF vectorizer for text features
         if self.tfidf_vectorizer is None:
-            self.tfidf_vectorizer = TfidfVectorizer(
-                max_features=100,
-                stop_words='english',
-                ngram_range=(1, 2),
-                min_df=2
-            )
+            self.tfidf_vectorizer = TfidfVectorizer(**TFIDF_PARAMS)
         
-        # Fit and transform text data
-        X_text_tfidf = self.tfidf_vectorizer.fit_transform(X_text).toarray()
+        # Fit and transform text data (kept sparse)
+        X_text_tfidf = self.tfidf_vectorizer.fit_transform(X_text)
         
         # Get feature names for text features
         tfidf_feature_names = [f'tfidf_{name}' for name in self.tfidf_vectorizer.get_feature_names_out()]
         
-        # Combine structured and text features
-        X_combined = np.hstack([features_encoded.values, X_text_tfidf])
-        
         # Store feature names
         self.feature_names = list(features_encoded.columns) + tfidf_feature_names
+        self.feature_layout = FEATURE_LAYOUT
         
         # Encode labels
         if self.label_encoder is None:
@@ -409,25 +628,151 @@ class MLCategoryPredictor:
         
         y_encoded = self.label_encoder.fit_transform(y)
         
-        # Scale features
+        # Scale only the structured block; TF-IDF values are already normalized
         if self.scaler is None:
             self.scaler = StandardScaler()
         
-        X_scaled = self.scaler.fit_transform(X_combined)
+        structured_scaled = self.scaler.fit_transform(structured)
+        
+        # Combine structured and text features without densifying the TF-IDF block
+        X_scaled = sp.hstack([sp.csr_matrix(structured_scaled), X_text_tfidf], format='csr')
         
         logger.info(f"Prepared training data: {X_scaled.shape[0]} samples, {X_scaled.shape[1]} features")
         logger.info(f"Categories: {list(self.label_encoder.classes_)}")
         
+        if use_cache:
+            self._save_feature_cache(cache_path, X_scaled, y_encoded)
+        
         return X_scaled, y_encoded
     
-    def train_model(self, dataset_path: str = None) -> Dict[str, Any]:
-        """Train Random Forest model on synthetic dataset"""
+    def _save_feature_cache(self, cache_path: Path, X: sp.csr_matrix, y: np.ndarray):
+        """Write the prepared matrix and fitted transformers to the feature cache"""
+        try:
+            cache_path.parent.mkdir(exist_ok=True, parents=True)
+            tmp_path = cache_path.with_suffix('.tmp')
+            joblib.dump({
+                'X': X,
+                'y': y,
+                'tfidf_vectorizer': self.tfidf_vectorizer,
+                'scaler': self.scaler,
+                'label_encoder': self.label_encoder,
+                'feature_names': self.feature_names
+            }, tmp_path)
+            os.replace(tmp_path, cache_path)
+            logger.info(f"Feature matrix cached to {cache_path}")
+        except Exception as e:
+            logger.warning(f"Could not write feature cache: {str(e)}")
+    
+    def build_feature_matrix(self, examples: List[Dict[str, Any]]) -> Any:
+        """
+        Encode and scale examples with the fitted feature pipeline.
+        
+        Each example carries raw_text, amount, merchant and date_str; an optional
+        precomputed 'features' dict skips structured feature extraction.
+        Returns CSR for sparse-layout models and a dense array for legacy models.
+        """
+        rows = []
+        for example in examples:
+            features = example.get('features')
+            if features is None:
+                features = self.feature_extractor.extract_features(
+                    example['raw_text'], example.get('amount'), example.get('merchant'), example.get('date_str')
+                )
+            rows.append(features)
+        
+        # Convert to DataFrame and split raw and one-hot encoded categorical columns
+        features_df = pd.DataFrame(rows)
+        categorical_features = ['amount_bucket', 'merchant_category', 'time_pattern']
+        categorical_df = features_df.reindex(columns=categorical_features).fillna('nan').astype(str)
+        
+        sources = {
+            'raw': features_df.drop(columns=categorical_features, errors='ignore'),
+            'dummy': pd.get_dummies(categorical_df, prefix=categorical_features)
+        }
+        
+        # Assemble columns in training order, filling columns unseen in these examples
+        layout = self._structured_layout()
+        structured = np.zeros((len(rows), len(layout)))
+        for column_index, (source, name) in enumerate(layout):
+            if name in sources[source].columns:
+                structured[:, column_index] = sources[source][name].astype(float).fillna(0).values
+        
+        # Get TF-IDF features
+        text_tfidf = self.tfidf_vectorizer.transform([example['raw_text'] for example in examples])
+        
+        # Combine and scale features
+        if self.feature_layout == 'sparse':
+            return sp.hstack([sp.csr_matrix(self.scaler.transform(structured)), text_tfidf], format='csr')
+        
+        combined_features = np.hstack([structured, text_tfidf.toarray()])
+        return self.scaler.transform(combined_features)
+    
+    def _structured_layout(self) -> List[Tuple[str, str]]:
+        """
+        Map each trained structured column to its source ('raw' or 'dummy').
+        
+        One-hot columns from get_dummies can share a name with a raw binary
+        feature (e.g. amount_bucket_small); in the trained layout the raw
+        column always comes first.
+        """
+        if self._layout_cache is not None and self._layout_cache[0] is self.feature_names:
+            return self._layout_cache[1]
+        
+        extractor = self.feature_extractor
+        raw_flag_names = (
+            {f'amount_bucket_{bucket}' for _, _, bucket in extractor.amount_buckets} |
+            {f'merchant_category_{category}' for category in extractor.merchant_categories} |
+            {f'time_pattern_{pattern}' for pattern in extractor.time_patterns}
+        )
+        categorical_prefixes = ('amount_bucket_', 'merchant_category_', 'time_pattern_')
+        
+        structured_names = [name for name in self.feature_names if not name.startswith('tfidf_')]
+        name_counts = Counter(structured_names)
+        
+        layout = []
+        seen = set()
+        for name in structured_names:
+            if name_counts[name] > 1:
+                source = 'dummy' if name in seen else 'raw'
+            elif name in raw_flag_names or not name.startswith(categorical_prefixes):
+                source = 'raw'
+            else:
+                source = 'dummy'
+            seen.add(name)
+            layout.append((source, name))
+        
+        self._layout_cache = (self.feature_names, layout)
+        return layout
+    
+    def _predict_probabilities(self, X_scaled: Any) -> np.ndarray:
+        """Class probabilities indexed by encoded label, blending in the online model if published"""
+        n_classes = len(self.label_encoder.classes_)
+        
+        probabilities = np.zeros((X_scaled.shape[0], n_classes))
+        probabilities[:, self.rf_model.classes_] = self.rf_model.predict_proba(X_scaled)
+        
+        online_model, online_weight, _ = self.online_state
+        if online_model is not None and online_weight > 0:
+            online_probabilities = np.zeros_like(probabilities)
+            online_probabilities[:, online_model.classes_] = online_model.predict_proba(X_scaled)
+            probabilities = (1 - online_weight) * probabilities + online_weight * online_probabilities
+        
+        return probabilities
+    
+    def train_model(self, dataset_path: str = None, save: bool = True,
+                    rf_params: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Train Random Forest model on synthetic dataset
+        
+        Trees are fitted in parallel across n_jobs cores, and cross-validation
+        reuses the same parallel forest for every fold. rf_params overrides
+        individual RF_PARAMS values (e.g. the best result of a sweep).
+        """
         
         logger.info("Starting ML model training...")
         
         # Use environment variable or default path
         if dataset_path is None:
-            import os
             dataset_path = os.getenv('TRAINING_DATASET_PATH', 'synthetic_training_dataset.json')
         
         # Prepare training data
@@ -439,14 +784,7 @@ class MLCategoryPredictor:
         )
         
         # Initialize Random Forest with optimized parameters
-        self.rf_model = RandomForestClassifier(
-            n_estimators=100,
-            max_depth=15,
-            min_samples_split=5,
-            min_samples_leaf=2,
-            random_state=42,
-            class_weight='balanced'
-        )
+        self.rf_model = RandomForestClassifier(**{**RF_PARAMS, **(rf_params or {}), 'n_jobs': self.n_jobs})
         
         # Train model
         logger.info("Training Random Forest model...")
@@ -480,20 +818,62 @@ class MLCategoryPredictor:
                 y_test, y_pred, labels=unique_classes, target_names=target_names, output_dict=True, zero_division=0
             ),
             'top_features': top_features,
-            'n_samples': len(X),
+            'n_samples': X.shape[0],
             'n_features': len(self.feature_names),
-            'categories': list(self.label_encoder.classes_)
+            'categories': list(self.label_encoder.classes_),
+            'rf_params': {key: value for key, value in self.rf_model.get_params().items() if key in RF_PARAMS}
         }
         
         logger.info(f"Training completed! Test accuracy: {test_accuracy:.3f}")
         logger.info(f"Cross-validation accuracy: {cv_scores.mean():.3f} (+/- {cv_scores.std() * 2:.3f})")
         
         # Save model
-        self.save_model()
         self.is_trained = True
+        if save:
+            self.save_model()
         
         return training_results
     
+    def sweep_hyperparameters(self, param_grid: Dict[str, List[Any]] = None,
+                              dataset_path: str = None, cv: int = 3) -> Dict[str, Any]:
+        """
+        Grid-search Random Forest hyperparameters on the cached feature matrix
+        
+        Candidate/fold fits are distributed across n_jobs cores; each forest is
+        fitted single-threaded to avoid oversubscribing the workers.
+        """
+        param_grid = param_grid or RF_PARAM_GRID
+        X, y = self.prepare_training_data(dataset_path)
+        
+        cv_folds = min(cv, int(np.bincount(y).min()))
+        if cv_folds < 2:
+            raise ValueError("Not enough examples per category for cross-validated sweep")
+        
+        search = GridSearchCV(
+            RandomForestClassifier(**{**RF_PARAMS, 'n_jobs': 1}),
+            param_grid,
+            cv=cv_folds,
+            scoring='accuracy',
+            n_jobs=self.n_jobs
+        )
+        
+        logger.info(f"Sweeping {param_grid} over {X.shape[0]} samples with {cv_folds}-fold CV")
+        search.fit(X, y)
+        
+        ranking = sorted(
+            zip(search.cv_results_['params'], search.cv_results_['mean_test_score'], search.cv_results_['std_test_score']),
+            key=lambda item: item[1], reverse=True
+        )
+        
+        return {
+            'best_params': search.best_params_,
+            'best_cv_accuracy': float(search.best_score_),
+            'results': [
+                {'params': params, 'mean_accuracy': float(mean), 'std_accuracy': float(std)}
+                for params, mean, std in ranking
+            ]
+        }
+    
     def predict_category(self, raw_text: str, amount: Optional[float] = None, 
                         merchant: Optional[str] = None, date_str: Optional[str] = None) -> Dict[str, Any]:
         """Predict category using trained ML model"""
@@ -505,73 +885,18 @@ class MLCategoryPredictor:
         try:
             logger.info(f"Starting ML prediction for: {raw_text[:50]}...")
             
-            # Extract features
-            features = self.feature_extractor.extract_features(raw_text, amount, merchant, date_str)
-            logger.info(f"Extracted {len(features)} raw features")
-            
-            # Convert to DataFrame to maintain feature order
-            features_df = pd.DataFrame([features])
-            
-            # Handle categorical features with same encoding as training
-            categorical_features = ['amount_bucket', 'merchant_category', 'time_pattern']
-            
-            # Only encode columns that exist in the dataframe
-            existing_categorical_features = [col for col in categorical_features if col in features_df.columns]
-            
-            for col in existing_categorical_features:
-                features_df[col] = features_df[col].astype(str)
-            
-            # One-hot encode categorical features (need to match training columns)
-            if existing_categorical_features:
-                features_encoded = pd.get_dummies(features_df, columns=existing_categorical_features, prefix=existing_categorical_features)
-            else:
-                features_encoded = features_df.copy()
-                
-            logger.info(f"After encoding: {features_encoded.shape[1]} structured features")
-            
-            # Add missing columns that were present during training
-            missing_columns = []
-            structured_feature_names = [col for col in self.feature_names if not col.startswith('tfidf_')]
-            
-            for feature_name in structured_feature_names:
-                if feature_name not in features_encoded.columns:
-                    features_encoded[feature_name] = 0
-                    missing_columns.append(feature_name)
-            
-            logger.info(f"Added {len(missing_columns)} missing columns")
-            
-            # Reorder columns to match training order (avoiding duplicates)
-            # Remove duplicates from feature names and ensure no duplicate columns
-            structured_feature_names = list(dict.fromkeys(structured_feature_names))  # Remove duplicates
-            
-            # Only reindex with columns that exist and are not duplicated
-            available_columns = [col for col in structured_feature_names if col in features_encoded.columns]
-            features_encoded = features_encoded[available_columns]
-            
-            # Add missing columns with default values
-            for col in structured_feature_names:
-                if col not in features_encoded.columns:
-                    features_encoded[col] = 0
-                    
-            # Ensure final column order matches training
-            features_encoded = features_encoded.reindex(columns=structured_feature_names, fill_value=0)
-            logger.info(f"Reordered to {len(structured_feature_names)} structured features")
-            
-            # Get TF-IDF features
-            text_tfidf = self.tfidf_vectorizer.transform([raw_text]).toarray()
-            logger.info(f"TF-IDF features: {text_tfidf.shape[1]}")
-            
-            # Combine features
-            combined_features = np.hstack([features_encoded.values, text_tfidf])
-            logger.info(f"Combined features shape: {combined_features.shape}")
-            
-            # Scale features
-            X_scaled = self.scaler.transform(combined_features)
+            # Extract, encode and scale features
+            X_scaled = self.build_feature_matrix([{
+                'raw_text': raw_text,
+                'amount': amount,
+                'merchant': merchant,
+                'date_str': date_str
+            }])
             logger.info(f"Scaled features shape: {X_scaled.shape}")
             
             # Predict
-            prediction = self.rf_model.predict(X_scaled)[0]
-            probabilities = self.rf_model.predict_proba(X_scaled)[0]
+            probabilities = self._predict_probabilities(X_scaled)[0]
+            prediction = int(np.argmax(probabilities))
             
             # Get category name and confidence
             predicted_category = self.label_encoder.inverse_transform([prediction])[0]
@@ -590,7 +915,9 @@ class MLCategoryPredictor:
                 'confidence': confidence,
                 'method': 'ml_random_forest',
                 'top_predictions': top_predictions[:3],
-                'feature_count': len(self.feature_names)
+                'feature_count': len(self.feature_names),
+                'base_version': self.registry_version,
+                'model_version': self.online_state[2]
             }
             
             logger.info(f"ML prediction successful: {predicted_category} (confidence: {confidence:.3f})")
@@ -628,6 +955,7 @@ class MLCategoryPredictor:
                 'scaler': self.scaler,
                 'label_encoder': self.label_encoder,
                 'feature_names': self.feature_names,
+                'feature_layout': self.feature_layout,
                 'is_trained': self.is_trained
             }
             
@@ -648,6 +976,7 @@ class MLCategoryPredictor:
                 self.scaler = model_data.get('scaler')
                 self.label_encoder = model_data.get('label_encoder')
                 self.feature_names = model_data.get('feature_names')
+                self.feature_layout = model_data.get('feature_layout', 'dense')  # models saved before sparse layout
                 self.is_trained = model_data.get('is_trained', False)
                 
                 # Check if all components are loaded
@@ -691,6 +1020,27 @@ def train_model_cli():
     print(f"\n💾 Model saved to: {predictor.model_path}")
     return results
 
+def sweep_hyperparameters_cli():
+    """CLI function to run a hyperparameter sweep and train with the best parameters"""
+    print("🔍 Sweeping Random Forest hyperparameters...")
+    
+    predictor = MLCategoryPredictor()
+    sweep = predictor.sweep_hyperparameters()
+    
+    print("\n📊 Sweep Results:")
+    for result in sweep['results'][:5]:
+        print(f"  {result['mean_accuracy']:.3f} (+/- {result['std_accuracy'] * 2:.3f})  {result['params']}")
+    
+    print(f"\n✅ Best parameters: {sweep['best_params']}")
+    results = predictor.train_model(rf_params=sweep['best_params'])
+    print(f"✅ Test Accuracy: {results['test_accuracy']:.3f}")
+    return sweep
+
 if __name__ == "__main__":
-    # Train the model
-    train_model_cli()
\ No newline at end of file
+    import sys
+    
+    if '--sweep' in sys.argv:
+        sweep_hyperparameters_cli()
+    else:
+        # Train the model
+        train_model_cli()
\ No newline at end of file
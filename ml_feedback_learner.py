@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+Online Learning from User Category Corrections
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+"""
+
+import copy
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Any
+import logging
+
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+import joblib
+
+from ml_category_predictor import MLCategoryPredictor
+from ml_model_registry import PredictorHandle
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+class CategoryFeedbackLearner:
+    """
+    Records user category corrections and folds them into an incrementally
+    trained correction model that is blended with the Random Forest.
+
+    Corrections are appended to a JSONL log together with their extracted
+    features. Each update consumes only the corrections recorded since the
+    previous update (partial_fit), so retraining cost is proportional to new
+    data. Every update publishes a new model version by replacing the
+    predictor's online_state tuple in a single assignment, so inference never
+    blocks and never observes a half-updated model.
+
+    The online model lives in the feature space of the serving base model;
+    when a new base version is promoted it is started over.
+    """
+
+    def __init__(self, handle: PredictorHandle, feedback_dir: str = None,
+                 min_batch_size: int = 5, max_blend_weight: float = 0.6, blend_ramp: int = 50):
+        """
+        Args:
+            handle: Shared handle to the serving predictor
+            feedback_dir: Directory for the correction log and model versions
+            min_batch_size: Minimum number of new corrections before an update runs
+            max_blend_weight: Upper bound on the online model's share of the prediction
+            blend_ramp: Number of learned corrections at which the blend weight reaches half its maximum
+        """
+        if feedback_dir is None:
+            feedback_dir = os.getenv('ML_FEEDBACK_DIR', 'models/feedback')
+
+        self.handle = handle
+        self.feedback_dir = Path(feedback_dir)
+        self.feedback_dir.mkdir(exist_ok=True, parents=True)
+
+        self.corrections_path = self.feedback_dir / 'corrections.jsonl'
+        self.state_path = self.feedback_dir / 'learner_state.json'
+
+        self.min_batch_size = min_batch_size
+        self.max_blend_weight = max_blend_weight
+        self.blend_ramp = blend_ramp
+
+        # Serializes appends to the log and model updates; inference never takes it
+        self._lock = threading.Lock()
+        self._state = self._load_state()
+
+        self._restore_latest_version()
+
+    def _load_state(self) -> Dict[str, Any]:
+        """Load the log cursor and version counters"""
+        if self.state_path.exists():
+            try:
+                with open(self.state_path, 'r') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.warning(f"Could not load feedback learner state: {str(e)}")
+
+        return {
+            'consumed_lines': 0,
+            'consumed_offset': 0,
+            'recorded_lines': 0,
+            'version': 0,
+            'base_version': 0,
+            'samples_learned': 0,
+            'skipped_unknown_category': 0
+        }
+
+    def _save_state(self):
+        """Persist learner state atomically"""
+        tmp_path = self.state_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self._state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    @property
+    def predictor(self) -> MLCategoryPredictor:
+        return self.handle.predictor
+
+    def _version_path(self, version: int) -> Path:
+        return self.feedback_dir / f'online_model_v{version}.pkl'
+
+    def _restore_latest_version(self):
+        """Re-publish the most recent online model after a restart"""
+        version = self._state.get('version', 0)
+        if version <= 0 or not self.predictor.is_trained:
+            return
+        if self._state.get('base_version', 0) != self.predictor.registry_version:
+            logger.info("Serving base model changed since last online update, starting over")
+            return
+
+        version_path = self._version_path(version)
+        if not version_path.exists():
+            logger.warning(f"Online model version {version} missing at {version_path}")
+            return
+
+        try:
+            online_model = joblib.load(version_path)
+            self.predictor.online_state = (online_model, self._blend_weight(), version)
+            logger.info(f"Restored online correction model v{version}")
+        except Exception as e:
+            logger.error(f"Error restoring online model: {str(e)}")
+
+    def _blend_weight(self) -> float:
+        """Blend weight grows with the number of corrections learned so far"""
+        learned = self._state.get('samples_learned', 0)
+        return self.max_blend_weight * learned / (learned + self.blend_ramp)
+
+    def record_correction(self, raw_text: str, corrected_category: str,
+                          amount: Optional[float] = None, merchant: Optional[str] = None,
+                          date_str: Optional[str] = None, predicted_category: Optional[str] = None,
+                          receipt_id: Optional[str] = None) -> Dict[str, Any]:
+        """Append a user correction and its extracted features to the feedback log"""
+        features = self.predictor.feature_extractor.extract_features(raw_text, amount, merchant, date_str)
+
+        record = {
+            'receipt_id': receipt_id,
+            'raw_text': raw_text,
+            'amount': amount,
+            'merchant': merchant,
+            'date_str': date_str,
+            'predicted_category': predicted_category,
+            'corrected_category': corrected_category,
+            'features': {key: value.item() if isinstance(value, np.generic) else value
+                         for key, value in features.items()},
+            'recorded_at': datetime.now(timezone.utc).isoformat()
+        }
+
+        with self._lock:
+            with open(self.corrections_path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+            self._state['recorded_lines'] = self._state.get('recorded_lines', 0) + 1
+            self._save_state()
+
+        logger.info(f"Recorded category correction: {predicted_category} -> {corrected_category}")
+        return record
+
+    def pending_count(self) -> int:
+        """Number of corrections not yet learned"""
+        return self._state.get('recorded_lines', 0) - self._state.get('consumed_lines', 0)
+
+    def _read_pending(self) -> Tuple[List[Dict[str, Any]], int]:
+        """Read corrections appended after the consumed byte offset"""
+        offset = self._state.get('consumed_offset', 0)
+        if not self.corrections_path.exists():
+            return [], offset
+
+        pending = []
+        with open(self.corrections_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if line.strip():
+                    pending.append(json.loads(line))
+            return pending, f.tell()
+
+    def update_model(self, force: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Fold pending corrections into a new online model version.
+
+        Runs partial_fit on a copy of the current online model with the new
+        corrections only, saves the version to disk and publishes it.
+        Returns update statistics, or None when nothing was done.
+        """
+        # Pin the serving predictor for the whole update
+        predictor = self.predictor
+        if not predictor.is_trained:
+            return None
+
+        with self._lock:
+            pending, end_offset = self._read_pending()
+            if not pending or (len(pending) < self.min_batch_size and not force):
+                return None
+
+            if self._state.get('base_version', 0) != predictor.registry_version:
+                self._state['base_version'] = predictor.registry_version
+                self._state['samples_learned'] = 0
+
+            known_categories = set(predictor.label_encoder.classes_)
+            trainable = [record for record in pending if record['corrected_category'] in known_categories]
+            skipped = len(pending) - len(trainable)
+
+            current_model, _, _ = predictor.online_state
+            current_version = self._state.get('version', 0)
+
+            if trainable:
+                X = predictor.build_feature_matrix(trainable)
+                y = predictor.label_encoder.transform([record['corrected_category'] for record in trainable])
+
+                if current_model is None:
+                    online_model = SGDClassifier(loss='log_loss', alpha=1e-4, random_state=42)
+                else:
+                    online_model = copy.deepcopy(current_model)
+
+                online_model.partial_fit(X, y, classes=np.arange(len(predictor.label_encoder.classes_)))
+            else:
+                online_model = current_model
+
+            new_version = current_version + 1
+            self._state['consumed_lines'] = self._state.get('consumed_lines', 0) + len(pending)
+            self._state['consumed_offset'] = end_offset
+            self._state['samples_learned'] = self._state.get('samples_learned', 0) + len(trainable)
+            self._state['skipped_unknown_category'] = self._state.get('skipped_unknown_category', 0) + skipped
+
+            if online_model is not None:
+                joblib.dump(online_model, self._version_path(new_version))
+                self._state['version'] = new_version
+
+                # Publish: single reference assignment, readers see old or new tuple
+                predictor.online_state = (online_model, self._blend_weight(), new_version)
+
+            self._save_state()
+
+        stats = {
+            'version': self._state['version'],
+            'learned': len(trainable),
+            'skipped_unknown_category': skipped,
+            'blend_weight': round(self._blend_weight(), 3),
+            'samples_learned': self._state['samples_learned']
+        }
+        logger.info(f"Online model updated: {stats}")
+        return stats
+
+    def get_status(self) -> Dict[str, Any]:
+        """Current learner status for health and status endpoints"""
+        _, blend_weight, version = self.predictor.online_state
+        return {
+            'base_version': self.predictor.registry_version,
+            'published_version': version,
+            'blend_weight': round(blend_weight, 3),
+            'pending_corrections': self.pending_count(),
+            'samples_learned': self._state.get('samples_learned', 0),
+            'skipped_unknown_category': self._state.get('skipped_unknown_category', 0)
+        }
+
+# Export the learner
+__all__ = ['CategoryFeedbackLearner']
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+ML Model Registry, Shared Predictor Handle and Shadow Evaluation
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+import logging
+
+import numpy as np
+
+from ml_category_predictor import MLCategoryPredictor
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+def serialize_training_results(results: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert numpy types in training results to standard Python types for JSON serialization"""
+    serializable_results = {}
+    for key, value in results.items():
+        if key == 'categories':
+            serializable_results[key] = [str(cat) for cat in value]
+        elif key == 'top_features':
+            serializable_results[key] = [[str(feat), float(imp)] for feat, imp in value]
+        elif isinstance(value, np.generic):
+            serializable_results[key] = value.item()
+        elif isinstance(value, (float, int, str, bool, list, dict)) or value is None:
+            serializable_results[key] = value
+        else:
+            serializable_results[key] = str(value)
+    return serializable_results
+
+class ModelRegistry:
+    """
+    Versioned on-disk store of trained category models.
+
+    Layout:
+        registry_dir/v{N}/model.pkl       trained predictor components
+        registry_dir/v{N}/metadata.json   training results and lifecycle status
+        registry_dir/current.json         pointer to the promoted version
+
+    Versions are staged in a temporary directory and renamed into place, and
+    the pointer is replaced with os.replace, so readers never see partial files.
+    """
+
+    def __init__(self, registry_dir: str = None):
+        if registry_dir is None:
+            registry_dir = os.getenv('ML_REGISTRY_DIR', 'models/registry')
+
+        self.registry_dir = Path(registry_dir)
+        self.registry_dir.mkdir(exist_ok=True, parents=True)
+        self.pointer_path = self.registry_dir / 'current.json'
+        self._lock = threading.Lock()
+
+    def _version_dir(self, version: int) -> Path:
+        return self.registry_dir / f'v{version}'
+
+    def list_versions(self) -> List[int]:
+        """All registered versions in ascending order"""
+        versions = []
+        for path in self.registry_dir.glob('v*'):
+            if path.is_dir() and path.name[1:].isdigit():
+                versions.append(int(path.name[1:]))
+        return sorted(versions)
+
+    def current_version(self) -> Optional[int]:
+        """Version the pointer currently promotes, if any"""
+        if not self.pointer_path.exists():
+            return None
+        try:
+            with open(self.pointer_path, 'r') as f:
+                return json.load(f).get('version')
+        except Exception as e:
+            logger.warning(f"Could not read registry pointer: {str(e)}")
+            return None
+
+    def get_metadata(self, version: int) -> Optional[Dict[str, Any]]:
+        """Metadata recorded for a version"""
+        metadata_path = self._version_dir(version) / 'metadata.json'
+        if not metadata_path.exists():
+            return None
+        with open(metadata_path, 'r') as f:
+            return json.load(f)
+
+    def _write_metadata(self, version_dir: Path, metadata: Dict[str, Any]):
+        tmp_path = version_dir / 'metadata.json.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(tmp_path, version_dir / 'metadata.json')
+
+    def update_status(self, version: int, status: str, **extra: Any):
+        """Record a lifecycle transition (registered, shadow, promoted, retired, rejected)"""
+        metadata = self.get_metadata(version) or {'version': version}
+        metadata['status'] = status
+        metadata[f'{status}_at'] = datetime.now(timezone.utc).isoformat()
+        metadata.update(extra)
+        self._write_metadata(self._version_dir(version), metadata)
+
+    def register(self, predictor: MLCategoryPredictor, training_results: Dict[str, Any] = None) -> int:
+        """Store a trained predictor as a new immutable version"""
+        with self._lock:
+            versions = self.list_versions()
+            version = (versions[-1] + 1) if versions else 1
+
+            staging_dir = self.registry_dir / f'.staging-v{version}'
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            staging_dir.mkdir(parents=True)
+
+            original_path = predictor.model_path
+            predictor.model_path = staging_dir / 'model.pkl'
+            try:
+                predictor.save_model()
+            finally:
+                predictor.model_path = original_path
+
+            self._write_metadata(staging_dir, {
+                'version': version,
+                'status': 'registered',
+                'registered_at': datetime.now(timezone.utc).isoformat(),
+                'training_results': serialize_training_results(training_results or {})
+            })
+
+            os.rename(staging_dir, self._version_dir(version))
+
+        predictor.registry_version = version
+        logger.info(f"Registered model version v{version}")
+        return version
+
+    def load(self, version: int) -> MLCategoryPredictor:
+        """Load a registered version into a fresh predictor instance"""
+        model_path = self._version_dir(version) / 'model.pkl'
+        if not model_path.exists():
+            raise FileNotFoundError(f"Model version v{version} not found in registry")
+
+        predictor = MLCategoryPredictor(model_path=str(model_path))
+        if not predictor.is_trained:
+            raise ValueError(f"Model version v{version} could not be loaded")
+
+        predictor.registry_version = version
+        return predictor
+
+    def promote(self, version: int):
+        """Atomically point the registry at a version"""
+        with self._lock:
+            previous = self.current_version()
+            tmp_path = self.pointer_path.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': version, 'promoted_at': datetime.now(timezone.utc).isoformat()}, f)
+            os.replace(tmp_path, self.pointer_path)
+
+        self.update_status(version, 'promoted')
+        if previous is not None and previous != version:
+            self.update_status(previous, 'retired')
+        logger.info(f"Promoted model version v{version} (previous: {previous})")
+
+class ShadowEvaluator:
+    """
+    Scores a candidate model on live traffic next to the serving model.
+
+    Candidate predictions run on a single background worker so shadow scoring
+    never adds latency to the request path. Accuracy is measured only on
+    labelled observations: corrected ones, against the corrected category,
+    and ones left uncorrected for acceptance_window seconds, against the
+    serving model's category. Fresh uncorrected observations are not yet
+    evidence for either model and count only toward the agreement rate.
+    """
+
+    def __init__(self, candidate: MLCategoryPredictor, version: int, max_tracked: int = 5000,
+                 acceptance_window: float = None):
+        if acceptance_window is None:
+            acceptance_window = float(os.getenv('ML_ACCEPTANCE_WINDOW', '3600'))
+        self.candidate = candidate
+        self.version = version
+        self.max_tracked = max_tracked
+        self.acceptance_window = acceptance_window
+        self.started_at = datetime.now(timezone.utc).isoformat()
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ml-shadow')
+        self._lock = threading.Lock()
+        self._observations: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._primary_latencies: List[float] = []
+        self._candidate_latencies: List[float] = []
+        self._candidate_errors = 0
+
+    def observe(self, example: Dict[str, Any], primary_result: Dict[str, Any], primary_latency: float):
+        """Queue a shadow prediction for a request the serving model just answered"""
+        self._executor.submit(self._score, example, primary_result, primary_latency)
+
+    def _score(self, example: Dict[str, Any], primary_result: Dict[str, Any], primary_latency: float):
+        start_time = time.perf_counter()
+        try:
+            candidate_result = self.candidate.predict_category(
+                raw_text=example['raw_text'],
+                amount=example.get('amount'),
+                merchant=example.get('merchant'),
+                date_str=example.get('date_str')
+            )
+        except Exception as e:
+            logger.error(f"Shadow prediction error: {str(e)}")
+            with self._lock:
+                self._candidate_errors += 1
+            return
+        candidate_latency = time.perf_counter() - start_time
+
+        with self._lock:
+            self._primary_latencies.append(primary_latency)
+            self._candidate_latencies.append(candidate_latency)
+            self._observations[example['raw_text']] = {
+                'primary': str(primary_result.get('category')),
+                'candidate': str(candidate_result.get('category')),
+                'corrected': None,
+                'observed_at': time.time()
+            }
+            while len(self._observations) > self.max_tracked:
+                self._observations.popitem(last=False)
+            if len(self._primary_latencies) > self.max_tracked:
+                del self._primary_latencies[0]
+                del self._candidate_latencies[0]
+
+    def record_outcome(self, raw_text: str, corrected_category: str):
+        """Attach a user correction to a tracked observation"""
+        with self._lock:
+            observation = self._observations.get(raw_text)
+            if observation is not None:
+                observation['corrected'] = corrected_category
+
+    @staticmethod
+    def _percentile(values: List[float], percentile: float) -> Optional[float]:
+        if not values:
+            return None
+        return round(float(np.percentile(values, percentile)) * 1000, 3)
+
+    def report(self, min_samples: int = 200, accuracy_tolerance: float = 0.0,
+               latency_budget: float = 1.5, min_accepted_share: float = 0.5) -> Dict[str, Any]:
+        """
+        Compare accuracy and latency and decide whether the candidate is ready to promote.
+
+        Corrections are by definition cases the serving model got wrong, so
+        promotion also waits until confirmed acceptances make up at least
+        min_accepted_share of the labelled observations.
+        """
+        with self._lock:
+            observations = list(self._observations.values())
+            primary_latencies = list(self._primary_latencies)
+            candidate_latencies = list(self._candidate_latencies)
+            candidate_errors = self._candidate_errors
+
+        samples = len(observations)
+        accepted_before = time.time() - self.acceptance_window
+        primary_correct = candidate_correct = agreements = corrections = accepted = 0
+        for observation in observations:
+            agreements += observation['primary'] == observation['candidate']
+            if observation['corrected'] is not None:
+                label = observation['corrected']
+                corrections += 1
+            elif observation['observed_at'] <= accepted_before:
+                label = observation['primary']
+                accepted += 1
+            else:
+                continue
+            primary_correct += observation['primary'] == label
+            candidate_correct += observation['candidate'] == label
+
+        labelled = corrections + accepted
+        primary_accuracy = primary_correct / labelled if labelled else None
+        candidate_accuracy = candidate_correct / labelled if labelled else None
+        primary_p95 = self._percentile(primary_latencies, 95)
+        candidate_p95 = self._percentile(candidate_latencies, 95)
+
+        ready = (
+            labelled >= min_samples and
+            accepted >= min_accepted_share * labelled and
+            candidate_errors == 0 and
+            candidate_accuracy >= primary_accuracy - accuracy_tolerance and
+            candidate_p95 <= primary_p95 * latency_budget
+        )
+
+        return {
+            'candidate_version': self.version,
+            'started_at': self.started_at,
+            'samples': samples,
+            'labelled': labelled,
+            'corrections': corrections,
+            'accepted': accepted,
+            'agreement_rate': agreements / samples if samples else None,
+            'primary_accuracy': primary_accuracy,
+            'candidate_accuracy': candidate_accuracy,
+            'primary_latency_ms': {'p50': self._percentile(primary_latencies, 50), 'p95': primary_p95},
+            'candidate_latency_ms': {'p50': self._percentile(candidate_latencies, 50), 'p95': candidate_p95},
+            'candidate_errors': candidate_errors,
+            'ready_to_promote': ready
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+class PredictorHandle:
+    """
+    Single shared reference to the serving predictor.
+
+    Training never mutates the serving instance: a new version is built on
+    the side and published by replacing the reference, so in-flight
+    predictions finish on the model they started with.
+    """
+
+    def __init__(self, predictor: MLCategoryPredictor, registry: ModelRegistry):
+        self._predictor = predictor
+        self.registry = registry
+        self.shadow: Optional[ShadowEvaluator] = None
+        self._swap_lock = threading.Lock()
+
+    @property
+    def predictor(self) -> MLCategoryPredictor:
+        return self._predictor
+
+    def swap(self, new_predictor: MLCategoryPredictor) -> MLCategoryPredictor:
+        """Replace the serving predictor and return the previous one"""
+        with self._swap_lock:
+            previous = self._predictor
+            self._predictor = new_predictor
+        logger.info(f"Serving predictor swapped to v{getattr(new_predictor, 'registry_version', 0)}")
+        return previous
+
+    def predict_category(self, raw_text: str, amount: Optional[float] = None,
+                         merchant: Optional[str] = None, date_str: Optional[str] = None) -> Dict[str, Any]:
+        """Predict with the serving model and mirror the request to the shadow candidate"""
+        predictor = self._predictor
+        start_time = time.perf_counter()
+        result = predictor.predict_category(raw_text=raw_text, amount=amount, merchant=merchant, date_str=date_str)
+        latency = time.perf_counter() - start_time
+
+        shadow = self.shadow
+        if shadow is not None:
+            shadow.observe(
+                {'raw_text': raw_text, 'amount': amount, 'merchant': merchant, 'date_str': date_str},
+                result, latency
+            )
+        return result
+
+    def record_outcome(self, raw_text: str, corrected_category: str):
+        """Forward a user correction to the shadow evaluation"""
+        shadow = self.shadow
+        if shadow is not None:
+            shadow.record_outcome(raw_text, corrected_category)
+
+    def start_shadow(self, version: int) -> ShadowEvaluator:
+        """Begin scoring a registered version on live traffic"""
+        candidate = self.registry.load(version)
+        previous = self.shadow
+        self.shadow = ShadowEvaluator(candidate, version)
+        if previous is not None:
+            previous.close()
+            if previous.version != version:
+                self.registry.update_status(previous.version, 'rejected', reason='superseded')
+        self.registry.update_status(version, 'shadow')
+        logger.info(f"Shadow evaluation started for v{version}")
+        return self.shadow
+
+    def stop_shadow(self, reason: str = 'cancelled') -> Optional[Dict[str, Any]]:
+        """End shadow evaluation without promoting"""
+        shadow = self.shadow
+        if shadow is None:
+            return None
+        self.shadow = None
+        shadow.close()
+        report = shadow.report()
+        self.registry.update_status(shadow.version, 'rejected', reason=reason, shadow_report=report)
+        return report
+
+    def promote(self, version: int) -> MLCategoryPredictor:
+        """Make a registered version the serving model"""
+        shadow = self.shadow
+        if shadow is not None and shadow.version == version:
+            new_predictor = shadow.candidate
+            self.shadow = None
+            shadow.close()
+            self.registry.update_status(version, 'shadow', shadow_report=shadow.report())
+        else:
+            new_predictor = self.registry.load(version)
+
+        self.registry.promote(version)
+        self.swap(new_predictor)
+        return new_predictor
+
+_shared_handle: Optional[PredictorHandle] = None
+_shared_handle_lock = threading.Lock()
+
+def get_predictor_handle() -> PredictorHandle:
+    """
+    Process-wide predictor handle shared by the training API and every
+    TransactionProcessor. Serves the registry's promoted version, falling
+    back to the standalone model at ML_MODEL_PATH.
+    """
+    global _shared_handle
+    if _shared_handle is not None:
+        return _shared_handle
+
+    with _shared_handle_lock:
+        if _shared_handle is None:
+            registry = ModelRegistry()
+            predictor = None
+
+            current = registry.current_version()
+            if current is not None:
+                try:
+                    predictor = registry.load(current)
+                    logger.info(f"Serving registry model version v{current}")
+                except Exception as e:
+                    logger.error(f"Error loading registry version v{current}: {str(e)}")
+
+            if predictor is None:
+                predictor = MLCategoryPredictor()
+                predictor.registry_version = 0
+
+            _shared_handle = PredictorHandle(predictor, registry)
+
+    return _shared_handle
+
+# Export the registry components
+__all__ = ['ModelRegistry', 'ShadowEvaluator', 'PredictorHandle', 'get_predictor_handle']
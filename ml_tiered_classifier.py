@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+"""
+LUMINA - AI-POWERED RECEIPT MANAGEMENT SYSTEM
+Tiered Category Classifier with Distilled Fast Paths
+
+Copyright (c) 2024 Jaideep Singh Rajpurohit. All rights reserved.
+PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, deque, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Any
+import logging
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import normalize
+import joblib
+
+from ml_category_predictor import MLCategoryPredictor
+from ml_model_registry import PredictorHandle, get_predictor_handle
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Tiers in escalation order; anything the fast tiers do not answer goes to the forest
+FAST_TIERS = ('merchant_lookup', 'linear')
+DEFAULT_THRESHOLDS = {'merchant_lookup': 0.6, 'linear': 0.75}
+
+# Threshold that no confidence reaches: the tier always escalates
+DISABLED_THRESHOLD = 1.01
+
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+def normalize_merchant(merchant: Optional[str]) -> str:
+    """Lowercase merchant name with punctuation collapsed to single spaces"""
+    if not merchant:
+        return ''
+    return ' '.join(_TOKEN_PATTERN.findall(merchant.lower()))
+
+def linear_tokens(text: str) -> List[str]:
+    """Unigrams and bigrams used by the linear tier (module level so it pickles)"""
+    words = _TOKEN_PATTERN.findall(text.lower())
+    return words + [f'{a} {b}' for a, b in zip(words, words[1:])]
+
+class MerchantLookupTier:
+    """
+    Merchant name -> category table.
+
+    Confidence is the smoothed purity of the merchant's labels, so a merchant
+    seen once never outranks one seen consistently many times. Merchants whose
+    majority label the forest itself does not reproduce are left out.
+    """
+
+    def __init__(self, smoothing: float = 0.5):
+        self.smoothing = smoothing
+        self.table: Dict[str, Tuple[str, float]] = {}
+
+    def fit(self, merchants: List[Optional[str]], categories: List[str],
+            teacher_categories: List[str]) -> 'MerchantLookupTier':
+        counts: Dict[str, Counter] = defaultdict(Counter)
+        teacher_counts: Dict[str, Counter] = defaultdict(Counter)
+        for merchant, category, teacher_category in zip(merchants, categories, teacher_categories):
+            key = normalize_merchant(merchant)
+            if key:
+                counts[key][category] += 1
+                teacher_counts[key][teacher_category] += 1
+
+        self.table = {}
+        for key, category_counts in counts.items():
+            category, top = category_counts.most_common(1)[0]
+            if teacher_counts[key].most_common(1)[0][0] != category:
+                continue
+            self.table[key] = (category, top / (sum(category_counts.values()) + self.smoothing))
+        return self
+
+    def predict(self, merchant: Optional[str]) -> Optional[Tuple[str, float]]:
+        return self.table.get(normalize_merchant(merchant))
+
+class LinearTier:
+    """
+    Compact multinomial logistic regression over binary unigram/bigram features.
+
+    Only the vocabulary and coefficient matrix are used at inference: the
+    score is a sum of coefficient columns for the tokens present, which
+    avoids the vectorizer and estimator call overhead entirely.
+    """
+
+    def __init__(self, C: float = 100.0):
+        self.C = C
+        self.vocabulary: Dict[str, int] = {}
+        self.coef: Optional[np.ndarray] = None
+        self.intercept: Optional[np.ndarray] = None
+        self.classes: List[str] = []
+
+    @staticmethod
+    def _document(raw_text: str, merchant: Optional[str]) -> str:
+        return f"{raw_text} {merchant or ''}"
+
+    def fit(self, documents: List[Tuple[str, Optional[str]]], labels: List[str],
+            sample_weight: Optional[np.ndarray] = None) -> 'LinearTier':
+        vectorizer = CountVectorizer(analyzer=linear_tokens, binary=True)
+        X = normalize(vectorizer.fit_transform([self._document(text, merchant) for text, merchant in documents]))
+
+        model = LogisticRegression(C=self.C, max_iter=1000)
+        model.fit(X, labels, sample_weight=sample_weight)
+
+        self.vocabulary = {token: int(index) for token, index in vectorizer.vocabulary_.items()}
+        self.classes = [str(label) for label in model.classes_]
+        if len(self.classes) == 2:
+            # Binary models store one row for the positive class
+            self.coef = np.vstack([-model.coef_[0], model.coef_[0]]) / 2
+            self.intercept = np.array([-model.intercept_[0], model.intercept_[0]]) / 2
+        else:
+            self.coef = model.coef_
+            self.intercept = model.intercept_
+        return self
+
+    def predict(self, raw_text: str, merchant: Optional[str]) -> Optional[Tuple[str, float]]:
+        if self.coef is None:
+            return None
+        indices = sorted({self.vocabulary[token] for token in linear_tokens(self._document(raw_text, merchant))
+                          if token in self.vocabulary})
+        if not indices:
+            return None
+
+        scores = self.coef[:, indices].sum(axis=1) / np.sqrt(len(indices)) + self.intercept
+        scores = np.exp(scores - scores.max())
+        probabilities = scores / scores.sum()
+        best = int(np.argmax(probabilities))
+        return self.classes[best], float(probabilities[best])
+
+class TieredCategoryClassifier:
+    """
+    Answers easy receipts from cheap tiers and escalates the rest to the forest.
+
+    Tiers, in order:
+        merchant_lookup  exact merchant table built from training labels
+        linear           logistic regression distilled from the forest's predictions
+        forest           the serving MLCategoryPredictor (via the shared handle)
+
+    A fast tier answers only when its confidence reaches the tier's gate
+    threshold. Thresholds start at DEFAULT_THRESHOLDS and are re-tuned from
+    logged outcomes: every decision is remembered with each fast tier's
+    candidate answer, a user correction supplies the true category, and a
+    decision left uncorrected for acceptance_window seconds counts as accepted.
+    Tuning waits until accepted outcomes are a representative share of the
+    log, since corrections arrive at once and acceptances only later.
+
+    Fast tiers are built per serving base version and cached on disk, so a
+    newly promoted model gets its own distillation. They know nothing of the
+    online correction model, so a merchant the user has corrected under the
+    serving base version always goes to the forest, where the correction
+    model is blended in.
+    """
+
+    def __init__(self, handle: PredictorHandle, fast_path_dir: str = None,
+                 target_precision: float = 0.95, min_tuning_samples: int = 50, max_tracked: int = 5000,
+                 acceptance_window: float = None, min_accepted_share: float = 0.5):
+        """
+        Args:
+            handle: Shared handle to the serving predictor
+            fast_path_dir: Directory for distilled tiers, thresholds and the outcome log
+            target_precision: Precision a fast tier must keep on logged outcomes
+            min_tuning_samples: Minimum outcomes per tier before its threshold is re-tuned
+            max_tracked: Decisions remembered while waiting for a possible correction
+            acceptance_window: Seconds without a correction after which a decision counts as accepted
+            min_accepted_share: Share of a tier's outcomes that must be acceptances before it is re-tuned
+        """
+        if fast_path_dir is None:
+            fast_path_dir = os.getenv('ML_FAST_PATH_DIR', 'models/fast_path')
+        if acceptance_window is None:
+            acceptance_window = float(os.getenv('ML_ACCEPTANCE_WINDOW', '3600'))
+
+        self.handle = handle
+        self.fast_path_dir = Path(fast_path_dir)
+        self.fast_path_dir.mkdir(exist_ok=True, parents=True)
+        self.thresholds_path = self.fast_path_dir / 'thresholds.json'
+        self.outcomes_path = self.fast_path_dir / 'outcomes.jsonl'
+        self.corrected_merchants_path = self.fast_path_dir / 'corrected_merchants.json'
+
+        self.target_precision = target_precision
+        self.min_tuning_samples = min_tuning_samples
+        self.max_tracked = max_tracked
+        self.acceptance_window = acceptance_window
+        self.min_accepted_share = min_accepted_share
+
+        self.thresholds = self._load_thresholds()
+        self.tier_counts = Counter()
+        # Normalized merchant -> base version it was corrected under; replaced in a single assignment
+        self._corrected_merchants: Dict[str, int] = self._load_corrected_merchants()
+
+        # (base_version, merchant_tier, linear_tier), replaced in a single assignment
+        self._tiers: Optional[Tuple[int, MerchantLookupTier, LinearTier]] = None
+        self._build_lock = threading.Lock()
+        self._building_version: Optional[int] = None
+
+        # Decisions awaiting an outcome, keyed by raw text; the lock also guards tier_counts
+        self._tracked: OrderedDict = OrderedDict()
+        self._tracked_lock = threading.Lock()
+
+    def _load_thresholds(self) -> Dict[str, float]:
+        thresholds = dict(DEFAULT_THRESHOLDS)
+        if self.thresholds_path.exists():
+            try:
+                with open(self.thresholds_path, 'r') as f:
+                    thresholds.update(json.load(f))
+            except Exception as e:
+                logger.warning(f"Could not load fast path thresholds: {str(e)}")
+        return thresholds
+
+    def _load_corrected_merchants(self) -> Dict[str, int]:
+        if self.corrected_merchants_path.exists():
+            try:
+                with open(self.corrected_merchants_path, 'r') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.warning(f"Could not load corrected merchants: {str(e)}")
+        return {}
+
+    def _save_thresholds(self, thresholds: Dict[str, float]):
+        tmp_path = self.thresholds_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(thresholds, f, indent=2)
+        os.replace(tmp_path, self.thresholds_path)
+
+    def _tiers_path(self, version: int) -> Path:
+        return self.fast_path_dir / f'fast_path_v{version}.pkl'
+
+    def build_fast_path(self, predictor: MLCategoryPredictor, dataset_path: str = None) -> Dict[str, Any]:
+        """
+        Build both fast tiers for a trained predictor and save them to disk.
+
+        The merchant table uses the dataset labels the forest agrees with; the
+        linear tier is fit to the forest's own predictions weighted by its
+        confidence, so it mimics the forest wherever it is confident enough.
+        """
+        if dataset_path is None:
+            dataset_path = os.getenv('TRAINING_DATASET_PATH', 'synthetic_training_dataset.json')
+
+        with open(dataset_path, 'r') as f:
+            dataset = json.load(f)
+
+        examples = [{
+            'raw_text': example['raw_text'],
+            'amount': example.get('true_amount'),
+            'merchant': example.get('key_merchant'),
+            'date_str': example.get('true_date')
+        } for example in dataset]
+
+        probabilities = predictor._predict_probabilities(predictor.build_feature_matrix(examples))
+        teacher_labels = predictor.label_encoder.inverse_transform(np.argmax(probabilities, axis=1))
+
+        teacher_labels = [str(label) for label in teacher_labels]
+        merchant_tier = MerchantLookupTier().fit(
+            [example['merchant'] for example in examples],
+            [example['true_category'] for example in dataset],
+            teacher_labels
+        )
+        linear_tier = LinearTier().fit(
+            [(example['raw_text'], example['merchant']) for example in examples],
+            teacher_labels,
+            sample_weight=probabilities.max(axis=1)
+        )
+
+        joblib.dump({'merchant_tier': merchant_tier, 'linear_tier': linear_tier}, self._tiers_path(predictor.registry_version))
+
+        stats = {
+            'base_version': predictor.registry_version,
+            'merchants': len(merchant_tier.table),
+            'vocabulary_size': len(linear_tier.vocabulary),
+            'distilled_examples': len(examples)
+        }
+        logger.info(f"Fast path built: {stats}")
+        return stats
+
+    def _load_tiers(self, predictor: MLCategoryPredictor):
+        """Load (or build) the fast tiers for the serving base version"""
+        version = predictor.registry_version
+        try:
+            tiers_path = self._tiers_path(version)
+            if not tiers_path.exists():
+                self.build_fast_path(predictor)
+            tiers = joblib.load(tiers_path)
+            self._tiers = (version, tiers['merchant_tier'], tiers['linear_tier'])
+            logger.info(f"Fast path tiers ready for base model v{version}")
+        except Exception as e:
+            logger.error(f"Error preparing fast path tiers: {str(e)}")
+        finally:
+            with self._build_lock:
+                self._building_version = None
+
+    def _serving_tiers(self, predictor: MLCategoryPredictor) -> Optional[Tuple[int, MerchantLookupTier, LinearTier]]:
+        """Fast tiers matching the serving version; starts a background build when missing"""
+        tiers = self._tiers
+        if tiers is not None and tiers[0] == predictor.registry_version:
+            return tiers
+        if not predictor.is_trained:
+            return None
+
+        with self._build_lock:
+            if self._building_version is None:
+                self._building_version = predictor.registry_version
+                threading.Thread(target=self._load_tiers, args=(predictor,), daemon=True).start()
+        return None
+
+    def predict_category(self, raw_text: str, amount: Optional[float] = None,
+                         merchant: Optional[str] = None, date_str: Optional[str] = None) -> Dict[str, Any]:
+        """Predict with the cheapest tier that is confident enough; the result carries its 'tier'"""
+        predictor = self.handle.predictor
+        thresholds = self.thresholds
+        candidates: Dict[str, Tuple[str, float]] = {}
+        result = None
+
+        tiers = self._serving_tiers(predictor)
+        corrected = self._corrected_merchants.get(normalize_merchant(merchant)) == predictor.registry_version
+        if tiers is not None and not corrected:
+            _, merchant_tier, linear_tier = tiers
+
+            candidate = merchant_tier.predict(merchant)
+            if candidate is not None:
+                candidates['merchant_lookup'] = candidate
+                if candidate[1] >= thresholds['merchant_lookup']:
+                    result = self._fast_result('merchant_lookup', candidate, predictor)
+
+            if result is None:
+                candidate = linear_tier.predict(raw_text, merchant)
+                if candidate is not None:
+                    candidates['linear'] = candidate
+                    if candidate[1] >= thresholds['linear']:
+                        result = self._fast_result('linear', candidate, predictor)
+
+        if result is None:
+            result = dict(self.handle.predict_category(raw_text=raw_text, amount=amount, merchant=merchant, date_str=date_str))
+            result['tier'] = 'forest'
+
+        if candidates:
+            self._track(raw_text, result, candidates)
+        else:
+            with self._tracked_lock:
+                self.tier_counts[result['tier']] += 1
+        return result
+
+    @staticmethod
+    def _fast_result(tier: str, candidate: Tuple[str, float], predictor: MLCategoryPredictor) -> Dict[str, Any]:
+        category, confidence = candidate
+        return {
+            'category': category,
+            'confidence': confidence,
+            'method': f'fast_{tier}',
+            'tier': tier,
+            'base_version': predictor.registry_version,
+            'model_version': predictor.online_state[2]
+        }
+
+    def _track(self, raw_text: str, result: Dict[str, Any], candidates: Dict[str, Tuple[str, float]]):
+        """Remember a decision until it is corrected or accepted"""
+        now = time.time()
+        decision = {
+            'served_category': str(result.get('category')),
+            'tier': result['tier'],
+            'candidates': {tier: [str(category), round(confidence, 4)] for tier, (category, confidence) in candidates.items()},
+            'tracked_at': now
+        }
+        with self._tracked_lock:
+            self.tier_counts[result['tier']] += 1
+            self._tracked.pop(raw_text, None)
+            self._tracked[raw_text] = decision
+            accepted = self._pop_accepted(now)
+
+        self._log_accepted(accepted)
+
+    def _pop_accepted(self, now: float) -> List[Dict[str, Any]]:
+        """Remove decisions past the acceptance window or over max_tracked; the caller holds the lock"""
+        accepted = []
+        while self._tracked:
+            oldest = next(iter(self._tracked.values()))
+            if len(self._tracked) <= self.max_tracked and now - oldest['tracked_at'] < self.acceptance_window:
+                break
+            accepted.append(self._tracked.popitem(last=False)[1])
+        return accepted
+
+    def _log_accepted(self, decisions: List[Dict[str, Any]]):
+        for decision in decisions:
+            self._log_outcome(decision, decision['served_category'], corrected=False)
+
+    def _log_outcome(self, decision: Dict[str, Any], true_category: str, corrected: bool):
+        record = {key: value for key, value in decision.items() if key != 'tracked_at'}
+        record.update(true_category=true_category, corrected=corrected)
+        try:
+            with open(self.outcomes_path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        except Exception as e:
+            logger.warning(f"Could not log fast path outcome: {str(e)}")
+
+    def expire_tracked(self):
+        """Log decisions left uncorrected for the acceptance window as accepted"""
+        with self._tracked_lock:
+            accepted = self._pop_accepted(time.time())
+        self._log_accepted(accepted)
+
+    def flush_tracked(self):
+        """Log every decision still awaiting an outcome as accepted (call on shutdown)"""
+        with self._tracked_lock:
+            accepted = list(self._tracked.values())
+            self._tracked.clear()
+        self._log_accepted(accepted)
+        if accepted:
+            logger.info(f"Fast path outcomes flushed: {len(accepted)} accepted")
+
+    def record_outcome(self, raw_text: str, corrected_category: str, merchant: Optional[str] = None):
+        """
+        Attach a user correction to the logged decision and forward it to shadow evaluation.
+
+        The corrected merchant bypasses the fast tiers from now on, until a new
+        base version is promoted and distilled.
+        """
+        self.handle.record_outcome(raw_text, corrected_category)
+        key = normalize_merchant(merchant)
+        version = self.handle.predictor.registry_version
+        with self._tracked_lock:
+            decision = self._tracked.pop(raw_text, None)
+            if key and self._corrected_merchants.get(key) != version:
+                # Entries from older base versions no longer apply
+                corrected_merchants = {name: corrected_version for name, corrected_version
+                                       in self._corrected_merchants.items() if corrected_version == version}
+                corrected_merchants[key] = version
+                self._save_corrected_merchants(corrected_merchants)
+                self._corrected_merchants = corrected_merchants
+        if decision is not None:
+            self._log_outcome(decision, corrected_category, corrected=True)
+
+    def _save_corrected_merchants(self, corrected_merchants: Dict[str, int]):
+        tmp_path = self.corrected_merchants_path.with_suffix('.tmp')
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(corrected_merchants, f, indent=2)
+            os.replace(tmp_path, self.corrected_merchants_path)
+        except Exception as e:
+            logger.warning(f"Could not save corrected merchants: {str(e)}")
+
+    def tune_thresholds(self, max_outcomes: int = 20000) -> Dict[str, Any]:
+        """
+        Re-tune each fast tier's gate from the outcome log.
+
+        The new threshold is the lowest confidence at which the tier's answers
+        at or above it still meet target_precision. A tier that never reaches
+        the target is disabled. Tiers with too few outcomes, or whose outcomes
+        are still mostly corrections, keep their threshold.
+        """
+        self.expire_tracked()
+        if not self.outcomes_path.exists():
+            return {'thresholds': dict(self.thresholds), 'tiers': {}}
+
+        with open(self.outcomes_path, 'r') as f:
+            recent = deque((line for line in f if line.strip()), maxlen=max_outcomes)
+
+        observations: Dict[str, List[Tuple[float, bool]]] = defaultdict(list)
+        accepted_counts = Counter()
+        for line in recent:
+            record = json.loads(line)
+            for tier, (category, confidence) in record['candidates'].items():
+                observations[tier].append((confidence, category == record['true_category']))
+                accepted_counts[tier] += not record['corrected']
+
+        thresholds = dict(self.thresholds)
+        report = {}
+        for tier in FAST_TIERS:
+            samples = sorted(observations.get(tier, []), key=lambda sample: -sample[0])
+            accepted_share = accepted_counts[tier] / len(samples) if samples else 0.0
+            if len(samples) < self.min_tuning_samples or accepted_share < self.min_accepted_share:
+                report[tier] = {'samples': len(samples), 'accepted_share': round(accepted_share, 4),
+                                'threshold': thresholds[tier], 'tuned': False}
+                continue
+
+            threshold, precision, coverage = DISABLED_THRESHOLD, None, 0.0
+            correct = 0
+            for i, (confidence, is_correct) in enumerate(samples):
+                correct += is_correct
+                # Only evaluate where the next confidence differs so ties stay together
+                if i + 1 < len(samples) and samples[i + 1][0] == confidence:
+                    continue
+                if correct / (i + 1) >= self.target_precision:
+                    threshold, precision, coverage = confidence, correct / (i + 1), (i + 1) / len(samples)
+
+            thresholds[tier] = threshold
+            report[tier] = {
+                'samples': len(samples),
+                'accepted_share': round(accepted_share, 4),
+                'threshold': threshold,
+                'precision': round(precision, 4) if precision is not None else None,
+                'coverage': round(coverage, 4),
+                'tuned': True
+            }
+
+        self._save_thresholds(thresholds)
+        self.thresholds = thresholds
+        logger.info(f"Fast path thresholds tuned: {thresholds}")
+        return {'thresholds': thresholds, 'tiers': report}
+
+    def get_status(self) -> Dict[str, Any]:
+        """Tier usage and gate thresholds for status endpoints"""
+        tiers = self._tiers
+        with self._tracked_lock:
+            tier_counts = Counter(self.tier_counts)
+        total = sum(tier_counts.values())
+        return {
+            'fast_path_base_version': tiers[0] if tiers else None,
+            'thresholds': dict(self.thresholds),
+            'tier_counts': dict(tier_counts),
+            'fast_path_rate': round(sum(tier_counts[tier] for tier in FAST_TIERS) / total, 3) if total else 0.0,
+            'awaiting_outcome': len(self._tracked),
+            'corrected_merchants': len(self._corrected_merchants)
+        }
+
+_shared_classifier: Optional[TieredCategoryClassifier] = None
+_shared_classifier_lock = threading.Lock()
+
+def get_tiered_classifier() -> TieredCategoryClassifier:
+    """Process-wide tiered classifier on top of the shared predictor handle"""
+    global _shared_classifier
+    if _shared_classifier is None:
+        with _shared_classifier_lock:
+            if _shared_classifier is None:
+                _shared_classifier = TieredCategoryClassifier(get_predictor_handle())
+    return _shared_classifier
+
+# Export the classifier
+__all__ = ['TieredCategoryClassifier', 'MerchantLookupTier', 'LinearTier', 'get_tiered_classifier']
@@ -10,10 +10,10 @@ PROPRIETARY SOFTWARE - UNAUTHORIZED USE PROHIBITED
 from fastapi import APIRouter, HTTPException, BackgroundTasks
 from typing import Dict, Any
 import logging
-from pathlib import Path
-import json
 
 from ml_category_predictor import MLCategoryPredictor
+from ml_model_registry import get_predictor_handle
+from ml_tiered_classifier import get_tiered_classifier
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -21,53 +21,67 @@ logger = logging.getLogger(__name__)
 # Create API router
 ml_router = APIRouter(prefix="/api/ml", tags=["Machine Learning"])
 
-# Global ML predictor instance
-ml_predictor = MLCategoryPredictor()
+# Shared predictor handle (same instance the TransactionProcessor serves from)
+ml_handle = get_predictor_handle()
 
 @ml_router.post("/train")
-async def train_model(background_tasks: BackgroundTasks) -> Dict[str, Any]:
+async def train_model(background_tasks: BackgroundTasks, mode: str = "shadow",
+                      sweep: bool = False) -> Dict[str, Any]:
     """
-    Train the ML category prediction model using synthetic dataset
+    Train a new ML category prediction model version using synthetic dataset
+    
+    mode: 'shadow' scores the new version on live traffic before promotion,
+          'promote' serves it immediately
+    sweep: run a hyperparameter sweep on the cached features first and
+           train with the best parameters
     """
+    if mode not in ('shadow', 'promote'):
+        raise HTTPException(status_code=400, detail="mode must be 'shadow' or 'promote'")
+    
     try:
         # Run training in background to avoid timeout
-        background_tasks.add_task(train_model_background)
+        background_tasks.add_task(train_model_background, mode, sweep)
         
         return {
             'success': True,
             'message': 'Model training started in background',
-            'status': 'training'
+            'status': 'training',
+            'mode': mode,
+            'sweep': sweep
         }
         
     except Exception as e:
         logger.error(f"Error starting model training: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to start training: {str(e)}")
 
-def train_model_background():
-    """Background task to train the ML model"""
+def train_model_background(mode: str = "shadow", sweep: bool = False):
+    """Background task to train a new model version without touching the serving model"""
     try:
         logger.info("Starting background ML model training...")
         
-        results = ml_predictor.train_model()
+        registry = ml_handle.registry
+        candidate = MLCategoryPredictor(model_path=str(registry.registry_dir / 'candidate.pkl'))
+        
+        rf_params = None
+        if sweep:
+            sweep_results = candidate.sweep_hyperparameters()
+            rf_params = sweep_results['best_params']
+            logger.info(f"Sweep best parameters: {rf_params} (CV accuracy: {sweep_results['best_cv_accuracy']:.3f})")
+        
+        results = candidate.train_model(save=False, rf_params=rf_params)
         
         logger.info(f"Model training completed successfully! Accuracy: {results['test_accuracy']:.3f}")
         
-        # Save training results
-        results_path = Path("/app/models/training_results.json")
-        with open(results_path, 'w') as f:
-            # Convert numpy types to standard Python types for JSON serialization
-            serializable_results = {}
-            for key, value in results.items():
-                if key == 'categories':
-                    serializable_results[key] = [str(cat) for cat in value]
-                elif key == 'top_features':
-                    serializable_results[key] = [[str(feat), float(imp)] for feat, imp in value]
-                elif isinstance(value, (float, int, str, bool, list, dict)):
-                    serializable_results[key] = value
-                else:
-                    serializable_results[key] = str(value)
-            
-            json.dump(serializable_results, f, indent=2)
+        # Save the trained model and its results as a new registry version
+        version = registry.register(candidate, results)
+        
+        # Distill the fast path tiers before the version can serve traffic
+        get_tiered_classifier().build_fast_path(candidate)
+        
+        if mode == 'promote':
+            ml_handle.promote(version)
+        else:
+            ml_handle.start_shadow(version)
         
     except Exception as e:
         logger.error(f"Error in background training: {str(e)}")
@@ -78,27 +92,27 @@ async def get_model_status() -> Dict[str, Any]:
     Get current ML model status and performance metrics
     """
     try:
+        ml_predictor = ml_handle.predictor
+        registry = ml_handle.registry
+        
         # Check if model is trained
         is_trained = ml_predictor.is_trained
         
-        # Get training results if available
-        results_path = Path("/app/models/training_results.json")
-        training_results = None
-        
-        if results_path.exists():
-            try:
-                with open(results_path, 'r') as f:
-                    training_results = json.load(f)
-            except Exception as e:
-                logger.warning(f"Could not load training results: {str(e)}")
+        # Get training results of the serving version if registered
+        serving_version = ml_predictor.registry_version
+        metadata = registry.get_metadata(serving_version) if serving_version else None
+        training_results = metadata.get('training_results') if metadata else None
         
         # Get model file info
-        model_path = Path("/app/models/category_predictor.pkl")
+        model_path = ml_predictor.model_path
         model_exists = model_path.exists()
         model_size = model_path.stat().st_size if model_exists else 0
         
         status = {
             'is_trained': is_trained,
+            'serving_version': serving_version,
+            'registered_versions': registry.list_versions(),
+            'shadow_version': ml_handle.shadow.version if ml_handle.shadow else None,
             'model_exists': model_exists,
             'model_size_mb': round(model_size / 1024 / 1024, 2),
             'categories': list(ml_predictor.label_encoder.classes_) if ml_predictor.label_encoder else [],
@@ -115,6 +129,111 @@ async def get_model_status() -> Dict[str, Any]:
         logger.error(f"Error getting model status: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get status: {str(e)}")
 
+@ml_router.get("/versions")
+async def list_model_versions() -> Dict[str, Any]:
+    """
+    List registered model versions with their lifecycle metadata
+    """
+    registry = ml_handle.registry
+    versions = []
+    for version in registry.list_versions():
+        metadata = registry.get_metadata(version) or {}
+        versions.append({
+            'version': version,
+            'status': metadata.get('status'),
+            'registered_at': metadata.get('registered_at'),
+            'test_accuracy': (metadata.get('training_results') or {}).get('test_accuracy')
+        })
+    
+    return {
+        'success': True,
+        'current_version': registry.current_version(),
+        'versions': versions
+    }
+
+@ml_router.post("/versions/{version}/promote")
+async def promote_model_version(version: int) -> Dict[str, Any]:
+    """
+    Serve a registered version (promotes the shadow candidate or rolls back)
+    """
+    try:
+        ml_handle.promote(version)
+        return {'success': True, 'serving_version': version}
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error promoting model version: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to promote: {str(e)}")
+
+@ml_router.get("/shadow")
+async def get_shadow_report(min_samples: int = 200) -> Dict[str, Any]:
+    """
+    Compare the shadow candidate against the serving model on live traffic
+    """
+    shadow = ml_handle.shadow
+    if shadow is None:
+        return {'success': True, 'shadow': None}
+    
+    return {
+        'success': True,
+        'shadow': shadow.report(min_samples=min_samples)
+    }
+
+@ml_router.post("/shadow/promote")
+async def promote_shadow_model(force: bool = False) -> Dict[str, Any]:
+    """
+    Promote the shadow candidate once it has matched the serving model
+    """
+    shadow = ml_handle.shadow
+    if shadow is None:
+        raise HTTPException(status_code=400, detail="No model in shadow evaluation")
+    
+    report = shadow.report()
+    if not report['ready_to_promote'] and not force:
+        raise HTTPException(status_code=409, detail="Shadow candidate has not met promotion criteria")
+    
+    ml_handle.promote(shadow.version)
+    return {
+        'success': True,
+        'serving_version': shadow.version,
+        'shadow_report': report
+    }
+
+@ml_router.post("/shadow/cancel")
+async def cancel_shadow_model() -> Dict[str, Any]:
+    """
+    Stop shadow evaluation and reject the candidate
+    """
+    report = ml_handle.stop_shadow()
+    return {
+        'success': True,
+        'shadow_report': report
+    }
+
+@ml_router.get("/fast-path")
+async def get_fast_path_status() -> Dict[str, Any]:
+    """
+    Tier usage and gate thresholds of the tiered classifier
+    """
+    return {
+        'success': True,
+        'fast_path': get_tiered_classifier().get_status()
+    }
+
+@ml_router.post("/fast-path/tune")
+async def tune_fast_path() -> Dict[str, Any]:
+    """
+    Re-tune the fast tier gate thresholds from logged outcomes
+    """
+    try:
+        return {
+            'success': True,
+            'tuning': get_tiered_classifier().tune_thresholds()
+        }
+    except Exception as e:
+        logger.error(f"Error tuning fast path: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to tune fast path: {str(e)}")
+
 @ml_router.post("/predict")
 async def predict_category(
     raw_text: str,
@@ -126,10 +245,10 @@ async def predict_category(
     Predict category for a single transaction using ML model
     """
     try:
-        if not ml_predictor.is_trained:
+        if not ml_handle.predictor.is_trained:
             raise HTTPException(status_code=400, detail="Model not trained yet")
         
-        result = ml_predictor.predict_category(
+        result = get_tiered_classifier().predict_category(
             raw_text=raw_text,
             amount=amount,
             merchant=merchant,
@@ -151,6 +270,7 @@ async def ml_health_check() -> Dict[str, Any]:
     Health check for ML system
     """
     try:
+        ml_predictor = ml_handle.predictor
         health_status = {
             'ml_available': ml_predictor is not None,
             'model_loaded': ml_predictor.is_trained if ml_predictor else False,
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test Batch Upload Staging: Multiple Files and ZIP Archives
+"""
+
+import io
+import os
+import sys
+import zipfile
+sys.path.append('backend')
+
+from server import stage_batch_files
+
+def build_archive() -> io.BytesIO:
+    """ZIP with receipts in folders plus the junk real archives carry"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for i in range(25):
+            archive.writestr(f"2024/march/receipt_{i:03d}.jpg", b"\xff\xd8\xff" + os.urandom(2048))
+        archive.writestr("2024/april/invoice.pdf", b"%PDF-1.4\n%%EOF\n")
+        archive.writestr("__MACOSX/2024/._receipt_000.jpg", b"resource fork")
+        archive.writestr("2024/.DS_Store", b"finder")
+        archive.writestr("2024/notes.txt", b"not a receipt")
+    buffer.seek(0)
+    return buffer
+
+def test_batch_upload():
+    """Test that files and archive members are staged, junk is ignored and bad input is reported"""
+
+    print("🧪 Testing Batch Upload Staging")
+    print("=" * 60)
+
+    uploads = [
+        ("march.zip", build_archive()),
+        ("single.png", io.BytesIO(b"\x89PNG" + os.urandom(512))),
+        ("broken.zip", io.BytesIO(b"not a zip")),
+    ]
+    staged, skipped = stage_batch_files(uploads)
+
+    print(f"Staged: {len(staged)}, skipped: {[entry['filename'] for entry in skipped]}")
+
+    try:
+        checks = [
+            ("staged count", len(staged), 27),
+            ("pdf flagged", sum(entry['is_pdf'] for entry in staged), 1),
+            ("unique ids", len({entry['id'] for entry in staged}), 27),
+            ("files staged", all(os.path.getsize(entry['staging_path']) > 0 for entry in staged), True),
+            ("member streamed intact", os.path.getsize(staged[0]['staging_path']), 2051),
+            ("folders stripped", staged[0]['filename'], 'receipt_000.jpg'),
+            ("skipped", sorted(entry['filename'] for entry in skipped), ['2024/notes.txt', 'broken.zip']),
+        ]
+    finally:
+        for entry in staged:
+            os.remove(entry['staging_path'])
+
+    passed = 0
+    for name, got, expected in checks:
+        status = "✅" if got == expected else "❌"
+        passed += got == expected
+        print(f"  {status} {name:<24} -> {got}")
+
+    print(f"\n📊 Results: {passed}/{len(checks)} passed")
+
+if __name__ == "__main__":
+    test_batch_upload()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test Content-Addressed Blob Store: Dedupe, Sharding and Reference Counting
+"""
+
+import asyncio
+import io
+import os
+import shutil
+import sys
+sys.path.append('backend')
+
+from blob_store import BlobStore, LocalBlobBackend
+
+class RefsCollection:
+    """Collection stand-in for blob reference documents"""
+
+    def __init__(self):
+        self.documents = {}
+
+    async def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            key = operation._filter['_id']
+            document = self.documents.setdefault(key, dict(operation._doc['$setOnInsert']))
+            document['refs'] = document.get('refs', 0) + operation._doc['$inc']['refs']
+
+    async def find_one_and_update(self, query, update, return_document=None):
+        document = self.documents.get(query['_id'])
+        if document is None:
+            return None
+        document['refs'] += update['$inc']['refs']
+        return dict(document)
+
+    async def delete_one(self, query):
+        document = self.documents.get(query['_id'])
+        deleted = document is not None and document['refs'] <= query['refs']['$lte']
+        if deleted:
+            del self.documents[query['_id']]
+        return type('DeleteResult', (), {'deleted_count': int(deleted)})()
+
+async def receipt_lifecycle(store: BlobStore):
+    photo = os.urandom(200_000)
+    other = os.urandom(50_000)
+
+    # Three receipts upload the same photo, one a different file
+    keys = [(await store.store(photo))[0] for _ in range(3)]
+    other_key, _ = await store.store(other)
+    # A batch upload of the same photo is staged in the threadpool and committed afterwards
+    batch_key, size, staging_path = store.stage(io.BytesIO(photo))
+    await store.commit([(batch_key, size, staging_path)])
+
+    refs_before = store.refs.documents[keys[0]]['refs']
+    released = [await store.release(keys[0]) for _ in range(3)]
+    exists_after_three = store.backend.exists(keys[0])
+    released.append(await store.release(keys[0]))
+    return keys, batch_key, other_key, refs_before, released, exists_after_three
+
+async def release_while_staged(store: BlobStore):
+    """The last receipt of a blob is deleted between a batch staging the same bytes and committing them"""
+    data = os.urandom(30_000)
+    key, _ = await store.store(data)
+    staged = store.stage(io.BytesIO(data))
+    release = asyncio.create_task(store.release(key))
+    await asyncio.gather(store.commit([staged]), release)
+    return store.backend.exists(key), store.refs.documents.get(key, {}).get('refs')
+
+def test_blob_store():
+    """Test that identical uploads are stored once and deleted with their last reference"""
+
+    print("🧪 Testing Blob Store")
+    print("=" * 60)
+
+    root = "/tmp/lumina_blobs"
+    shutil.rmtree(root, ignore_errors=True)
+    store = BlobStore(LocalBlobBackend(f"{root}/blobs"), RefsCollection(), f"{root}/staging")
+
+    keys, batch_key, other_key, refs_before, released, exists_after_three = asyncio.run(receipt_lifecycle(store))
+    race_store = BlobStore(LocalBlobBackend(f"{root}/race"), RefsCollection(), f"{root}/staging")
+    raced = asyncio.run(release_while_staged(race_store))
+    stored_files = [os.path.join(d, f) for d, _, files in os.walk(f"{root}/blobs") for f in files]
+    relative = os.path.relpath(store.path(other_key), f"{root}/blobs")
+
+    print(f"5 uploads (4 identical) -> refs {refs_before} on the shared blob; after 4 deletes {len(stored_files)} blob left")
+    print(f"Layout: {relative}")
+
+    checks = [
+        ("same content, same key", len(set(keys + [batch_key])), 1),
+        ("sha-256 key", len(keys[0]), 64),
+        ("sharded path", relative.split(os.sep)[:2], [other_key[:2], other_key[2:4]]),
+        ("refs counted", refs_before, 4),
+        ("kept while referenced", (released[:3], exists_after_three), ([False, False, False], True)),
+        ("deleted at zero refs", (released[3], store.backend.exists(keys[0])), (True, False)),
+        ("other blob untouched", stored_files == [store.path(other_key)], True),
+        ("committed blob survives release", raced, (True, 1)),
+        ("staging left empty", os.listdir(f"{root}/staging"), []),
+    ]
+
+    passed = 0
+    for name, got, expected in checks:
+        status = "✅" if got == expected else "❌"
+        passed += got == expected
+        print(f"  {status} {name:<31} -> {got}")
+
+    print(f"\n📊 Results: {passed}/{len(checks)} passed")
+
+if __name__ == "__main__":
+    test_blob_store()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test Response Compression Middleware
+"""
+
+import json
+import sys
+sys.path.append('backend')
+
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from compression import CompressionMiddleware, choose_encoding
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    receipts = [{"id": str(i), "merchant_name": "Walmart", "raw_text": "MILK 3.99\nBREAD 2.49\nTOTAL 6.48\n" * 20}
+                for i in range(200)]
+
+    @app.get("/receipts")
+    async def receipts_list():
+        return Response(json.dumps(receipts).encode(), media_type="application/json", headers={"ETag": '"v1"'})
+
+    @app.get("/small")
+    async def small():
+        return {"status": "ok"}
+
+    @app.get("/export")
+    async def export():
+        def rows():
+            yield "date,merchant,total\n"
+            for i in range(20000):
+                yield f"2024-03-{i % 28 + 1:02d},Walmart,${i % 100}.99\n"
+        return StreamingResponse(rows(), media_type="text/csv")
+
+    @app.get("/file")
+    async def file():
+        return Response(b"%PDF-1.4" + b"\x00" * 50000, media_type="application/pdf")
+
+    @app.get("/events")
+    async def events():
+        return StreamingResponse(iter(["data: x\n\n"] * 200), media_type="text/event-stream")
+
+    app.add_middleware(CompressionMiddleware, minimum_size=1024, thread_threshold=64 * 1024)
+    return app
+
+def test_compression():
+    """Test negotiation, size threshold, streaming CSV and bypasses"""
+
+    print("🧪 Testing Response Compression")
+    print("=" * 60)
+
+    client = TestClient(build_app())
+    gzip_only = {"Accept-Encoding": "gzip"}
+
+    listing = client.get("/receipts", headers=gzip_only)
+    raw_listing = client.get("/receipts", headers={"Accept-Encoding": "identity"})
+    small = client.get("/small", headers=gzip_only)
+    export = client.get("/export", headers=gzip_only)
+    raw_export = client.get("/export", headers={"Accept-Encoding": "identity"})
+    pdf = client.get("/file", headers=gzip_only)
+    events = client.get("/events", headers=gzip_only)
+
+    with client.stream("GET", "/receipts", headers=gzip_only) as streamed:
+        wire_bytes = sum(len(chunk) for chunk in streamed.iter_raw())
+
+    print(f"Receipt list: {len(raw_listing.content)} -> {wire_bytes} bytes on the wire")
+    print(f"CSV export: {len(raw_export.content)} bytes, encoding {export.headers.get('content-encoding')}")
+
+    checks = [
+        ("list gzipped", listing.headers.get("content-encoding"), "gzip"),
+        ("list content intact", listing.json() == raw_listing.json(), True),
+        ("list ratio > 10x", len(raw_listing.content) / wire_bytes > 10, True),
+        ("etag weakened", listing.headers.get("etag"), 'W/"v1"'),
+        ("vary set", listing.headers.get("vary"), "Accept-Encoding"),
+        ("small left alone", small.headers.get("content-encoding"), None),
+        ("csv streamed gzipped", (export.headers.get("content-encoding"), export.text == raw_export.text), ("gzip", True)),
+        ("pdf bypassed", pdf.headers.get("content-encoding"), None),
+        ("sse bypassed", events.headers.get("content-encoding"), None),
+        ("q-values honoured", choose_encoding("gzip;q=0.5, br;q=0.9, zstd;q=0", ["zstd", "br", "gzip"]), "br"),
+        ("identity when refused", choose_encoding("identity", ["zstd", "br", "gzip"]), None),
+    ]
+
+    passed = 0
+    for name, got, expected in checks:
+        status = "✅" if got == expected else "❌"
+        passed += got == expected
+        print(f"  {status} {name:<24} -> {got}")
+
+    print(f"\n📊 Results: {passed}/{len(checks)} passed")
+
+if __name__ == "__main__":
+    test_compression()
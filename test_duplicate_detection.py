@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Test Perceptual-Hash Duplicate Detection: Photo vs. PDF, BK-Tree Lookups and the Per-User Index
+"""
+
+import asyncio
+import os
+import random
+import shutil
+import sys
+from datetime import datetime, timedelta
+sys.path.append('backend')
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from duplicate_detection import (BKTree, DuplicateIndex, compute_hashes, counted_receipts, hamming, promote_duplicate,
+                                 same_purchase)
+from memory_motor import MemoryMotorClient
+
+ITEMS = ['MILK', 'BREAD', 'EGGS', 'COFFEE', 'BANANAS', 'PAPER TOWELS', 'SHAMPOO', 'BATTERIES', 'RICE', 'APPLES']
+
+def render_receipt(rng: random.Random, item_count: int, date: str = "2024-03-12", items=None) -> Image.Image:
+    """A clean receipt as it would come out of an emailed PDF"""
+    items = items or [(rng.choice(ITEMS), rng.uniform(1, 30)) for _ in range(item_count)]
+    lines = ["WALMART", "123 MAIN STREET", f"DATE: {date}", ""]
+    lines += [(name, f"{amount:.2f}") for name, amount in items]
+    lines += ["", ("TOTAL", f"{sum(amount for _, amount in items):.2f}"), "", "THANK YOU"]
+
+    font = ImageFont.load_default(size=40)
+    width, line_height = 800, 56
+    receipt = Image.new('L', (width, line_height * (len(lines) + 2)), 250)
+    draw = ImageDraw.Draw(receipt)
+    for i, line in enumerate(lines):
+        y = line_height * (i + 1)
+        if isinstance(line, tuple):
+            draw.text((40, y), line[0], fill=20, font=font)
+            draw.text((width - 40, y), line[1], fill=20, font=font, anchor='ra')
+        elif line:
+            draw.text((40, y), line, fill=20, font=font)
+    return receipt
+
+def photograph(receipt: Image.Image, rng: random.Random, path: str):
+    """The same paper photographed: larger, tilted, on a darker noisy background, uneven light, JPEG"""
+    receipt = receipt.resize((int(receipt.width * 1.7), int(receipt.height * 1.7)))
+    receipt = receipt.rotate(rng.uniform(-8, 8), expand=True, fillcolor=90)
+    canvas = Image.new('L', (receipt.width + 600, receipt.height + 500), 90)
+    canvas.paste(receipt, (rng.randint(100, 500), rng.randint(100, 400)))
+    pixels = np.asarray(canvas, dtype=np.float64)
+    lighting = np.linspace(0.75, 1.1, pixels.shape[1])[None, :]
+    noise = np.random.default_rng(rng.randint(0, 2 ** 31)).normal(0, 6, pixels.shape)
+    photo = np.clip(pixels * lighting + noise, 0, 255).astype(np.uint8)
+    Image.fromarray(photo).convert('RGB').save(path, quality=70)
+
+class ReceiptsCollection:
+    """Collection stand-in returning hashed receipt documents from find()"""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.queries = 0
+
+    def find(self, query, projection=None):
+        self.queries += 1
+        matching = [d for d in self.documents
+                    if d['user_id'] == query['user_id'] and d['processing_status'] == 'completed' and 'phash' in d]
+
+        async def cursor():
+            for document in matching:
+                yield document
+        return cursor()
+
+async def index_lookups(index: DuplicateIndex, photo_hashes, other_hashes):
+    photo_match = await index.find('user-1', photo_hashes)
+    other_match = await index.find('user-1', other_hashes)
+    other_user_match = await index.find('user-2', photo_hashes)
+    index.remove('user-1', 'receipt-pdf')
+    after_delete = await index.find('user-1', photo_hashes)
+    index.add('user-1', 'receipt-photo', photo_hashes)
+    after_add = await index.find('user-1', photo_hashes)
+    return photo_match, other_match, other_user_match, after_delete, after_add
+
+async def delete_original():
+    """Delete an original with two copies the way delete_receipt does and return the survivors' links"""
+    receipts = MemoryMotorClient("mongodb://unused")["lumina_test"].receipts
+    start = datetime(2024, 3, 1)
+    await receipts.insert_many([
+        {'id': 'original', 'user_id': 'user-1', 'upload_date': start, 'duplicate_of': None},
+        {'id': 'copy-2', 'user_id': 'user-1', 'upload_date': start + timedelta(days=2), 'duplicate_of': 'original'},
+        {'id': 'copy-1', 'user_id': 'user-1', 'upload_date': start + timedelta(days=1), 'duplicate_of': 'original'},
+        {'id': 'other', 'user_id': 'user-1', 'upload_date': start, 'duplicate_of': None},
+        {'id': 'look-alike', 'user_id': 'user-1', 'upload_date': start, 'duplicate_of': None,
+         'possible_duplicate_of': 'original'},
+    ])
+    await receipts.delete_one({'id': 'original'})
+    successor = await promote_duplicate(receipts, 'user-1', 'original')
+    links = {d['id']: d.get('possible_duplicate_of') or d['duplicate_of']
+             for d in await receipts.find({}).to_list(length=None)}
+    no_copies = await promote_duplicate(receipts, 'user-1', 'other')
+    return successor, links, no_copies
+
+def test_duplicate_detection():
+    """Test that a photo of a receipt matches its PDF and that different receipts do not"""
+
+    print("🧪 Testing Duplicate Detection")
+    print("=" * 60)
+
+    root = "/tmp/lumina_duplicates"
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(root)
+    rng = random.Random(3)
+
+    same_distances, different_distances = [], []
+    for i in range(8):
+        item_count = rng.randint(6, 20)
+        receipt = render_receipt(rng, item_count)
+        receipt.save(f"{root}/{i}.pdf")
+        photograph(receipt, rng, f"{root}/{i}_photo.jpg")
+        render_receipt(rng, item_count).save(f"{root}/{i}_other.png")
+
+        pdf, photo, other = (compute_hashes(f"{root}/{i}{suffix}") for suffix in ('.pdf', '_photo.jpg', '_other.png'))
+        same_distances.append((hamming(pdf.phash, photo.phash), hamming(pdf.layout, photo.layout)))
+        different_distances.append((hamming(pdf.phash, other.phash), hamming(pdf.layout, other.layout)))
+
+    print(f"Photo vs. PDF (pHash, layout):   {same_distances}")
+    print(f"Different receipt (pHash, layout): {different_distances}")
+
+    index = DuplicateIndex(ReceiptsCollection([]), max_distance=10, layout_max_distance=32)
+    pdf_hashes = compute_hashes(f"{root}/0.pdf")
+    index.collection.documents.append({'id': 'receipt-pdf', 'user_id': 'user-1', 'processing_status': 'completed',
+                                       **pdf_hashes.to_document()})
+    photo_match, other_match, other_user_match, after_delete, after_add = asyncio.run(index_lookups(
+        index, compute_hashes(f"{root}/0_photo.jpg"), compute_hashes(f"{root}/0_other.png")
+    ))
+    print(f"Index: photo -> {photo_match}, status {index.get_status()}")
+
+    # The same order template on another day: looks alike, is a different purchase
+    items = [(ITEMS[i], 2.5 + i) for i in range(10)]
+    render_receipt(rng, 10, items=items).save(f"{root}/template_a.png")
+    render_receipt(rng, 10, date="2024-03-19", items=items[:-1] + [(items[-1][0], 21.5)]).save(f"{root}/template_b.png")
+    template_a, template_b = compute_hashes(f"{root}/template_a.png"), compute_hashes(f"{root}/template_b.png")
+    template_distance = (hamming(template_a.phash, template_b.phash), hamming(template_a.layout, template_b.layout))
+    print(f"Same template, other purchase (pHash, layout): {template_distance}")
+    first = {'merchant_name': 'Walmart', 'receipt_date': '2024-03-12', 'total_amount': '$70.00'}
+    rescan = {'merchant_name': 'WALMART ', 'receipt_date': '2024-03-12', 'total_amount': '70.00'}
+    next_week = {'merchant_name': 'Walmart', 'receipt_date': '2024-03-19', 'total_amount': 80.0}
+
+    tree, values = BKTree(), []
+    hash_rng = random.Random(11)
+    for i in range(2000):
+        value_hash = hash_rng.getrandbits(64)
+        tree.add(value_hash, i)
+        values.append(value_hash)
+    query = values[7] ^ 0b1011
+    brute_force = sorted((hamming(query, h), i) for i, h in enumerate(values) if hamming(query, h) <= 22)
+
+    successor, links, no_copies = asyncio.run(delete_original())
+    print(f"After deleting the original: successor {successor}, links {links}")
+    copies = [{'id': 'a'}, {'id': 'b', 'duplicate_of': 'a'}, {'id': 'c', 'duplicate_of': 'x'},
+              {'id': 'd', 'duplicate_of': 'x'}, {'id': 'e'}]
+
+    checks = [
+        ("photo matches its PDF", all(p <= index.max_distance and l <= index.layout_max_distance
+                                      for p, l in same_distances), True),
+        ("different receipts apart", any(p <= index.max_distance and l <= index.layout_max_distance
+                                         for p, l in different_distances), False),
+        ("index finds the photo", photo_match.receipt_id if photo_match else None, 'receipt-pdf'),
+        ("different receipt no match", other_match, None),
+        ("per-user isolation", other_user_match, None),
+        ("deleted receipt forgotten", after_delete, None),
+        ("added receipt findable", after_add.receipt_id if after_add else None, 'receipt-photo'),
+        ("loaded once per user", index.collection.queries, 2),
+        ("bk-tree equals brute force", sorted(tree.search(query, 22)), brute_force),
+        ("bk-tree found several", len(brute_force) > 5, True),
+        ("same template looks alike", template_distance[0] <= index.max_distance
+                                      and template_distance[1] <= index.layout_max_distance, True),
+        ("other date/total not same", same_purchase(first, next_week), False),
+        ("other total not same", same_purchase(first, {**first, 'total_amount': '$71.00'}), False),
+        ("missing date not same", same_purchase({**first, 'receipt_date': None}, {**rescan, 'receipt_date': None}), False),
+        ("rescan is same purchase", same_purchase(first, rescan), True),
+        ("unreadable file", compute_hashes(f"{root}/missing.jpg"), None),
+        ("earliest copy promoted", successor, 'copy-1'),
+        ("copies repointed", links, {'copy-1': None, 'copy-2': 'copy-1', 'other': None, 'look-alike': 'copy-1'}),
+        ("no copies, no promotion", no_copies, None),
+        ("copy counts for missing original", [r['id'] for r in counted_receipts(copies)], ['a', 'c', 'e']),
+    ]
+
+    passed = 0
+    for name, got, expected in checks:
+        status = "✅" if got == expected else "❌"
+        passed += got == expected
+        print(f"  {status} {name:<28} -> {got}")
+
+    print(f"\n📊 Results: {passed}/{len(checks)} passed")
+
+if __name__ == "__main__":
+    test_duplicate_detection()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test Training Feature Cache Invalidation and Parallel Feature Extraction
+"""
+
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+import ml_category_predictor
+from ml_category_predictor import MLCategoryPredictor
+
+def cache_keys(predictor: MLCategoryPredictor, dataset_bytes: bytes) -> dict:
+    """Cache path for the current settings and with each key component changed"""
+    keys = {'current': predictor._feature_cache_path(dataset_bytes).name,
+            'dataset': predictor._feature_cache_path(dataset_bytes + b' ').name}
+    changes = [('extractor', 'FEATURE_EXTRACTOR_VERSION', ml_category_predictor.FEATURE_EXTRACTOR_VERSION + 1),
+               ('layout', 'FEATURE_LAYOUT', 'dense'),
+               ('tfidf', 'TFIDF_PARAMS', {**ml_category_predictor.TFIDF_PARAMS, 'max_features': 200})]
+    for name, constant, value in changes:
+        original = getattr(ml_category_predictor, constant)
+        setattr(ml_category_predictor, constant, value)
+        try:
+            keys[name] = predictor._feature_cache_path(dataset_bytes).name
+        finally:
+            setattr(ml_category_predictor, constant, original)
+    return keys
+
+def test_feature_cache():
+    """Test that cached matrices are keyed by everything that shapes them and that parallel extraction matches serial"""
+
+    print("🧪 Testing Feature Cache and Parallel Extraction")
+    print("=" * 60)
+
+    predictor = MLCategoryPredictor()
+    predictor.feature_cache_dir = Path(tempfile.mkdtemp())
+    dataset_path = 'synthetic_training_dataset.json'
+    with open(dataset_path, 'rb') as f:
+        dataset_bytes = f.read()
+    dataset = json.loads(dataset_bytes)
+
+    keys = cache_keys(predictor, dataset_bytes)
+    print(f"Cache keys: {keys}")
+
+    # Count real extractions: a cache hit must not featurize again
+    extractions = []
+    extract = predictor._extract_training_features
+    predictor._extract_training_features = lambda examples: extractions.append(len(examples)) or extract(examples)
+
+    X_first, y_first = predictor.prepare_training_data(dataset_path)
+    X_cached, y_cached = predictor.prepare_training_data(dataset_path)
+    hit_extractions = len(extractions)
+    ml_category_predictor.FEATURE_EXTRACTOR_VERSION += 1
+    try:
+        predictor.prepare_training_data(dataset_path)
+    finally:
+        ml_category_predictor.FEATURE_EXTRACTOR_VERSION -= 1
+    cache_files = sorted(os.listdir(predictor.feature_cache_dir))
+
+    # Parallel extraction over the same examples, forced below the size cutoff
+    serial = ml_category_predictor._extract_feature_chunk(predictor.feature_extractor, dataset)
+    min_examples = ml_category_predictor.PARALLEL_EXTRACTION_MIN_EXAMPLES
+    ml_category_predictor.PARALLEL_EXTRACTION_MIN_EXAMPLES = 0
+    predictor.n_jobs = 2
+    try:
+        parallel = extract(dataset)
+    finally:
+        ml_category_predictor.PARALLEL_EXTRACTION_MIN_EXAMPLES = min_examples
+
+    # The sweep runs on the cached matrix with its fits spread over the workers
+    sweep = predictor.sweep_hyperparameters({'n_estimators': [10], 'max_depth': [5, None]}, dataset_path, cv=2)
+    print(f"Sweep: best {sweep['best_params']} at {sweep['best_cv_accuracy']:.3f}")
+
+    checks = [
+        ("every component changes key", len(set(keys.values())), len(keys)),
+        ("second call is a cache hit", hit_extractions, 1),
+        ("cached matrix identical", (X_cached != X_first).nnz == 0 and np.array_equal(y_cached, y_first), True),
+        ("new extractor rebuilds", (len(extractions), len(cache_files)), (2, 2)),
+        ("parallel equals serial", parallel == serial, True),
+        ("sweep uses the cache", len(extractions), 2),
+        ("sweep ranks every candidate", len(sweep['results']), 2),
+    ]
+
+    passed = 0
+    for name, got, expected in checks:
+        status = "✅" if got == expected else "❌"
+        passed += got == expected
+        print(f"  {status} {name:<28} -> {got}")
+
+    print(f"\n📊 Results: {passed}/{len(checks)} passed")
+
+if __name__ == "__main__":
+    test_feature_cache()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test Feature Layouts: Legacy Dense Models Predict as Before Alongside Sparse Models
+"""
+
+import json
+import tempfile
+import warnings
+from pathlib import Path
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import StandardScaler
+
+from ml_category_predictor import MLCategoryPredictor
+
+LEGACY_MODEL_PATH = 'models/category_predictor.pkl'
+
+def unscaled_matrix(predictor: MLCategoryPredictor, examples) -> sp.csr_matrix:
+    """Structured block hstacked with TF-IDF, before any scaling"""
+    n_structured = sum(1 for name in predictor.feature_names if not name.startswith('tfidf_'))
+    layout, scaler = predictor.feature_layout, predictor.scaler
+    predictor.feature_layout = 'sparse'
+    predictor.scaler = StandardScaler(with_mean=False, with_std=False).fit(np.zeros((1, n_structured)))
+    try:
+        return predictor.build_feature_matrix(examples)
+    finally:
+        predictor.feature_layout, predictor.scaler = layout, scaler
+
+def test_feature_layout():
+    """Test that pickles from before the sparse layout keep their inference path and predictions"""
+
+    print("🧪 Testing Feature Layouts")
+    print("=" * 60)
+
+    with open('synthetic_training_dataset.json') as f:
+        dataset = json.load(f)
+    examples = [
+        {'raw_text': example['raw_text'], 'amount': example.get('true_amount'),
+         'merchant': example.get('key_merchant'), 'date_str': example.get('true_date')}
+        for example in dataset
+    ]
+
+    # Legacy pickle: no feature_layout key, one scaler fitted over the dense hstack
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        legacy = MLCategoryPredictor(model_path=LEGACY_MODEL_PATH)
+    legacy_X = legacy.build_feature_matrix(examples)
+    legacy_reference = legacy.scaler.transform(unscaled_matrix(legacy, examples).toarray())
+    legacy_predictions = [legacy.predict_category(**example)['category'] for example in examples]
+    reference_predictions = list(legacy.label_encoder.inverse_transform(legacy.rf_model.predict(legacy_reference)))
+
+    # Sparse model: scaler over the structured block only, TF-IDF left sparse
+    sparse_model_path = Path(tempfile.mkdtemp()) / 'category_predictor.pkl'
+    trained = MLCategoryPredictor(model_path=str(sparse_model_path))
+    trained.feature_cache_dir = sparse_model_path.parent / 'feature_cache'
+    trained.train_model(save=True, rf_params={'n_estimators': 20})
+    reloaded = MLCategoryPredictor(model_path=str(sparse_model_path))
+    sparse_X = reloaded.build_feature_matrix(examples)
+    unscaled = unscaled_matrix(reloaded, examples)
+    n_structured = reloaded.scaler.n_features_in_
+    sparse_reference = np.hstack([reloaded.scaler.transform(unscaled[:, :n_structured].toarray()),
+                                  unscaled[:, n_structured:].toarray()])
+    sparse_predictions = [reloaded.predict_category(**example)['category'] for example in examples]
+    dense_predictions = list(reloaded.label_encoder.inverse_transform(reloaded.rf_model.predict(sparse_reference)))
+
+    print(f"Legacy matrix: {type(legacy_X).__name__} {legacy_X.shape}, sparse matrix: {type(sparse_X).__name__} {sparse_X.shape}")
+
+    checks = [
+        ("legacy loads as dense", (legacy.is_trained, legacy.feature_layout), (True, 'dense')),
+        ("legacy matrix is dense", isinstance(legacy_X, np.ndarray), True),
+        ("legacy scales full hstack", np.allclose(legacy_X, legacy_reference), True),
+        ("legacy predictions kept", legacy_predictions == reference_predictions, True),
+        ("sparse layout persisted", reloaded.feature_layout, 'sparse'),
+        ("sparse matrix is CSR", sp.isspmatrix_csr(sparse_X), True),
+        ("sparse scales structured only", np.allclose(sparse_X.toarray(), sparse_reference), True),
+        ("CSR predicts as dense", sparse_predictions == dense_predictions, True),
+    ]
+
+    passed = 0
+    for name, got, expected in checks:
+        status = "✅" if got == expected else "❌"
+        passed += got == expected
+        print(f"  {status} {name:<30} -> {got}")
+
+    print(f"\n📊 Results: {passed}/{len(checks)} passed")
+
+if __name__ == "__main__":
+    test_feature_layout()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test Online Feedback Learning: Correction Log, Incremental Updates, Blend Ramp and Base-Version Reset
+"""
+
+import json
+import os
+import tempfile
+
+from ml_category_predictor import MLCategoryPredictor
+from ml_feedback_learner import CategoryFeedbackLearner
+from ml_model_registry import ModelRegistry, PredictorHandle
+
+CORRECTIONS = [
+    ("Blue Bottle Coffee latte 5.25", "Dining", "Blue Bottle"),
+    ("Chevron fuel pump 4 42.10", "Transportation", "Chevron"),
+    ("AMC Theatres 2 tickets 31.00", "Entertainment", "AMC"),
+    ("Office lunch reimbursable 18.00", "Reimbursable Meals", None),
+    ("Safeway groceries 64.32", "Groceries", "Safeway"),
+    ("Lyft ride downtown 14.80", "Transportation", "Lyft"),
+]
+
+def record(learner: CategoryFeedbackLearner, corrections):
+    for raw_text, category, merchant in corrections:
+        learner.record_correction(raw_text, category, merchant=merchant, predicted_category='Shopping')
+
+def test_feedback_learner():
+    """Test that corrections are logged, learned once each and reset with a new base model"""
+
+    print("🧪 Testing Feedback Learner")
+    print("=" * 60)
+
+    work_dir = tempfile.mkdtemp()
+    predictor = MLCategoryPredictor()
+    handle = PredictorHandle(predictor, ModelRegistry(f"{work_dir}/registry"))
+    learner = CategoryFeedbackLearner(handle, feedback_dir=f"{work_dir}/feedback",
+                                      min_batch_size=3, max_blend_weight=0.6, blend_ramp=10)
+
+    # Four corrections, one to a category the model does not know
+    record(learner, CORRECTIONS[:4])
+    with open(learner.corrections_path) as f:
+        logged = [json.loads(line) for line in f]
+    first = learner.update_model()
+    first_model = predictor.online_state[0]
+    print(f"First update:  {first}")
+
+    # Two more: below the batch size until forced, then only the new lines are read
+    record(learner, CORRECTIONS[4:])
+    below_batch = learner.update_model()
+    second = learner.update_model(force=True)
+    online_model, blend_weight, version = predictor.online_state
+    print(f"Second update: {second}")
+
+    # A restart re-publishes the latest version for the same base model
+    restarted_predictor = MLCategoryPredictor()
+    CategoryFeedbackLearner(PredictorHandle(restarted_predictor, handle.registry),
+                            feedback_dir=f"{work_dir}/feedback", min_batch_size=3, blend_ramp=10)
+
+    # A promoted base model starts the online model over
+    promoted = MLCategoryPredictor()
+    promoted.registry_version = 2
+    handle.swap(promoted)
+    record(learner, CORRECTIONS[:3])
+    after_promotion = learner.update_model()
+    print(f"After promotion: {after_promotion}")
+
+    checks = [
+        ("every correction logged", len(logged), 4),
+        ("log carries features", all(entry['features'] and entry['corrected_category'] for entry in logged), True),
+        ("unknown category skipped", (first['learned'], first['skipped_unknown_category']), (3, 1)),
+        ("first version published", (first['version'], first_model is not None), (1, True)),
+        ("waits for a full batch", below_batch, None),
+        ("only new lines learned", (second['learned'], second['samples_learned']), (2, 5)),
+        ("cursor at end of log", learner._state['consumed_offset'], os.path.getsize(learner.corrections_path)),
+        ("model updated, not refit", online_model.t_ > first_model.t_ and online_model is not first_model, True),
+        ("blend ramps with samples", (round(first['blend_weight'], 3), round(blend_weight, 3)), (0.138, 0.2)),
+        ("published version", version, 2),
+        ("restart restores version", restarted_predictor.online_state[2], 2),
+        ("promotion resets samples", (after_promotion['samples_learned'], after_promotion['blend_weight']), (3, 0.138)),
+        ("fresh model for new base", promoted.online_state[0] is not online_model, True),
+        ("old base left alone", predictor.online_state[2], 2),
+    ]
+
+    passed = 0
+    for name, got, expected in checks:
+        status = "✅" if got == expected else "❌"
+        passed += got == expected
+        print(f"  {status} {name:<26} -> {got}")
+
+    print(f"\n📊 Results: {passed}/{len(checks)} passed")
+
+if __name__ == "__main__":
+    test_feedback_learner()
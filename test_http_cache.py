@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Test HTTP Caching: ETags, 304s and Per-User Versions
+"""
+
+import asyncio
+import sys
+import tempfile
+from types import SimpleNamespace
+sys.path.append('backend')
+
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from blob_store import hash_file
+from http_cache import UserVersions, http_date
+from progress_events import ProgressBus
+
+class VersionCollection:
+    """Collection stand-in holding cache_versions documents and counting reads"""
+
+    def __init__(self):
+        self.documents = {}
+        self.reads = 0
+
+    async def find_one(self, query, projection=None):
+        self.reads += 1
+        return self.documents.get(query['user_id'])
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        document = self.documents.setdefault(query['user_id'], {'version': 0})
+        document['version'] += update['$inc']['version']
+        document.update(update['$set'])
+        return dict(document)
+
+class ReceiptCollection:
+    """Collection stand-in holding receipt documents by id and counting lookups"""
+
+    def __init__(self, documents):
+        self.documents = {document['id']: document for document in documents}
+        self.lookups = 0
+
+    async def find_one(self, query, projection=None):
+        self.lookups += 1
+        return dict(self.documents[query['id']]) if query['id'] in self.documents else None
+
+    async def update_one(self, query, update):
+        self.documents[query['id']].update(update['$set'])
+
+def make_request(path: str, headers: dict = None) -> Request:
+    raw_headers = [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    return Request({'type': 'http', 'method': 'GET', 'path': path, 'headers': raw_headers, 'query_string': b''})
+
+async def dashboard_session(server):
+    builds = []
+
+    async def build():
+        builds.append(1)
+        return b'[{"id":"r1"}]'
+
+    key = ("receipts", 0, 100, None, None)
+    first = await server.cached_json_response(make_request('/api/receipts'), 'user-1', key, build)
+    etag = first.headers['etag']
+    reads_after_first = server.user_versions.collection.reads
+
+    repeat = await server.cached_json_response(make_request('/api/receipts', {'If-None-Match': etag}), 'user-1', key, build)
+    new_tab = await server.cached_json_response(make_request('/api/receipts'), 'user-1', key, build)
+    by_date = await server.cached_json_response(
+        make_request('/api/receipts', {'If-Modified-Since': first.headers['last-modified']}), 'user-1', key, build)
+
+    await server.user_versions.bump('user-1')
+    after_write = await server.cached_json_response(make_request('/api/receipts', {'If-None-Match': etag}), 'user-1', key, build)
+
+    return {
+        'statuses': [first.status_code, repeat.status_code, new_tab.status_code, by_date.status_code, after_write.status_code],
+        'builds': len(builds),
+        'mongo_reads': server.user_versions.collection.reads,
+        'reads_after_first': reads_after_first,
+        'etag_changed': after_write.headers['etag'] != etag
+    }
+
+async def file_revalidation(server):
+    """Original-file revalidations against the stored content hash"""
+    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as f:
+        f.write(b'receipt bytes')
+    # Stored before content hashing: the first request hashes and records the file
+    receipts = ReceiptCollection([{'id': 'r1', 'user_id': server.PUBLIC_DEMO_USER_ID,
+                                   'original_file_path': f.name, 'filename': 'r1.jpg'}])
+    db, server.db = server.db, SimpleNamespace(receipts=receipts)
+    try:
+        first = await server.get_receipt_file('r1', make_request('/api/receipts/r1/file'))
+        etag = first.headers['etag']
+        repeat = await server.get_receipt_file('r1', make_request('/api/receipts/r1/file', {'If-None-Match': etag}))
+        id_etag = await server.get_receipt_file('r1', make_request('/api/receipts/r1/file', {'If-None-Match': '"file-r1"'}))
+        try:
+            await server.get_receipt_file('gone', make_request('/api/receipts/gone/file', {'If-None-Match': etag}))
+            deleted = 200
+        except HTTPException as e:
+            deleted = e.status_code
+    finally:
+        server.db = db
+
+    return {
+        'statuses': [first.status_code, repeat.status_code, id_etag.status_code, deleted],
+        'etag_is_hash': etag == f'"{hash_file(f.name)}"',
+        'hash_recorded': receipts.documents['r1'].get('content_hash') == hash_file(f.name),
+        'lookups': receipts.lookups
+    }
+
+async def other_worker_bump():
+    """A bump on one worker reaches another worker's versions through the bus"""
+    collection = VersionCollection()
+    bus = ProgressBus()
+    local, remote = UserVersions(collection, bus), UserVersions(collection)
+    before = await local.current('user-1')
+    version = await remote.bump('user-1')
+    bus.publish(['cache_versions'], 'version', {'user_id': 'user-1', 'version': version,
+                                                'modified_at': '2024-06-01T00:00:00+00:00'}, relay=False)
+    return before[0], (await local.current('user-1'))[0]
+
+def test_http_cache():
+    """Test conditional GETs answered from memory and invalidation on writes"""
+
+    print("🧪 Testing HTTP Caching")
+    print("=" * 60)
+
+    import server
+    server.user_versions = UserVersions(VersionCollection())
+    session = asyncio.run(dashboard_session(server))
+    print(f"Session: {session}")
+
+    files = asyncio.run(file_revalidation(server))
+    print(f"Files: {files}")
+    versions_seen = asyncio.run(other_worker_bump())
+
+    checks = [
+        ("200, 304, cached 200, 304, 200", session['statuses'], [200, 304, 200, 304, 200]),
+        ("body built once per version", session['builds'], 2),
+        ("one version read total", session['mongo_reads'], 1),
+        ("etag changes on write", session['etag_changed'], True),
+        ("file: 200, 304, 200, 404", files['statuses'], [200, 304, 200, 404]),
+        ("file etag is content hash", (files['etag_is_hash'], files['hash_recorded']), (True, True)),
+        ("file looked up every time", files['lookups'], 4),
+        ("version relayed", versions_seen, (0, 1)),
+    ]
+
+    passed = 0
+    for name, got, expected in checks:
+        status = "✅" if got == expected else "❌"
+        passed += got == expected
+        print(f"  {status} {name:<32} -> {got}")
+
+    print(f"\n📊 Results: {passed}/{len(checks)} passed")
+
+if __name__ == "__main__":
+    test_http_cache()
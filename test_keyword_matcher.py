@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test Compiled Keyword Matching and Feature Memo Against the Per-Keyword Scan
+"""
+
+import json
+
+from ml_category_predictor import TransactionFeatureExtractor
+
+class PerKeywordExtractor(TransactionFeatureExtractor):
+    """Reference extractor: one `keyword in text` check per keyword and no memo"""
+
+    def __init__(self):
+        super().__init__(memo_size=0)
+        self._all_keywords = {keyword for family in (self.merchant_categories, self.category_keywords)
+                              for keywords in family.values() for keyword in keywords}
+        self._all_keywords.update(self.payment_methods, self.transaction_types, self.recurring_keywords,
+                                  self.balance_keywords, self.promotion_keywords)
+
+    def _scan_keywords(self, text_lower: str) -> frozenset:
+        return frozenset(keyword for keyword in self._all_keywords if keyword in text_lower)
+
+def variants(example):
+    """The example plus rewrites that put keywords next to each other and inside other words"""
+    text = example['raw_text']
+    merchant = example.get('key_merchant')
+    yield text, merchant
+    yield text.upper(), merchant.upper() if merchant else None
+    yield text.replace(' ', ''), merchant
+    yield f"{text} auto-pay autopay balance bal subscriptions reordered", None
+    yield text[len(text) // 3:], merchant
+
+def extract_all(extractor, dataset):
+    return [
+        extractor.extract_features(raw_text, amount=example.get('true_amount'),
+                                   merchant=merchant, date_str=example.get('true_date'))
+        for example in dataset
+        for raw_text, merchant in variants(example)
+    ]
+
+def test_keyword_matcher():
+    """Test that the keyword trie and the memo give the features of the per-keyword scan"""
+
+    print("🧪 Testing Keyword Matcher")
+    print("=" * 60)
+
+    with open('synthetic_training_dataset.json') as f:
+        dataset = json.load(f)
+
+    reference = extract_all(PerKeywordExtractor(), dataset)
+
+    # Memo large enough to hold everything: the second pass is served from it
+    memoized = TransactionFeatureExtractor()
+    cold = extract_all(memoized, dataset)
+    warm = extract_all(memoized, dataset)
+
+    # Memo far smaller than the inputs: entries are evicted and recomputed
+    small = TransactionFeatureExtractor(memo_size=8)
+    evicting = extract_all(small, dataset) + extract_all(small, dataset)
+
+    # Callers may mutate the returned dict without touching the memoized copy
+    first = dataset[0]
+    memoized.extract_features(first['raw_text'], amount=first.get('true_amount'),
+                              merchant=first.get('key_merchant'),
+                              date_str=first.get('true_date'))['text_length'] = -1
+    after_mutation = memoized.extract_features(first['raw_text'], amount=first.get('true_amount'),
+                                               merchant=first.get('key_merchant'),
+                                               date_str=first.get('true_date'))
+
+    mismatches = [i for i, (got, expected) in enumerate(zip(cold, reference)) if got != expected]
+    print(f"Inputs: {len(reference)}, mismatches: {mismatches[:5]}")
+
+    checks = [
+        ("inputs compared", len(cold), len(dataset) * 5),
+        ("trie equals per-keyword", mismatches, []),
+        ("memo hits equal reference", warm == reference, True),
+        ("memo bounded", (len(memoized._memo) <= memoized.memo_size, len(small._memo)), (True, 8)),
+        ("eviction equals reference", evicting == reference + reference, True),
+        ("returned copy isolated", after_mutation == reference[0], True),
+    ]
+
+    passed = 0
+    for name, got, expected in checks:
+        status = "✅" if got == expected else "❌"
+        passed += got == expected
+        print(f"  {status} {name:<26} -> {got}")
+
+    print(f"\n📊 Results: {passed}/{len(checks)} passed")
+
+if __name__ == "__main__":
+    test_keyword_matcher()
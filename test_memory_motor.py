@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test In-Memory Motor Stand-In: Queries, Updates, Bulk Writes and Aggregations
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import OperationFailure
+
+from memory_motor import MemoryMotorClient
+
+async def exercise_collection():
+    db = MemoryMotorClient("mongodb://unused")["lumina_test"]
+    start = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    await db.receipts.insert_many([
+        {"id": f"r{i}", "user_id": "u1" if i < 8 else "u2", "merchant_name": name,
+         "category": "Food" if i % 2 else "Shopping", "upload_date": start + timedelta(days=i),
+         "items": [{"description": "COFFEE"}]}
+        for i, name in enumerate(["Starbucks", "Walmart", "Target", "Starbucks Reserve",
+                                  "Costco", "CVS", "Safeway", "Target", "Starbucks", "Walmart"])
+    ])
+
+    results = {}
+    cursor = db.receipts.find({"user_id": "u1"}, {"_id": 0, "id": 1}).sort("upload_date", -1).skip(1).limit(3)
+    results["sort skip limit"] = [d["id"] for d in await cursor.to_list(length=None)]
+    results["regex search"] = sorted(d["id"] for d in await db.receipts.find(
+        {"user_id": "u1", "$or": [{"merchant_name": {"$regex": "starbucks", "$options": "i"}},
+                                  {"filename": {"$regex": "starbucks", "$options": "i"}}]}).to_list(None))
+    results["date range"] = await db.receipts.count_documents(
+        {"upload_date": {"$gte": start + timedelta(days=2), "$lte": start + timedelta(days=4)}})
+    stored = await db.receipts.find_one({"id": "r0"})
+    results["dates stored naive utc"] = stored["upload_date"] == datetime(2024, 3, 1)
+
+    await db.receipts.update_one({"id": "r1"}, {"$set": {"category": "Travel"}, "$inc": {"views": 2}})
+    results["update"] = await db.receipts.find_one({"id": "r1"}, {"_id": 0, "category": 1, "views": 1})
+    stored["category"] = "Changed by caller"
+    results["reads are copies"] = (await db.receipts.find_one({"id": "r0"}))["category"]
+
+    versions = db.cache_versions
+    first = await versions.find_one_and_update({"user_id": "u1"}, {"$inc": {"version": 1}},
+                                               upsert=True, return_document=ReturnDocument.AFTER)
+    second = await versions.find_one_and_update({"user_id": "u1"}, {"$inc": {"version": 1}},
+                                                upsert=True, return_document=ReturnDocument.AFTER)
+    results["upsert then update"] = (first["version"], second["version"], await versions.count_documents({}))
+
+    await db.blobs.bulk_write([
+        UpdateOne({"_id": key}, {"$inc": {"refs": 1}, "$setOnInsert": {"size": 100}}, upsert=True)
+        for key in ["a", "b", "a"]
+    ])
+    results["bulk upsert"] = sorted((d["_id"], d["refs"], d["size"]) for d in await db.blobs.find().to_list(None))
+
+    results["group"] = await db.receipts.aggregate([
+        {"$match": {"user_id": "u1"}},
+        {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}}
+    ]).to_list(length=None)
+
+    deleted = await db.receipts.delete_one({"merchant_name": "Target"})
+    results["delete one"] = (deleted.deleted_count, await db.receipts.count_documents({"merchant_name": "Target"}))
+
+    try:
+        db.progress_events.watch([])
+        results["change streams"] = "supported"
+    except OperationFailure:
+        results["change streams"] = "unsupported"
+    results["ping"] = await db.command("ping")
+    return results
+
+def test_memory_motor():
+    """Test that the stand-in answers the server's queries the way MongoDB would"""
+
+    print("🧪 Testing In-Memory Motor Stand-In")
+    print("=" * 60)
+
+    results = asyncio.run(exercise_collection())
+    for name, value in results.items():
+        print(f"  {name}: {value}")
+
+    checks = [
+        ("sort, skip and limit", results["sort skip limit"], ["r6", "r5", "r4"]),
+        ("case-insensitive $or regex", results["regex search"], ["r0", "r3"]),
+        ("date range", results["date range"], 3),
+        ("aware dates stored as naive UTC", results["dates stored naive utc"], True),
+        ("$set and $inc", results["update"], {"category": "Travel", "views": 2}),
+        ("reads are copies", results["reads are copies"], "Shopping"),
+        ("upsert then update", results["upsert then update"], (1, 2, 1)),
+        ("bulk upsert with $setOnInsert", results["bulk upsert"], [("a", 2, 100), ("b", 1, 100)]),
+        ("group and sort", results["group"], [{"_id": "Shopping", "count": 4}, {"_id": "Food", "count": 3}, {"_id": "Travel", "count": 1}]),
+        ("delete one", results["delete one"], (1, 1)),
+        ("change streams like standalone", results["change streams"], "unsupported"),
+        ("ping", results["ping"], {"ok": 1.0}),
+    ]
+
+    passed = 0
+    for name, got, expected in checks:
+        status = "✅" if got == expected else "❌"
+        passed += got == expected
+        print(f"  {status} {name:<32} -> {got}")
+
+    print(f"\n📊 Results: {passed}/{len(checks)} passed")
+
+if __name__ == "__main__":
+    test_memory_motor()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test Fuzzy Merchant Resolver
+"""
+
+import random
+import string
+import time
+
+from merchant_gazetteer import MerchantGazetteer
+from merchant_resolver import FuzzyMerchantResolver, RAPIDFUZZ_AVAILABLE
+
+def test_merchant_resolver():
+    """Test OCR-noise robustness and resolution speed at 50k merchants"""
+    
+    print("🧪 Testing Fuzzy Merchant Resolver")
+    print("=" * 60)
+    
+    resolver = FuzzyMerchantResolver(MerchantGazetteer.load())
+    
+    test_cases = [
+        ("WAL MART SUPERCENTER #1234", 'walmart'),
+        ("Starbueks Coffee 8.45", 'starbucks'),
+        ("McD0NALDS #55 DRIVE THRU", 'mcdonalds'),
+        ("C0STC0 WH0LESALE #12", 'costco'),
+        ("Targat store 0042", 'target'),
+        ("WALGREENS #3321", 'walgreens'),
+        ("Totally unrelated header text", None),
+        ("Thank you for shopping", None),
+        ("Fresh Market\nShel1 pasta 4.50", None),
+        ("SHE1L GAS\n#4411", 'shell'),
+    ]
+    
+    passed = 0
+    for text, expected in test_cases:
+        match = resolver.resolve(text)
+        merchant_id = match.merchant_id if match else None
+        status = "✅" if merchant_id == expected else "❌"
+        passed += merchant_id == expected
+        score = f"{match.score:.2f}" if match else "-"
+        print(f"  {status} {text.replace(chr(10), ' | '):<32} -> {match.name if match else None} (score: {score})")
+    
+    print(f"\n📊 Results: {passed}/{len(test_cases)} passed")
+    
+    # Timing at 50k merchants with receipts drawn from a realistic repeat pattern:
+    # a fixed set of stores, each with its own OCR misreading and header words
+    rnd = random.Random(7)
+    word = lambda k: ''.join(rnd.choices(string.ascii_lowercase, k=k))
+    gazetteer = MerchantGazetteer.load()
+    for i in range(50000):
+        gazetteer.add_merchant(f"synthetic_{i}", f"{word(rnd.randint(4, 9))} {word(rnd.randint(3, 8))}")
+    resolver = FuzzyMerchantResolver(gazetteer)
+    
+    def garble(name):
+        chars = list(name.lower())
+        chars[rnd.randrange(len(chars))] = rnd.choice(string.ascii_lowercase)
+        return ''.join(chars)
+    
+    names = list(gazetteer.merchants.values())
+    stores = [f"{garble(rnd.choice(names))} {word(6)} {word(7)}" for _ in range(2000)]
+    receipts = [f"{rnd.choice(stores)} #{rnd.randint(1, 999)} total {rnd.randint(1, 99)}.{rnd.randint(10, 99)}"
+                for _ in range(20000)]
+    
+    start_time = time.perf_counter()
+    for receipt in receipts:
+        resolver.resolve(receipt)
+    elapsed = (time.perf_counter() - start_time) / len(receipts) * 1e6
+    
+    # Cold path: eight header words never seen before, so every word is searched
+    headers = [' '.join(word(rnd.randint(4, 9)) for _ in range(8)) for _ in range(3000)]
+    cold_resolver = FuzzyMerchantResolver(gazetteer)
+    start_time = time.perf_counter()
+    for header in headers:
+        cold_resolver.resolve(header)
+    cold_elapsed = (time.perf_counter() - start_time) / len(headers) * 1e6
+    
+    print(f"\n⏱️ {len(gazetteer.merchants)} merchants, rapidfuzz: {RAPIDFUZZ_AVAILABLE}")
+    print(f"  {elapsed:.1f} µs per receipt over {len(receipts)} receipts from {len(stores)} stores")
+    print(f"  cache: {resolver.cache_info()}")
+    print(f"  {cold_elapsed:.1f} µs per uncached 8-word header over {len(headers)} headers")
+
+if __name__ == "__main__":
+    test_merchant_resolver()
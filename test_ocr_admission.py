@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test OCR Admission Control Under a Burst of Uploads
+"""
+
+import asyncio
+import sys
+import time
+sys.path.append('backend')
+
+from ocr_admission import OCRAdmissionController, AdmissionRejected
+
+async def simulate_burst(controller: OCRAdmissionController, requests: int, work_seconds: float):
+    peak = 0
+    outcomes = []
+
+    async def upload(i: int):
+        nonlocal peak
+        start = time.perf_counter()
+        try:
+            async with controller.admit():
+                peak = max(peak, controller.in_flight)
+                await asyncio.sleep(work_seconds)
+            outcomes.append(('ok', time.perf_counter() - start, None))
+        except AdmissionRejected as e:
+            outcomes.append(('rejected', time.perf_counter() - start, e.retry_after))
+
+    await asyncio.gather(*(upload(i) for i in range(requests)))
+    return outcomes, peak
+
+def test_ocr_admission():
+    """Test slot limit, bounded queue, wait timeout and fast rejection"""
+
+    print("🧪 Testing OCR Admission Control")
+    print("=" * 60)
+
+    controller = OCRAdmissionController(max_in_flight=2, max_queue=6, max_wait_seconds=0.25)
+    outcomes, peak = asyncio.run(simulate_burst(controller, requests=50, work_seconds=0.1))
+
+    completed = [latency for kind, latency, _ in outcomes if kind == 'ok']
+    rejected = [(latency, retry) for kind, latency, retry in outcomes if kind == 'rejected']
+    status = controller.get_status()
+
+    print(f"Completed: {len(completed)}, rejected: {len(rejected)}, peak in flight: {peak}")
+    print(f"Status: {status}")
+
+    checks = [
+        ("peak in flight <= limit", peak <= 2, True),
+        ("burst beyond queue rejected", status['rejected_full'], 42),
+        ("queued past max wait rejected", status['rejected_timeout'] > 0, True),
+        ("full-queue rejections are fast", max(latency for latency, _ in rejected[:40]) < 0.05, True),
+        ("rejections carry Retry-After", all(retry >= 1 for _, retry in rejected), True),
+        ("completed within max wait + work", max(completed) < 0.25 + 0.1 + 0.05, True),
+        ("slots all released", (status['in_flight'], status['queued']), (0, 0)),
+    ]
+
+    passed = 0
+    for name, got, expected in checks:
+        ok = got == expected
+        passed += ok
+        print(f"  {'✅' if ok else '❌'} {name:<34} -> {got}")
+
+    print(f"\n📊 Results: {passed}/{len(checks)} passed")
+
+if __name__ == "__main__":
+    test_ocr_admission()
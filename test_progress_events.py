@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test Receipt Processing Progress Events (SSE)
+"""
+
+import asyncio
+import json
+import sys
+sys.path.append('backend')
+
+from progress_events import ProgressBus, MongoProgressRelay, format_sse, receipt_topic, batch_topic
+from test_pdf_text_layer import create_mixed_pdf
+
+class ConnectedRequest:
+    """Request whose client never disconnects"""
+    async def is_disconnected(self):
+        return False
+
+def parse_sse(chunks):
+    return [json.loads(line[6:]) for chunk in chunks for line in chunk.splitlines() if line.startswith('data: ')]
+
+async def stream_receipt(server, pdf_path):
+    """Subscribe to a receipt's stream, then process it the way an upload does"""
+    receipt_id = 'receipt-1'
+    finished = lambda event: event['stage'] in ('completed', 'failed')
+    snapshot = {'seq': 0, 'type': 'stage', 'receipt_id': receipt_id, 'stage': 'queued'}
+    body = server.stream_progress(ConnectedRequest(), receipt_topic(receipt_id), snapshot, finished)
+
+    chunks = [await body.__anext__()]
+    collector = asyncio.create_task(collect(body, chunks))
+
+    result = await server.ocr_processor.process_receipt_file(
+        pdf_path, is_pdf=True, on_stage=lambda stage: server.publish_receipt_stage(receipt_id, stage, 'batch-1')
+    )
+    server.publish_receipt_result(receipt_id, server.build_receipt_update(result, 'Auto-Detect'), 'batch-1')
+    await asyncio.wait_for(collector, 1)
+    return chunks
+
+async def collect(body, chunks):
+    async for chunk in body:
+        chunks.append(chunk)
+
+async def slow_consumer():
+    bus = ProgressBus(buffer_size=3)
+    async with bus.subscribe([batch_topic('b')]) as queue:
+        for i in range(10):
+            bus.publish([batch_topic('b')], 'batch', {'completed': i})
+        drained = [queue.get_nowait()['completed'] for _ in range(queue.qsize())]
+    return drained, bus.subscriber_count
+
+class EventCollection:
+    """Collection stand-in recording relayed inserts"""
+
+    def __init__(self):
+        self.documents = []
+
+    async def insert_one(self, document):
+        self.documents.append(document)
+
+async def relayed_events():
+    """Events one worker writes for the others while a batch of two receipts runs"""
+    bus = ProgressBus()
+    collection = EventCollection()
+    relay = MongoProgressRelay(bus, collection, topics=['cache_versions'])
+    bus.relay = relay
+    for receipt_id in ('r1', 'r2'):
+        for stage in ('queued', 'ocr', 'parsing', 'categorized', 'completed'):
+            bus.publish([receipt_topic(receipt_id), batch_topic('b')], 'stage', {'receipt_id': receipt_id, 'stage': stage})
+        bus.publish([batch_topic('b')], 'batch', {'status': 'processing', 'completed': 1})
+        bus.publish(['cache_versions'], 'version', {'user_id': 'u', 'version': 1})
+    bus.publish([batch_topic('b')], 'batch', {'status': 'completed', 'completed': 2})
+    bus.publish([receipt_topic('r3')], 'stage', {'receipt_id': 'r3', 'stage': 'failed'}, relay=False)
+    await asyncio.gather(*relay._pending)
+    return [(document['type'], document['data'].get('stage') or document['data'].get('status'))
+            for document in collection.documents]
+
+def test_progress_events():
+    """Test stage order, final summary, late-joiner state and bounded buffers"""
+
+    print("🧪 Testing Progress Events")
+    print("=" * 60)
+
+    import server
+
+    pdf_path = "/tmp/lumina_progress_receipt.pdf"
+    create_mixed_pdf(pdf_path)
+    events = parse_sse(asyncio.run(stream_receipt(server, pdf_path)))
+    stages = [event['stage'] for event in events]
+    print(f"Stages: {stages}")
+    print(f"Final event: {events[-1]}")
+
+    late = server.progress_bus.latest(batch_topic('batch-1'))
+    drained, subscribers = asyncio.run(slow_consumer())
+    message = format_sse({'seq': 7, 'type': 'stage', 'stage': 'ocr'})
+    relayed = asyncio.run(relayed_events())
+    print(f"Relayed: {relayed}")
+
+    checks = [
+        ("stage order", stages, ['queued', 'ocr', 'parsing', 'categorized', 'completed']),
+        ("summary in final event", (events[-1]['merchant_name'], events[-1]['total_amount']), ('Netflix', '$17.27')),
+        ("batch topic has latest", late['stage'] if late else None, 'completed'),
+        ("slow consumer keeps newest", drained, [7, 8, 9]),
+        ("unsubscribed on exit", subscribers, 0),
+        ("sse framing", message.split('\n')[:2], ['id: 7', 'event: stage']),
+        ("relay skips progress", relayed, [('stage', 'completed'), ('version', None), ('stage', 'completed'),
+                                           ('version', None), ('batch', 'completed')]),
+    ]
+
+    passed = 0
+    for name, got, expected in checks:
+        status = "✅" if got == expected else "❌"
+        passed += got == expected
+        print(f"  {status} {name:<26} -> {got}")
+
+    print(f"\n📊 Results: {passed}/{len(checks)} passed")
+
+if __name__ == "__main__":
+    test_progress_events()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test Layout-Aware Receipt Parsing
+"""
+
+import sys
+sys.path.append('backend')
+
+from receipt_layout import parse_receipt_layout
+
+def box(x0, y0, x1, y1):
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+
+def test_receipt_layout():
+    """Test line grouping, item extraction and totals from EasyOCR-style boxes"""
+
+    print("🧪 Testing Layout-Aware Receipt Parsing")
+    print("=" * 60)
+
+    # Boxes deliberately out of reading order, with slight vertical jitter
+    ocr_results = [
+        (box(300, 182, 360, 200), "4.50", 0.93),
+        (box(20, 20, 200, 40), "TRADER JOE'S", 0.97),
+        (box(20, 50, 150, 68), "Date: 2024-03-12", 0.91),
+        (box(20, 100, 140, 118), "BANANAS", 0.95),
+        (box(302, 101, 360, 119), "1.29", 0.94),
+        (box(20, 140, 180, 158), "ORGANIC MILK", 0.92),
+        (box(300, 139, 360, 157), "$5.99", 0.96),
+        (box(20, 180, 150, 198), "SOURDOUGH", 0.90),
+        (box(20, 240, 120, 258), "SUBTOTAL", 0.95),
+        (box(296, 240, 360, 258), "11.78", 0.95),
+        (box(20, 270, 120, 288), "TAX", 0.95),
+        (box(304, 270, 360, 288), "0.94", 0.95),
+        (box(20, 300, 120, 318), "TOTAL", 0.97),
+        (box(296, 300, 360, 318), "12.72", 0.97),
+        (box(20, 330, 120, 348), "VISA", 0.95),
+        (box(296, 330, 360, 348), "12.72", 0.95),
+        (box(20, 360, 200, 378), "CHANGE DUE 0.00", 0.95),
+        (box(150, 400, 200, 410), "smudge", 0.1),
+    ]
+
+    layout = parse_receipt_layout([ocr_results])
+
+    print("Lines:")
+    for line in layout.lines:
+        print(f"  [{line.kind:<8}] {line.text}")
+
+    checks = [
+        ("line count", len(layout.lines), 10),
+        ("items", [(item['description'], item['amount']) for item in layout.items],
+         [('BANANAS', 1.29), ('ORGANIC MILK', 5.99), ('SOURDOUGH', 4.50)]),
+        ("subtotal", layout.subtotal, 11.78),
+        ("tax", layout.tax, 0.94),
+        ("total", layout.total, 12.72),
+        ("date", layout.date, '2024-03-12'),
+        ("first line", layout.lines[0].text, "TRADER JOE'S"),
+    ]
+
+    # Second page continues below the first; merged tokens ("TOTAL 8.00") are split
+    two_pages = parse_receipt_layout([
+        [(box(20, 20, 120, 38), "COFFEE", 0.9), (box(200, 20, 250, 38), "3.00", 0.9)],
+        [(box(20, 20, 250, 38), "TOTAL 3.00", 0.9)],
+    ])
+    checks.append(("two pages", (len(two_pages.lines), len(two_pages.items), two_pages.total), (2, 1, 3.0)))
+    checks.append(("empty", parse_receipt_layout([[]]).total, None))
+
+    # Summary lines that mention a total without being one, and a balance printed after payment
+    labels = [("COFFEE BEANS", "40.00"), ("SUBTOTAL", "40.00"), ("TOTAL DISCOUNT", "60.00"), ("TOTAL", "43.20"),
+              ("CASH TENDERED", "100.00"), ("CHANGE", "56.80"), ("TOTAL SAVINGS", "60.00"),
+              ("TOTAL ITEMS SOLD", "2.00"), ("BALANCE DUE", "0.00")]
+    savings = parse_receipt_layout([[
+        token for i, (label, amount) in enumerate(labels)
+        for token in ((box(20, 30 * i, 200, 30 * i + 18), label, 0.9), (box(300, 30 * i, 360, 30 * i + 18), amount, 0.9))
+    ]])
+    print("Savings receipt:")
+    for line in savings.lines:
+        print(f"  [{line.kind:<8}] {line.text}")
+    checks += [
+        ("savings kinds", [line.kind for line in savings.lines],
+         ['item', 'subtotal', 'other', 'total', 'payment', 'payment', 'other', 'other', 'total']),
+        ("total above payment", savings.total, 43.2),
+        ("savings items", [item['description'] for item in savings.items], ['COFFEE BEANS']),
+    ]
+
+    passed = 0
+    for name, got, expected in checks:
+        status = "✅" if got == expected else "❌"
+        passed += got == expected
+        print(f"  {status} {name:<20} -> {got}")
+
+    print(f"\n📊 Results: {passed}/{len(checks)} passed")
+
+if __name__ == "__main__":
+    test_receipt_layout()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test Coalesced Receipt Status Writes
+"""
+
+import asyncio
+import sys
+import time
+sys.path.append('backend')
+
+from pymongo.errors import BulkWriteError, WriteError
+
+from receipt_store import BulkWriter
+
+class RecordingCollection:
+    """Collection stand-in that applies UpdateOne $set/$inc to dicts and counts round trips"""
+
+    def __init__(self):
+        self.documents = {}
+        self.bulk_calls = []
+
+    async def bulk_write(self, operations, ordered=True):
+        await asyncio.sleep(0.002)
+        self.bulk_calls.append(len(operations))
+        for operation in operations:
+            document = self.documents.setdefault(operation._filter['id'], {})
+            document.update(operation._doc.get('$set', {}))
+            for field, amount in operation._doc.get('$inc', {}).items():
+                document[field] = document.get(field, 0) + amount
+
+class RejectingCollection(RecordingCollection):
+    """Collection stand-in whose unordered bulk_write rejects the documents in `rejected`"""
+
+    def __init__(self, rejected):
+        super().__init__()
+        self.rejected = rejected
+
+    async def bulk_write(self, operations, ordered=True):
+        accepted = [op for op in operations if op._filter['id'] not in self.rejected]
+        await super().bulk_write(accepted, ordered)
+        errors = [{'index': i, 'code': 121, 'errmsg': 'Document failed validation'}
+                  for i, op in enumerate(operations) if op._filter['id'] in self.rejected]
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'writeConcernErrors': [], 'nInserted': 0})
+
+async def partial_failure():
+    """One bad document in a flush fails only its own callers"""
+    collection = RejectingCollection({"r3"})
+    writer = BulkWriter(collection, interval_ms=10)
+    futures = {f"r{i}": writer.set(f"r{i}", {"processing_status": "completed"}) for i in range(6)}
+    await asyncio.gather(*futures.values(), return_exceptions=True)
+    failed = sorted(key for key, future in futures.items() if future.exception() is not None)
+    return collection, failed, type(futures["r3"].exception())
+
+async def many_workers(receipts: int, workers: int):
+    """Workers finishing receipts of one batch, each writing its result and bumping the batch counter"""
+    receipt_collection, batch_collection = RecordingCollection(), RecordingCollection()
+    receipt_writer = BulkWriter(receipt_collection, interval_ms=20, max_batch=100)
+    batch_writer = BulkWriter(batch_collection, interval_ms=20)
+    queue = list(range(receipts))
+
+    async def worker():
+        while queue:
+            receipt = queue.pop()
+            await asyncio.sleep(0.001)  # OCR
+            await asyncio.gather(
+                receipt_writer.set(f"r{receipt}", {"processing_status": "completed", "total": receipt}),
+                batch_writer.inc("batch-1", {"completed": 1})
+            )
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    await receipt_writer.close()
+    await batch_writer.close()
+    return receipt_collection, batch_collection, time.perf_counter() - start
+
+def test_receipt_store():
+    """Test that concurrent status updates become few bulk writes without losing any"""
+
+    print("🧪 Testing Receipt Store Bulk Writer")
+    print("=" * 60)
+
+    receipts, batches, elapsed = asyncio.run(many_workers(receipts=1000, workers=50))
+    rejecting, failed, error_type = asyncio.run(partial_failure())
+
+    print(f"1000 receipt updates -> {len(receipts.bulk_calls)} bulk_write calls {receipts.bulk_calls[:8]}...")
+    print(f"1000 counter bumps   -> {len(batches.bulk_calls)} bulk_write calls")
+    print(f"Elapsed: {elapsed:.2f}s")
+
+    checks = [
+        ("every receipt written", len(receipts.documents), 1000),
+        ("fields intact", receipts.documents["r42"], {"processing_status": "completed", "total": 42}),
+        ("counter adds up", batches.documents["batch-1"]["completed"], 1000),
+        ("receipt writes coalesced", len(receipts.bulk_calls) <= 40, True),
+        ("max_batch respected", max(receipts.bulk_calls) <= 100, True),
+        ("counter writes coalesced", len(batches.bulk_calls) <= 40, True),
+        ("only the bad document fails", (failed, error_type), (["r3"], WriteError)),
+        ("the rest are written", sorted(rejecting.documents), ["r0", "r1", "r2", "r4", "r5"]),
+    ]
+
+    passed = 0
+    for name, got, expected in checks:
+        status = "✅" if got == expected else "❌"
+        passed += got == expected
+        print(f"  {status} {name:<28} -> {got}")
+
+    print(f"\n📊 Results: {passed}/{len(checks)} passed")
+
+if __name__ == "__main__":
+    test_receipt_store()
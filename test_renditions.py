@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test Receipt Thumbnail and Preview Renditions
+"""
+
+import os
+import shutil
+import sys
+import time
+sys.path.append('backend')
+
+import numpy as np
+from PIL import Image
+
+from renditions import RenditionService
+from blob_store import hash_file
+from test_pdf_text_layer import create_mixed_pdf
+
+def create_photo(path: str):
+    """Phone-camera-sized receipt photo"""
+    rng = np.random.default_rng(3)
+    pixels = rng.integers(180, 255, size=(4000, 3000, 3), dtype=np.uint8)
+    pixels[400:3600:60, 300:2700] = 30  # text-like rows
+    Image.fromarray(pixels).save(path, quality=92)
+
+def test_renditions():
+    """Test thumbnail size, format, content-hash naming and PDF first-page previews"""
+
+    print("🧪 Testing Renditions")
+    print("=" * 60)
+
+    cache_dir = "/tmp/lumina_renditions"
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    service = RenditionService(cache_dir=cache_dir, image_format='webp')
+
+    photo = "/tmp/lumina_rendition_photo.jpg"
+    copy = "/tmp/lumina_rendition_photo_copy.jpg"
+    pdf = "/tmp/lumina_rendition_receipt.pdf"
+    create_photo(photo)
+    shutil.copy(photo, copy)
+    create_mixed_pdf(pdf)
+
+    photo_hash = hash_file(photo)
+    start = time.perf_counter()
+    thumb = service.render(photo, photo_hash, 'thumb')
+    render_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    cached = service.render(copy, hash_file(copy), 'thumb')
+    cached_ms = (time.perf_counter() - start) * 1000
+    preview = service.render(pdf, hash_file(pdf), 'preview')
+
+    thumb_image = Image.open(thumb)
+    preview_image = Image.open(preview)
+    original_kb = os.path.getsize(photo) / 1024
+    thumb_kb = os.path.getsize(thumb) / 1024
+
+    print(f"Photo {original_kb:.0f} KB -> thumb {thumb_kb:.1f} KB {thumb_image.size} in {render_ms:.0f} ms "
+          f"(cached {cached_ms:.2f} ms)")
+    print(f"PDF preview: {preview_image.size}, {os.path.getsize(preview) / 1024:.1f} KB")
+
+    checks = [
+        ("thumb fits 320px", max(thumb_image.size), 320),
+        ("aspect kept", thumb_image.size, (240, 320)),
+        ("webp output", thumb_image.format, 'WEBP'),
+        ("kilobytes not megabytes", thumb_kb < 40, True),
+        ("same content shares file", cached, thumb),
+        ("content-hash name", thumb.name.startswith(photo_hash), True),
+        ("pdf first page preview", (max(preview_image.size), preview_image.format), (1280, 'WEBP')),
+        ("unreadable source", service.render("/tmp/does_not_exist.jpg", "0" * 32, 'thumb'), None),
+    ]
+
+    passed = 0
+    for name, got, expected in checks:
+        status = "✅" if got == expected else "❌"
+        passed += got == expected
+        print(f"  {status} {name:<26} -> {got}")
+
+    print(f"\n📊 Results: {passed}/{len(checks)} passed")
+
+if __name__ == "__main__":
+    test_renditions()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test Shadow Evaluation Scoring: Corrections, Confirmed Acceptances and Agreement
+"""
+
+from ml_model_registry import ShadowEvaluator
+
+class FixedCandidate:
+    """Candidate model answering from a fixed table"""
+
+    def __init__(self, answers):
+        self.answers = answers
+
+    def predict_category(self, raw_text, amount=None, merchant=None, date_str=None):
+        return {'category': self.answers[raw_text]}
+
+def shadow_run(acceptance_window: float):
+    """Primary says Shopping for everything; the candidate gets the five corrected receipts right"""
+    texts = [f"receipt {i}" for i in range(20)]
+    candidate = FixedCandidate({text: 'Dining' if i < 5 else 'Shopping' for i, text in enumerate(texts)})
+    shadow = ShadowEvaluator(candidate, version=2, acceptance_window=acceptance_window)
+    for text in texts:
+        shadow.observe({'raw_text': text}, {'category': 'Shopping'}, 0.001)
+    shadow._executor.shutdown(wait=True)
+    for text in texts[:5]:
+        shadow.record_outcome(text, 'Dining')
+    return shadow.report(min_samples=5)
+
+def test_shadow_evaluation():
+    """Test that uncorrected predictions count only once their acceptance is confirmed"""
+
+    print("🧪 Testing Shadow Evaluation")
+    print("=" * 60)
+
+    fresh = shadow_run(acceptance_window=3600)
+    confirmed = shadow_run(acceptance_window=0)
+    print(f"Within the window: {fresh}")
+    print(f"After the window:  {confirmed}")
+
+    checks = [
+        ("fresh: only corrections labelled", (fresh['samples'], fresh['labelled'], fresh['accepted']), (20, 5, 0)),
+        ("fresh: candidate wins on corrections", (fresh['primary_accuracy'], fresh['candidate_accuracy']), (0.0, 1.0)),
+        ("fresh: corrections alone don't promote", fresh['ready_to_promote'], False),
+        ("agreement reported separately", fresh['agreement_rate'], 0.75),
+        ("confirmed: acceptances labelled", (confirmed['labelled'], confirmed['accepted']), (20, 15)),
+        ("confirmed: accuracies", (confirmed['primary_accuracy'], confirmed['candidate_accuracy']), (0.75, 1.0)),
+        ("confirmed: ready to promote", confirmed['ready_to_promote'], True),
+    ]
+
+    passed = 0
+    for name, got, expected in checks:
+        status = "✅" if got == expected else "❌"
+        passed += got == expected
+        print(f"  {status} {name:<38} -> {got}")
+
+    print(f"\n📊 Results: {passed}/{len(checks)} passed")
+
+if __name__ == "__main__":
+    test_shadow_evaluation()
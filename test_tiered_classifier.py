@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test Tiered Category Classifier
+"""
+
+import tempfile
+import time
+
+from ml_category_predictor import MLCategoryPredictor
+from ml_model_registry import ModelRegistry, PredictorHandle
+from ml_tiered_classifier import TieredCategoryClassifier
+
+def test_tiered_classifier():
+    """Test fast path tiers, forest escalation and threshold tuning"""
+    
+    print("🧪 Testing Tiered Category Classifier")
+    print("=" * 60)
+    
+    work_dir = tempfile.mkdtemp()
+    predictor = MLCategoryPredictor()
+    handle = PredictorHandle(predictor, ModelRegistry(f"{work_dir}/registry"))
+    classifier = TieredCategoryClassifier(handle, fast_path_dir=f"{work_dir}/fast_path", min_tuning_samples=3)
+    
+    stats = classifier.build_fast_path(predictor)
+    print(f"Fast path built: {stats}")
+    
+    # First call after start builds the tiers in the background and escalates
+    classifier.predict_category("warm up", merchant=None)
+    deadline = time.monotonic() + 120
+    while classifier._tiers is None:
+        assert time.monotonic() < deadline, "Fast path tiers were not built within 120s"
+        time.sleep(0.05)
+    
+    test_cases = [
+        ("Netflix monthly subscription of $15.99 was automatically charged", 15.99, "Netflix"),
+        ("Starbucks Coffee charged $8.45 on Oct 15 at 7:23 AM", 8.45, "Starbucks"),
+        ("Shell Gas Station charged $65.40 for fuel", 65.40, "Shell"),
+        ("Corner kiosk misc payment 12.00", 12.00, None),
+    ]
+    
+    for raw_text, amount, merchant in test_cases:
+        start_time = time.perf_counter()
+        result = classifier.predict_category(raw_text, amount, merchant)
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        print(f"  {result['tier']:>15}: {result['category']} "
+              f"(confidence: {result['confidence']:.3f}, {elapsed_ms:.2f} ms) <- {raw_text[:40]}")
+        assert result['tier'] in ('merchant_lookup', 'linear', 'forest')
+    
+    # A correction marks the logged decision wrong; tuning should react
+    classifier.record_outcome(test_cases[0][0], "Subscriptions")
+    for raw_text, _, _ in test_cases:
+        classifier.record_outcome(raw_text, "Subscriptions")
+    tuning = classifier.tune_thresholds()
+    print(f"\nTuning on corrections only: {tuning}")
+    # Corrections arrive first; without accepted outcomes the log is all errors and must not move the gates
+    assert not any(report['tuned'] for report in tuning['tiers'].values())
+    assert tuning['thresholds'] == classifier.thresholds
+    
+    # Uncorrected decisions become accepted outcomes once flushed (as on shutdown)
+    for i in range(60):
+        classifier.predict_category(f"Starbucks Coffee order {i} charged $5.{i:02d}", 5.0, "Starbucks")
+    classifier.flush_tracked()
+    tuning = classifier.tune_thresholds()
+    print(f"Tuning with accepted outcomes: {tuning}")
+    assert tuning['tiers']['merchant_lookup']['tuned']
+    assert tuning['thresholds']['merchant_lookup'] < 1.0
+    
+    # A corrected merchant skips the fast tiers so the online correction model is blended in, also after a restart
+    shell = "Shell Gas Station charged $41.20 for fuel"
+    assert classifier.predict_category(shell, 41.20, "Shell")['tier'] == 'merchant_lookup'
+    classifier.record_outcome(shell, "Travel", merchant="SHELL")
+    result = classifier.predict_category(shell, 41.20, "Shell")
+    print(f"After a Shell correction: {result['tier']} -> {result['category']}")
+    assert result['tier'] == 'forest'
+    restarted = TieredCategoryClassifier(handle, fast_path_dir=f"{work_dir}/fast_path")
+    restarted._tiers = classifier._tiers
+    assert restarted.predict_category(shell, 41.20, "Shell")['tier'] == 'forest'
+    print(f"Status: {classifier.get_status()}")
+    assert classifier.get_status()['corrected_merchants'] == 1
+    
+    print("\n✅ Tiered classifier test complete")
+
+if __name__ == "__main__":
+    test_tiered_classifier()